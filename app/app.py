@@ -5,6 +5,7 @@ import os
 import base64
 from pages._2_qc import show_qc
 from pages._14_cohort import show_cohort
+from pages._15_vocab_mapping import show_vocab_mapping
 from streamlit_navigation_bar import st_navbar
 
 def show_home():
@@ -51,7 +52,9 @@ def show_home():
         _, vm_p2_a, _ = st.columns([0.35, 2, 0.05], gap="small")
         with vm_p2_a:
             st.title("Vocabulary Mapping")
-            st.write("""Coming Soon!""")
+            st.write("""
+    Map your site's names to CLIF categories. For every distinct name in a table, the closest CLIF categories are ranked from the category labels and the names already mapped to them. Accepted mappings are saved and can be applied to the full table.
+                    """)
             
     with pg3:
         _, cd_p2, _ = st.columns([0.5, 2, 0.5], gap="small")
@@ -60,7 +63,9 @@ def show_home():
         _, cd_p2_a, _ = st.columns([0.45, 2, 0.01], gap="small")
         with cd_p2_a:
             st.title("Cohort Discovery")
-            st.write("""Coming Soon!""")
+            st.write("""
+    Build cohorts of hospitalizations from criteria across the CLIF tables, such as IMV in respiratory support and lactate above 4 within 24 hours of admission, and explore cohort files.
+                    """)
 
 parent_dir = os.path.dirname(os.path.abspath(__file__))
 logo_path = os.path.join(parent_dir, "assets/Picture1.svg")
@@ -106,7 +111,7 @@ selected_page = st_navbar(page, styles=styles, logo_path=logo_path, options=opti
 functions = {
     "Home": show_home,
     "Quality Controls": show_qc,
-    "Vocabulary Mapping": None,
+    "Vocabulary Mapping": show_vocab_mapping,
     "Cohort Discovery": show_cohort,
 }
 go_to = functions.get(selected_page)
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import fuzz
+
+# Batch fuzzy matching of category labels. Scoring every query label against
+# every data label with fuzz.partial_ratio is slow for site vocabularies of
+# thousands of labels, so the labels are indexed once by their character
+# trigrams. A query is scored against all labels at once from the postings of
+# its trigrams, and only the best candidates are scored with
+# fuzz.partial_ratio, which keeps the similarity scale (0-100) and the
+# thresholds used with it.
+
+NGRAM_SIZE = 3
+# Candidates per query kept after pruning by trigram similarity
+MATCH_CANDIDATES = 20
+
+
+def _ngrams(label, n=NGRAM_SIZE):
+    # Labels shorter than n have none
+    return {label[i:i + n] for i in range(len(label) - n + 1)}
+
+def build_ngram_index(labels, n=NGRAM_SIZE):
+    """
+    Inverted index of labels by their character n-grams.
+
+    Parameters:
+        labels (list): Labels to index.
+        n (int): n-gram length.
+
+    Returns:
+        dict: 'labels' (array of the labels), 'postings' (n-gram to array of
+              label positions), 'sizes' (number of distinct n-grams of
+              each label) and 'short' (positions of labels shorter than n).
+    """
+    labels = np.asarray(list(labels), dtype='object')
+    postings = {}
+    sizes = np.zeros(len(labels), dtype='int64')
+    for position, label in enumerate(labels):
+        grams = _ngrams(label, n)
+        sizes[position] = len(grams)
+        for gram in grams:
+            postings.setdefault(gram, []).append(position)
+    return {'labels': labels, 'postings': {gram: np.asarray(positions) for gram, positions in postings.items()},
+            'sizes': sizes, 'short': np.flatnonzero(sizes == 0), 'n': n}
+
+def ngram_similarity(queries, index):
+    """
+    Trigram similarity of each query to each indexed label: the share of
+    the shorter string's n-grams found in the other, in [0, 1], so a label
+    contained in the query or the other way round scores 1. Only labels
+    sharing an n-gram with a query are touched; strings shorter than n
+    score 1 where one contains the other.
+
+    Returns:
+        ndarray: Similarity matrix of shape (len(queries), len(labels)).
+    """
+    similarity = np.zeros((len(queries), len(index['labels'])))
+    for row, query in enumerate(queries):
+        grams = _ngrams(query, index['n'])
+        if not grams:
+            similarity[row] = pd.Series(index['labels']).str.contains(query, regex=False).to_numpy()
+            continue
+        postings = [index['postings'][gram] for gram in grams if gram in index['postings']]
+        if postings:
+            shared = np.bincount(np.concatenate(postings), minlength=len(index['labels']))
+            similarity[row] = shared / np.maximum(np.minimum(index['sizes'], len(grams)), 1)
+        similarity[row, index['short']] = [label in query for label in index['labels'][index['short']]]
+    return similarity
+
+def closest_matches(queries, labels, top_k=1, candidates=MATCH_CANDIDATES, index=None):
+    """
+    Closest labels to each query by fuzz.partial_ratio, scoring only the
+    candidates with the highest trigram similarity.
+
+    Parameters:
+        queries (list): Labels to match.
+        labels (list): Labels to match against.
+        top_k (int): Matches returned per query.
+        candidates (int): Candidates per query scored with partial_ratio.
+        index (dict, optional): build_ngram_index of labels, when reused
+            across calls.
+
+    Returns:
+        DataFrame: 'query', 'match', 'similarity' (0-100) and 'rank' (from
+                   1), best first, with top_k rows per query when there are
+                   that many labels.
+    """
+    queries = list(queries)
+    index = build_ngram_index(labels) if index is None else index
+    labels = index['labels']
+    columns = ['query', 'match', 'similarity', 'rank']
+    if not queries or not len(labels):
+        return pd.DataFrame(columns=columns)
+    similarity = ngram_similarity(queries, index)
+    n_candidates = min(max(candidates, top_k), len(labels))
+    # Candidates in order of decreasing trigram similarity, ties in label order
+    shortlist = np.argsort(-similarity, axis=1, kind='stable')[:, :n_candidates]
+    rows = []
+    for query, positions in zip(queries, shortlist):
+        scores = np.array([fuzz.partial_ratio(query, labels[position]) for position in positions])
+        # Best partial_ratio first, ties in label order
+        ranked = positions[np.lexsort((positions, -scores))][:top_k]
+        best = dict(zip(positions, scores))
+        rows.extend((query, labels[position], best[position], rank) for rank, position in enumerate(ranked, start=1))
+    return pd.DataFrame(rows, columns=columns)
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+from common_qc import partition_files
+from qc_cache import cache_key, load_artifacts, store_artifacts
+from qc_checks import table_filepath, _report_progress
+from qc_duckdb import connect, connection_config, create_source_view, source_select_sql, sql_lab_values, _quote_identifier, _quote_literal
+from reqd_vars_dtypes import expected_data_types
+
+logger = logging.getLogger(__name__)
+
+# Cohort files for the Cohort Discovery explorer: a single csv, parquet or
+# fst file, or a directory of partition files of one of these types. The
+# explorer queries them in place through DuckDB, so no copy is loaded into
+# pandas.
+
+COHORT_FILETYPES = ['csv', 'parquet', 'fst']
+
+
+def infer_filetype(filepath):
+    """
+    File type of a cohort file from its extension, or from the extension of
+    the partition files of a directory.
+
+    Parameters:
+        filepath (str): Path to the file or directory.
+
+    Returns:
+        str: One of COHORT_FILETYPES.
+    """
+    if os.path.isdir(filepath):
+        for filetype in COHORT_FILETYPES:
+            if partition_files(filepath, filetype):
+                return filetype
+        raise ValueError(f"{filepath} has no {', '.join(COHORT_FILETYPES)} files.")
+    filetype = os.path.splitext(filepath)[1].lstrip('.').lower()
+    if filetype not in COHORT_FILETYPES:
+        raise ValueError(f"Unsupported file type '{filetype}'. Please provide a {', '.join(COHORT_FILETYPES)} file or a directory of them.")
+    return filetype
+
+def cohort_view_sql(filepath):
+    """
+    SELECT statement over a cohort file or directory of partition files for
+    the explorer, typed as the DuckDB QC engine reads it.
+    """
+    filetype = infer_filetype(filepath)
+    con = connect()
+    try:
+        select_sql, _ = source_select_sql(con, filepath, filetype)
+    finally:
+        con.close()
+    logger.info(f"Opening cohort file {filepath} ({filetype}) in DuckDB.")
+    return select_sql
+
+def explorer_engine_params(memory_budget_mb=None):
+    """
+    SQLAlchemy engine parameters of the explorer's DuckDB connection,
+    limited as the QC engine's connections are.
+    """
+    return {'connect_args': {'config': connection_config(memory_budget_mb)}}
+
+
+# Cross-table cohort queries. A cohort is the set of hospitalizations that
+# meet every criterion, each criterion being a set of filters on one CLIF
+# table, e.g. device_category == 'IMV' in Respiratory_Support, or
+# lab_category == 'lactate' and lab_value_numeric > 4 in Labs within 24
+# hours of admission. Each criterion is evaluated with DuckDB over the table
+# file, which reads only the columns it uses and skips row groups ruled out
+# by the filters, and returns only the distinct hospitalization_ids. The ID
+# set of every criterion is cached by a hash of the criterion and the
+# fingerprints of the files it reads, so refining one criterion re-runs only
+# that one, and the cohort is the intersection of the cached sets.
+
+COHORT_OPERATORS = ['==', '!=', '>', '>=', '<', '<=', 'in', 'not in', 'is null', 'is not null']
+SQL_OPERATORS = {'==': '=', '!=': '<>', '>': '>', '>=': '>=', '<': '<', '<=': '<=', 'in': 'IN', 'not in': 'NOT IN'}
+# Time of each table's events, for criteria limited to hours from admission
+EVENT_TIME_COLUMNS = {
+    'ADT': 'in_dttm',
+    'Labs': 'lab_result_dttm',
+    'Medication_admin_continuous': 'admin_dttm',
+    'Microbiology_Culture': 'collect_dttm',
+    'Patient_Assessments': 'recorded_dttm',
+    'Position': 'recorded_dttm',
+    'Respiratory_Support': 'recorded_dttm',
+    'Vitals': 'recorded_dttm',
+}
+# DuckDB types compared with numbers; other columns are compared with text
+# literals, which DuckDB casts to the column's type (e.g. TIMESTAMP)
+NUMERIC_TYPES = ('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT', 'UTINYINT', 'USMALLINT', 'UINTEGER',
+                 'UBIGINT', 'FLOAT', 'REAL', 'DOUBLE', 'DECIMAL')
+
+
+def _sql_value(value, column, column_type=None):
+    """
+    SQL literal of a filter value for a column of the given DuckDB type:
+    a number for numeric columns, quoted text for any other, so that
+    '00123' stays text against a VARCHAR column and 1 matches '1'.
+    """
+    if column_type is None or not column_type.startswith(NUMERIC_TYPES):
+        if column_type is None and isinstance(value, (int, float)) and not isinstance(value, bool):
+            return repr(value)
+        return _quote_literal(value)
+    text = str(value).strip()
+    try:
+        number = int(text)
+    except ValueError:
+        try:
+            number = float(text)
+        except ValueError:
+            number = None
+    if number is None or not np.isfinite(number):
+        raise ValueError(f"{column} is numeric ({column_type}), but the filter value '{value}' is not a number.")
+    return repr(number)
+
+def _filter_sql(column, operator, value=None, column_type=None):
+    """
+    SQL condition of one filter, e.g. ('lab_value_numeric', '>', 4), with
+    the value typed by the column's DuckDB type when given.
+    """
+    if operator not in COHORT_OPERATORS:
+        raise ValueError(f"Unknown operator '{operator}'. Use one of {', '.join(COHORT_OPERATORS)}.")
+    name, column = column, _quote_identifier(column)
+    if operator == 'is null':
+        return f"{column} IS NULL"
+    if operator == 'is not null':
+        return f"{column} IS NOT NULL"
+    if operator in ('in', 'not in'):
+        values = value if isinstance(value, (list, tuple)) else [value]
+        return f"{column} {SQL_OPERATORS[operator]} ({', '.join(_sql_value(v, name, column_type) for v in values)})"
+    return f"{column} {SQL_OPERATORS[operator]} {_sql_value(value, name, column_type)}"
+
+def _criterion_files(criterion, root_location, filetype):
+    tables = [criterion['table'], 'Hospitalization']
+    return [table_filepath(root_location, table_name, filetype) for table_name in dict.fromkeys(tables)]
+
+def _create_view(con, table_name, root_location, filetype, parse_lab_values=False):
+    """
+    View of a CLIF table's file, with lab_value_numeric parsed from
+    lab_value when asked for and the labs file has no such column.
+
+    Returns:
+        str: Name of the view.
+        dict: DuckDB type of each of its columns.
+    """
+    view_name = f"cohort_{table_name.lower()}"
+    columns = create_source_view(con, table_filepath(root_location, table_name, filetype), filetype, view_name,
+                                 dtypes=expected_data_types.get(table_name))
+    if parse_lab_values and 'lab_value_numeric' not in columns and 'lab_value' in columns:
+        sql_lab_values(con, view_name=view_name, values_view=f"{view_name}_values")
+        view_name = f"{view_name}_values"
+    return view_name, {name: column_type for name, column_type, *_ in con.execute(f"DESCRIBE {view_name}").fetchall()}
+
+def criterion_ids(criterion, root_location, filetype, memory_budget_mb=None):
+    """
+    Hospitalizations meeting one criterion.
+
+    Parameters:
+        criterion (dict): 'table' (CLIF table), 'filters' (list of (column,
+            operator, value) filters, all of which a row must meet) and
+            optionally 'within_hours' (only rows whose event time is within
+            that many hours from admission) and 'time_column' (the event
+            time, EVENT_TIME_COLUMNS by default).
+        root_location (str): Directory containing the CLIF tables.
+        filetype (str): Type of the files.
+        memory_budget_mb (int, optional): DuckDB memory limit in MB.
+
+    Returns:
+        ndarray: Sorted distinct hospitalization_ids.
+    """
+    table_name = criterion['table']
+    con = connect(memory_budget_mb)
+    try:
+        filters = [list(f) + [None] * (3 - len(f)) for f in criterion.get('filters', [])]
+        view_name, columns = _create_view(con, table_name, root_location, filetype,
+                                          parse_lab_values=any(f[0] == 'lab_value_numeric' for f in filters))
+        missing = [column for column, _, _ in filters if column not in columns]
+        if missing:
+            raise ValueError(f"{table_name} has no column {', '.join(missing)}.")
+        conditions = [_filter_sql(column, operator, value, columns[column]) for column, operator, value in filters]
+        joins = []
+        # Tables without hospitalization_id (e.g. Patient) are linked to hospitalizations by patient_id
+        key = 'hospitalization_id' if 'hospitalization_id' in columns else 'patient_id'
+        if key == 'patient_id' or criterion.get('within_hours') is not None:
+            hosp_view, _ = _create_view(con, 'Hospitalization', root_location, filetype)
+            joins.append(f"JOIN {hosp_view} AS h ON h.{key} = t.{key}")
+            id_sql = "h.hospitalization_id"
+        else:
+            id_sql = "t.hospitalization_id"
+        if criterion.get('within_hours') is not None:
+            time_column = criterion.get('time_column') or EVENT_TIME_COLUMNS.get(table_name)
+            if time_column not in columns:
+                raise ValueError(f"{table_name} has no event time column for criteria within hours of admission.")
+            time_column = _quote_identifier(time_column)
+            event_time = f"TRY_CAST(t.{time_column} AS TIMESTAMP)"
+            admission = "TRY_CAST(h.admission_dttm AS TIMESTAMP)"
+            conditions.append(f"{event_time} BETWEEN {admission} AND {admission} + "
+                              f"INTERVAL (CAST({float(criterion['within_hours']) * 3600} AS BIGINT)) SECOND")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        ids = con.execute(f"""
+            SELECT DISTINCT CAST({id_sql} AS VARCHAR) AS hospitalization_id
+            FROM {view_name} AS t {' '.join(joins)}
+            {where}
+        """).df()['hospitalization_id']
+    finally:
+        con.close()
+    return np.sort(ids.dropna().to_numpy(dtype='object'))
+
+def query_hash(query):
+    """
+    Hash of a criterion or query, independent of dict key order.
+    """
+    return hashlib.sha256(json.dumps(query, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def cached_criterion_ids(criterion, root_location, filetype, refresh=False, memory_budget_mb=None):
+    """
+    criterion_ids, cached by the criterion's hash and the fingerprints of
+    the files it reads.
+    """
+    table_name, *dependencies = _criterion_files(criterion, root_location, filetype)
+    key = cache_key(f"cohort-{query_hash(criterion)}", table_name, dependencies)
+    ids = None if refresh else load_artifacts(key)
+    if ids is None:
+        ids = criterion_ids(criterion, root_location, filetype, memory_budget_mb)
+        store_artifacts(key, ids)
+    return ids
+
+def run_cohort_query(criteria, root_location, filetype, progress=None, refresh=False, memory_budget_mb=None):
+    """
+    Hospitalizations meeting all criteria, with the count left after each.
+
+    Parameters:
+        criteria (list): Criteria as in criterion_ids. A criterion with
+            'exclude' set removes the hospitalizations meeting it instead.
+        root_location (str): Directory containing the CLIF tables.
+        filetype (str): Type of the files.
+        progress (callable, optional): Called with (percent, text) as criteria are evaluated.
+        refresh (bool): Re-evaluate the criteria even if cached.
+        memory_budget_mb (int, optional): DuckDB memory limit in MB.
+
+    Returns:
+        dict: 'hospitalization_ids' (sorted array of the cohort) and
+              'counts' (DataFrame of the hospitalizations meeting each
+              criterion and left in the cohort after it, starting from all
+              hospitalizations).
+    """
+    cohort = cached_criterion_ids({'table': 'Hospitalization', 'filters': []}, root_location, filetype,
+                                  refresh=refresh, memory_budget_mb=memory_budget_mb)
+    counts = [{'criterion': 'All hospitalizations', 'matched': len(cohort), 'remaining': len(cohort)}]
+    for i, criterion in enumerate(criteria):
+        _report_progress(progress, int(100 * i / max(len(criteria), 1)), f"Evaluating criterion {i + 1} of {len(criteria)}...")
+        ids = cached_criterion_ids(criterion, root_location, filetype, refresh=refresh, memory_budget_mb=memory_budget_mb)
+        if criterion.get('exclude'):
+            cohort = np.setdiff1d(cohort, ids, assume_unique=True)
+        else:
+            cohort = np.intersect1d(cohort, ids, assume_unique=True)
+        counts.append({'criterion': describe_criterion(criterion), 'matched': len(ids), 'remaining': len(cohort)})
+    _report_progress(progress, 100, 'Cohort ready.')
+    return {'hospitalization_ids': cohort, 'counts': pd.DataFrame(counts)}
+
+def describe_criterion(criterion):
+    """
+    Readable form of a criterion, e.g. "Labs: lab_category == 'lactate' and lab_value_numeric > 4 within 24h of admission".
+    """
+    filters = [' '.join(str(part) if not isinstance(part, str) or i < 2 else repr(part) for i, part in enumerate(f))
+               for f in criterion.get('filters', [])]
+    text = f"{criterion['table']}: {' and '.join(filters) or 'any row'}"
+    if criterion.get('within_hours') is not None:
+        text += f" within {criterion['within_hours']:g}h of admission"
+    return f"not ({text})" if criterion.get('exclude') else text
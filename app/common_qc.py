@@ -1,40 +1,505 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
 import pyarrow.parquet as pq
 import matplotlib.pyplot as plt
-import seaborn as sns
 import logging
+import io
 import os
-from fuzzywuzzy import fuzz 
-from logging_config import setup_logging
-from common_features import set_bg_hack_url
+from concurrent.futures import ThreadPoolExecutor
+from fst_reader import fst_parquet_files
+from category_matching import closest_matches
 from reqd_vars_dtypes import required_variables, expected_data_types
 
-# pages_layout()
-# set_bg_hack_url()
-# set_sidebar()
-
 # Initialize logger
-# setup_logging()
-# logger = logging.getLogger(__name__)
+logger = logging.getLogger(__name__)
 
 # Common Functions
-def read_data(filepath, filetype):
+CSV_CHUNK_SIZE = 1_000_000
+# Size of the byte ranges a CSV file is split into for sampling
+CSV_BLOCK_BYTES = 4 << 20
+# Threads reading the files of a partitioned CSV table concurrently
+READ_THREADS = int(os.environ.get('CLIF_READ_THREADS', os.cpu_count() or 1))
+# Bins per category of the value distribution histograms
+HISTOGRAM_BINS = 30
+# Respiratory support variables plotted per device category, and their bins
+RESP_HISTOGRAM_VARIABLES = sorted([
+    "fio2_set", "lpm_set", "tidal_volume_set", "resp_rate_set",
+    "pressure_control_set", "pressure_support_set", "flow_rate_set",
+    "peak_inspiratory_pressure_set", "inspiratory_time_set", "peep_set",
+    "tidal_volume_obs", "resp_rate_obs", "plateau_pressure_obs",
+    "peak_inspiratory_pressure_obs", "peep_obs", "minute_vent_obs"])
+RESP_HISTOGRAM_BINS = 20
+# Columns the respiratory support device and mode summaries are selected and mapped by
+DEVICE_MODE_COLUMNS = ['device_category', 'mode_category', 'device_name', 'mode_name']
+
+def set_read_threads(threads):
+    """
+    Limit the threads this process reads with: pyarrow's thread pool (also
+    used for DuckDB connections) and READ_THREADS. Each QC worker process
+    takes its share of the CPUs this way, so concurrent workers do not
+    oversubscribe them.
+    """
+    global READ_THREADS
+    READ_THREADS = max(int(threads), 1)
+    pa.set_cpu_count(READ_THREADS)
+
+def _filters_to_mask(df, filters):
+    """
+    Evaluate pyarrow-style filters against a pandas DataFrame.
+
+    Parameters:
+        df (DataFrame): DataFrame (or CSV chunk) to filter.
+        filters (list): List of (column, op, value) tuples combined with AND.
+
+    Returns:
+        Series: Boolean mask of rows satisfying all filters.
+    """
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        col = df[column]
+        scalar = next(iter(value), None) if op in ('in', 'not in') else value
+        if isinstance(scalar, (pd.Timestamp, np.datetime64)) and not pd.api.types.is_datetime64_any_dtype(col):
+            col = pd.to_datetime(col, errors='coerce')
+        if op in ('=', '=='):
+            mask &= col == value
+        elif op == '!=':
+            mask &= col != value
+        elif op == '<':
+            mask &= col < value
+        elif op == '<=':
+            mask &= col <= value
+        elif op == '>':
+            mask &= col > value
+        elif op == '>=':
+            mask &= col >= value
+        elif op == 'in':
+            mask &= col.isin(value)
+        elif op == 'not in':
+            mask &= ~col.isin(value)
+        else:
+            raise ValueError(f"Unsupported filter operator '{op}'.")
+    return mask
+
+def _arrow_to_pandas_dtype(arrow_type):
+    """
+    Map an arrow type to the pandas dtype a plain read would have produced.
+    """
+    if pa.types.is_dictionary(arrow_type):
+        # Dictionary encoding is a storage detail; report the value type
+        arrow_type = arrow_type.value_type
+    try:
+        return np.dtype(arrow_type.to_pandas_dtype())
+    except (NotImplementedError, TypeError):
+        return np.dtype('O')
+
+def _expected_arrow_type(expected_dtype):
+    """
+    Arrow type a column is cast to during a typed parquet read, or None when
+    the conversion is left to pandas.
+    """
+    return {
+        'datetime64': pa.timestamp('ns'),
+        'float64': pa.float64(),
+        'int64': pa.int64(),
+        'bool': pa.bool_(),
+    }.get(expected_dtype)
+
+def _cast_table(table, dtypes):
+    """
+    Cast arrow columns to their expected types before conversion to pandas.
+    Columns whose values cannot be cast are left untouched and converted with
+    errors coerced by _apply_expected_dtypes afterwards.
+    """
+    for column, expected_dtype in dtypes.items():
+        if column not in table.column_names:
+            continue
+        current_type = table.schema.field(column).type
+        target_type = _expected_arrow_type(expected_dtype)
+        if target_type is None or current_type == target_type:
+            continue
+        if expected_dtype == 'datetime64' and pa.types.is_timestamp(current_type):
+            continue
+        try:
+            casted = table.column(column).cast(target_type)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+        table = table.set_column(table.schema.get_field_index(column), column, casted)
+    return table
+
+def _csv_row_range(rows):
+    """
+    read_csv options reading the (start, stop) row range after the header.
+    """
+    if rows is None:
+        return {}
+    start, stop = rows
+    return {'skiprows': range(1, start + 1), 'nrows': max(stop - start, 0)}
+
+def _read_csv_typed(filepath, usecols, dtypes, chunksize=None, categorical=None, rows=None):
+    """
+    Read a CSV file parsing expected datetime columns during the read.
+    """
+    header = pd.read_csv(filepath, nrows=0).columns
+    if hasattr(filepath, 'seek'):
+        filepath.seek(0)
+    if usecols is not None:
+        header = [col for col in header if usecols(col)]
+    parse_dates = [col for col, expected_dtype in dtypes.items()
+                   if expected_dtype == 'datetime64' and col in header]
+    category_dtypes = {col: 'category' for col in (categorical or []) if col in header}
+    return pd.read_csv(filepath, usecols=usecols, parse_dates=parse_dates, dtype=category_dtypes,
+                       chunksize=chunksize, **_csv_row_range(rows)), parse_dates
+
+def _csv_physical_dtypes(data, parse_dates, categorical):
+    """
+    dtypes a plain CSV read would have produced: parsed datetime and
+    categorical columns were physically strings.
+    """
+    return {col: ('object' if col in parse_dates or col in (categorical or []) else str(data[col].dtype))
+            for col in data.columns}
+
+def _parquet_format(categorical):
+    """
+    Parquet format decoding the categorical columns straight to dictionary
+    arrays, which become pandas categoricals.
+    """
+    if not categorical:
+        return 'parquet'
+    return ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=list(categorical)))
+
+def partition_files(directory, filetype):
+    """
+    Partition files of a table directory, including those in nested
+    (e.g. hive-style year=2024/) subdirectories, in a stable order. Hidden
+    and underscore-prefixed files (e.g. _SUCCESS) are skipped.
+    """
+    return sorted(os.path.join(dirpath, filename)
+                  for dirpath, _, filenames in os.walk(directory)
+                  for filename in filenames
+                  if filename.endswith(f'.{filetype}') and not filename.startswith(('.', '_')))
+
+def _dataset(filepath, filetype, categorical=None):
+    """
+    pyarrow dataset over a file or a directory of partition files. Hive-style
+    directory names (e.g. year=2024/) become partition columns, which filters
+    on them prune without opening the files.
+    """
+    if filetype == 'fst':
+        # fst files are read through their parquet copies
+        fst_files = partition_files(filepath, filetype) if os.path.isdir(filepath) else [filepath]
+        return ds.dataset([part for fst_file in fst_files for part in fst_parquet_files(fst_file)],
+                          format=_parquet_format(categorical))
+    file_format = _parquet_format(categorical) if filetype == 'parquet' else filetype
+    if os.path.isdir(filepath):
+        return ds.dataset(partition_files(filepath, filetype), format=file_format, partitioning='hive',
+                          partition_base_dir=filepath)
+    return ds.dataset(filepath, format=file_format, partitioning='hive')
+
+def _csv_partitions(filepath, filters=None):
+    """
+    Files of a partitioned CSV table with their partition keys, pruned by the
+    filters on partition columns.
+
+    Returns:
+        list: (path, {partition column: value}) for each remaining file.
+        list: The filters on other columns, to be applied to the rows.
+    """
+    dataset = _dataset(filepath, 'csv')
+    partition_columns = set(dataset.partitioning.schema.names) if dataset.partitioning else set()
+    partition_filters = [f for f in filters or [] if f[0] in partition_columns]
+    row_filters = [f for f in filters or [] if f[0] not in partition_columns]
+    expression = pq.filters_to_expression(partition_filters) if partition_filters else None
+    partitions = [(fragment.path, ds.get_partition_keys(fragment.partition_expression))
+                  for fragment in dataset.get_fragments(filter=expression)]
+    return sorted(partitions, key=lambda partition: partition[0]), row_filters
+
+def _add_partition_keys(data, keys, columns):
+    for key, value in keys.items():
+        if columns is None or key in columns:
+            data[key] = value
+    return data
+
+def _read_csv_directory(filepath, columns, filters, dtypes, categorical):
+    """
+    Read a directory of CSV partition files, several files at a time.
+    """
+    partitions, row_filters = _csv_partitions(filepath, filters)
+    if not partitions:
+        raise FileNotFoundError(f"No CSV files found in {filepath}.")
+    read_partition = lambda partition: _add_partition_keys(
+        read_data(partition[0], 'csv', columns, row_filters or None, dtypes, categorical), partition[1], columns)
+    with ThreadPoolExecutor(max_workers=min(READ_THREADS, len(partitions))) as executor:
+        frames = list(executor.map(read_partition, partitions))
+    return _concat_csv_frames(frames, dtypes, categorical)
+
+def _concat_csv_frames(frames, dtypes, categorical):
+    """
+    Concatenate frames read from several CSV files, keeping categorical
+    columns categorical and merging the files' physical dtypes.
+    """
+    data = pd.concat(frames, ignore_index=True)
+    if dtypes is None:
+        return data
+    # Files with different categories concatenate to object
+    for col in categorical or []:
+        if col in data.columns and not isinstance(data[col].dtype, pd.CategoricalDtype):
+            data[col] = data[col].astype('category')
+    physical_dtypes = {}
+    for frame in frames:
+        for column, dtype in frame.attrs.get('physical_dtypes', {}).items():
+            previous = physical_dtypes.setdefault(column, dtype)
+            if previous != dtype:
+                numeric = all(pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(d)) for d in (previous, dtype))
+                physical_dtypes[column] = 'float64' if numeric else 'object'
+    data.attrs['physical_dtypes'] = physical_dtypes
+    return data
+
+def read_data(filepath, filetype, columns=None, filters=None, dtypes=None, categorical=None, rows=None):
     """
     Read data from file based on file type.
+
+    Only the requested columns are loaded, and row filters are pushed down
+    into the pyarrow dataset scanner for parquet (row groups whose statistics
+    cannot match are skipped) and applied per chunk for CSV, so the full table
+    is never materialized.
+
+    The path can also be a directory of partition files, e.g. clif_labs/
+    holding year=2023/part-0.parquet, year=2024/part-0.parquet. Parquet
+    directories are read by the threaded dataset scanner and CSV files by
+    READ_THREADS threads. Hive-style partition columns (year) can be
+    selected and filtered on, and partitions excluded by the filters are
+    not read.
+
+    fst files are converted once to parquet with R (see fst_reader) and read
+    through the cached parquet copy.
+
     Parameters:
-        filepath (str): Path to the file.
-        filetype (str): Type of the file ('csv' or 'parquet').
+        filepath (str): Path to the file or directory.
+        filetype (str): Type of the file ('csv', 'parquet' or 'fst').
+        columns (list, optional): Columns to load. Columns not present in the
+            file are ignored so required-column checks can still report them.
+        filters (list, optional): Row filters as (column, op, value) tuples
+            combined with AND, e.g. [('hospitalization_id', 'in', ids),
+            ('recorded_dttm', '>=', pd.Timestamp('2023-01-01'))].
+            Supported ops: '=', '==', '!=', '<', '<=', '>', '>=', 'in', 'not in'.
+        dtypes (dict, optional): Expected data types, e.g.
+            expected_data_types[TABLE]. Columns are converted while reading
+            (arrow casts for parquet, parse_dates for CSV) and the file's
+            physical dtypes are kept (as strings, so attrs stay serializable)
+            in data.attrs['physical_dtypes'] so that
+            validate_and_convert_dtypes reports against the file, not the
+            converted frame.
+        categorical (list, optional): Text columns to load as pandas
+            categoricals (dictionary-decoded for parquet), e.g.
+            categorical_variables[TABLE]. Only used with dtypes.
+        rows (tuple, optional): (start, stop) range of rows to read, e.g.
+            (0, 1000) for a first look. Rows are counted before filters.
     Returns:
         DataFrame: DataFrame containing the data.
     """
+    if filetype == 'csv' and os.path.isdir(filepath):
+        if rows is not None:
+            raise ValueError("Row ranges are not supported for directories of CSV files.")
+        return _read_csv_directory(filepath, columns, filters, dtypes, categorical)
     if filetype == 'csv':
-        return pd.read_csv(filepath)
-    elif filetype == 'parquet':
-        table = pq.read_table(filepath)
+        if not filters:
+            usecols = None if columns is None else (lambda col: col in columns)
+            if dtypes is None:
+                return pd.read_csv(filepath, usecols=usecols, **_csv_row_range(rows))
+            data, parse_dates = _read_csv_typed(filepath, usecols, dtypes, categorical=categorical, rows=rows)
+        else:
+            # Filter columns are read alongside the projection and dropped afterwards
+            filter_columns = [column for column, _, _ in filters]
+            usecols = None if columns is None else (lambda col: col in columns or col in filter_columns)
+            if dtypes is None:
+                reader = pd.read_csv(filepath, usecols=usecols, chunksize=CSV_CHUNK_SIZE, **_csv_row_range(rows))
+                parse_dates = []
+            else:
+                reader, parse_dates = _read_csv_typed(filepath, usecols, dtypes, chunksize=CSV_CHUNK_SIZE,
+                                                      categorical=categorical, rows=rows)
+            data = pd.concat([chunk[_filters_to_mask(chunk, filters)] for chunk in reader], ignore_index=True)
+            if columns is not None:
+                data = data[[col for col in data.columns if col in columns]]
+            if dtypes is None:
+                return data
+            # Chunks with different categories concatenate to object
+            for col in categorical or []:
+                if col in data.columns and not isinstance(data[col].dtype, pd.CategoricalDtype):
+                    data[col] = data[col].astype('category')
+        # CSV stores text, so parsed datetime columns were physically strings
+        physical_dtypes = _csv_physical_dtypes(data, parse_dates, categorical)
+        data = _apply_expected_dtypes(data, dtypes)
+        data.attrs['physical_dtypes'] = physical_dtypes
+        return data
+    elif filetype in ('parquet', 'fst'):
+        dataset = _dataset(filepath, filetype, categorical if dtypes is not None else None)
+        if columns is not None:
+            columns = [col for col in dataset.schema.names if col in columns]
+        expression = pq.filters_to_expression(filters) if filters else None
+        if rows is None:
+            table = dataset.to_table(columns=columns, filter=expression, use_threads=True)
+        else:
+            start, stop = rows
+            indices = pa.array(np.arange(start, max(min(stop, dataset.count_rows()), start)))
+            if expression is None:
+                table = dataset.take(indices, columns=columns)
+            else:
+                table = dataset.take(indices).filter(expression)
+                table = table.select(columns) if columns is not None else table
+        return _table_to_frame(table, dtypes)
+    else:
+        raise ValueError("Unsupported file type. Please provide either 'csv', 'fst' or 'parquet'.")
+
+def _table_to_frame(table, dtypes):
+    """
+    Convert an arrow table to pandas with the expected dtypes, keeping the
+    file's physical dtypes in attrs['physical_dtypes'].
+    """
+    if dtypes is None:
         return table.to_pandas()
-    elif filetype == 'fst':
-        return pd.read_fwf(filepath)
+    physical_dtypes = {field.name: str(_arrow_to_pandas_dtype(field.type)) for field in table.schema}
+    data = _apply_expected_dtypes(_cast_table(table, dtypes).to_pandas(), dtypes)
+    data.attrs['physical_dtypes'] = physical_dtypes
+    return data
+
+def table_blocks(filepath, filetype):
+    """
+    Split a table into blocks that can be read on their own: the row groups
+    of parquet and fst files, and byte ranges of CSV_BLOCK_BYTES of CSV
+    files. A sample of blocks costs only its own I/O, unlike a sample of
+    rows spread over the whole table.
+
+    Parameters:
+        filepath (str): Path to the file or directory of partition files.
+        filetype (str): Type of the file ('csv', 'parquet' or 'fst').
+
+    Returns:
+        list: (path, row group id) or (path, (start, stop) byte range) of
+            each block, in file order.
+        array: Rows (parquet, fst) or bytes (CSV) of each block.
+    """
+    blocks, sizes = [], []
+    if filetype == 'csv':
+        for path in partition_files(filepath, filetype) if os.path.isdir(filepath) else [filepath]:
+            with open(path, 'rb') as f:
+                data_start = len(f.readline())
+            size = os.path.getsize(path)
+            for start in range(data_start, size, CSV_BLOCK_BYTES):
+                blocks.append((path, (start, min(start + CSV_BLOCK_BYTES, size))))
+                sizes.append(blocks[-1][1][1] - start)
+    elif filetype in ('parquet', 'fst'):
+        for fragment in _dataset(filepath, filetype).get_fragments():
+            for row_group in fragment.row_groups:
+                blocks.append((fragment.path, row_group.id))
+                sizes.append(row_group.num_rows)
+    else:
+        raise ValueError("Unsupported file type. Please provide either 'csv', 'fst' or 'parquet'.")
+    return blocks, np.asarray(sizes, dtype='int64')
+
+def _csv_range_bytes(f, start, stop):
+    """
+    Lines of an open CSV file starting in the byte range [start, stop),
+    ending with a newline. Quoted values spanning lines are not supported.
+    """
+    # Skip the rest of the line begun before the range
+    f.seek(start - 1)
+    f.readline()
+    if f.tell() >= stop:
+        return b''
+    data = f.read(stop - f.tell())
+    if not data.endswith(b'\n'):
+        data += f.readline()
+    return data if data.endswith(b'\n') else data + b'\n'
+
+def read_blocks(filepath, filetype, blocks, columns=None, dtypes=None, categorical=None):
+    """
+    Read some blocks of a table, e.g. a random sample of them, in the order
+    given.
+
+    Parameters:
+        filepath (str): Path to the file or directory, as in read_data.
+        filetype (str): Type of the file ('csv', 'parquet' or 'fst').
+        blocks (list): Blocks to read, as returned by table_blocks.
+        columns, dtypes, categorical: As in read_data.
+
+    Returns:
+        DataFrame: The rows of the blocks.
+    """
+    if filetype == 'csv':
+        keys = dict(_csv_partitions(filepath)[0]) if os.path.isdir(filepath) else {}
+        frames = []
+        for path, (start, stop) in blocks:
+            with open(path, 'rb') as f:
+                buffer = io.BytesIO(f.readline() + _csv_range_bytes(f, start, stop))
+            usecols = None if columns is None else (lambda col: col in columns)
+            if dtypes is None:
+                frame = pd.read_csv(buffer, usecols=usecols)
+            else:
+                frame, parse_dates = _read_csv_typed(buffer, usecols, dtypes, categorical=categorical)
+                physical_dtypes = _csv_physical_dtypes(frame, parse_dates, categorical)
+                frame = _apply_expected_dtypes(frame, dtypes)
+                frame.attrs['physical_dtypes'] = physical_dtypes
+            frames.append(_add_partition_keys(frame, keys.get(path, {}), columns))
+        return _concat_csv_frames(frames, dtypes, categorical)
+    dataset = _dataset(filepath, filetype, categorical if dtypes is not None else None)
+    if columns is not None:
+        columns = [col for col in dataset.schema.names if col in columns]
+    fragments = {fragment.path: fragment for fragment in dataset.get_fragments()}
+    # Consecutive blocks of a file are read as one fragment
+    parts = []
+    for path, row_group in blocks:
+        if parts and parts[-1][0] == path:
+            parts[-1][1].append(row_group)
+        else:
+            parts.append((path, [row_group]))
+    subsets = [fragments[path].subset(row_group_ids=row_groups) for path, row_groups in parts]
+    table = ds.FileSystemDataset(subsets, dataset.schema, dataset.format, dataset.filesystem).to_table(
+        columns=columns, use_threads=True)
+    return _table_to_frame(table, dtypes)
+
+def read_data_batches(filepath, filetype, columns=None, dtypes=None, batch_rows=CSV_CHUNK_SIZE, categorical=None):
+    """
+    Read data from file in batches of at most batch_rows rows, so that tables
+    larger than memory can be processed batch by batch.
+
+    Parameters:
+        filepath (str): Path to the file, or a directory of partition files
+            as in read_data.
+        filetype (str): Type of the file ('csv', 'parquet' or 'fst').
+        columns (list, optional): Columns to load, as in read_data.
+        dtypes (dict, optional): Expected data types, as in read_data. Each
+            batch keeps the file's physical dtypes in attrs['physical_dtypes'].
+        categorical (list, optional): Columns to load as categoricals, as in read_data.
+        batch_rows (int): Maximum number of rows per batch.
+
+    Yields:
+        DataFrame: The next batch of rows.
+    """
+    if filetype == 'csv' and os.path.isdir(filepath):
+        partitions, _ = _csv_partitions(filepath)
+        for path, keys in partitions:
+            for chunk in read_data_batches(path, filetype, columns, dtypes, batch_rows, categorical):
+                yield _add_partition_keys(chunk, keys, columns)
+        return
+    if filetype == 'csv':
+        usecols = None if columns is None else (lambda col: col in columns)
+        if dtypes is None:
+            yield from pd.read_csv(filepath, usecols=usecols, chunksize=batch_rows)
+            return
+        reader, parse_dates = _read_csv_typed(filepath, usecols, dtypes, chunksize=batch_rows, categorical=categorical)
+        for chunk in reader:
+            physical_dtypes = _csv_physical_dtypes(chunk, parse_dates, categorical)
+            chunk = _apply_expected_dtypes(chunk, dtypes)
+            chunk.attrs['physical_dtypes'] = physical_dtypes
+            yield chunk
+    elif filetype in ('parquet', 'fst'):
+        dataset = _dataset(filepath, filetype, categorical if dtypes is not None else None)
+        if columns is not None:
+            columns = [col for col in dataset.schema.names if col in columns]
+        for batch in dataset.to_batches(columns=columns, batch_size=batch_rows):
+            yield _table_to_frame(pa.Table.from_batches([batch]), dtypes)
     else:
         raise ValueError("Unsupported file type. Please provide either 'csv', 'fst' or 'parquet'.")
 
@@ -56,10 +521,26 @@ def check_required_variables(table_name, df): ### Modified from original
     else:
         return f"All required columns present for '{table_name}'."
 
+def _sorted_group_quantile(sorted_values, starts, counts, q):
+    """
+    Quantile of each group in a group-sorted array, using the same linear
+    interpolation as pandas.
+    """
+    position = starts + (counts - 1) * q
+    lower = np.floor(position).astype('int64')
+    upper = np.ceil(position).astype('int64')
+    with np.errstate(invalid='ignore'):
+        result = sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+    return np.where(counts > 0, result, np.nan)
+
 def generate_summary_stats(data, category_column, value_column):
     """
     Generate summary statistics for a DataFrame based on a specified category column and value column.
 
+    All categories are summarized in one vectorized pass: values are sorted
+    once by (category, value), so min, max and the quartiles are read off the
+    group boundaries, and counts, sums and missing counts come from bincount.
+
     Parameters:
         data (DataFrame): DataFrame containing the data.
         category_column (str): Name of the column containing categories.
@@ -68,66 +549,113 @@ def generate_summary_stats(data, category_column, value_column):
     Returns:
         DataFrame: DataFrame containing summary statistics.
     """
-    summary_stats = data.groupby([category_column]).agg(
-        N=(value_column, 'count'),
-        Missing=(value_column, lambda x: (x.isnull().sum()/data.shape[0])*100),
-        Min=(value_column, 'min'),
-        Mean=(value_column, 'mean'),
-        Q1=(value_column, lambda x: x.quantile(0.25)),
-        Median=(value_column, 'median'),
-        Q3=(value_column, lambda x: x.quantile(0.75)),
-        Max=(value_column, 'max')
-    ).reset_index().sort_values(by=[category_column], ascending=True)
+    category_values = data[category_column]
+    if isinstance(category_values.dtype, pd.CategoricalDtype):
+        # Sort by value rather than by dictionary order
+        category_values = category_values.cat.reorder_categories(category_values.cat.categories.sort_values())
+    codes, categories = pd.factorize(category_values, sort=True)
+    categories = np.asarray(categories)
+    values = pd.to_numeric(data[value_column], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    n_groups = len(categories)
+
+    # Rows without a category are dropped, as groupby does
+    has_category = codes >= 0
+    codes, values = codes[has_category], values[has_category]
+    is_missing = np.isnan(values)
+    missing = np.bincount(codes[is_missing], minlength=n_groups)
+    codes, values = codes[~is_missing], values[~is_missing]
 
-    summary_stats = summary_stats.rename(columns={category_column: 'Category', 'Missing': 'Missing (%)'})
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.bincount(codes, weights=values, minlength=n_groups)
+    # Sort by value, then stably by category (a radix sort for small codes)
+    by_value = np.argsort(values)
+    group_codes = codes[by_value].astype('int16' if n_groups < 2**15 else 'int64')
+    order = by_value[np.argsort(group_codes, kind='stable')]
+    # Pad so empty groups index a valid (ignored) position
+    sorted_values = np.append(values[order], np.nan)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    last = np.where(counts > 0, starts + counts - 1, len(values))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums / counts
+    summary_stats = pd.DataFrame({
+        'Category': categories,
+        'N': counts,
+        'Missing (%)': (missing / data.shape[0]) * 100,
+        'Min': np.where(counts > 0, sorted_values[np.minimum(starts, len(values))], np.nan),
+        'Mean': mean,
+        'Q1': _sorted_group_quantile(sorted_values, starts, counts, 0.25),
+        'Median': _sorted_group_quantile(sorted_values, starts, counts, 0.5),
+        'Q3': _sorted_group_quantile(sorted_values, starts, counts, 0.75),
+        'Max': sorted_values[last]
+    })
 
     return summary_stats
 
 def find_closest_match(label, labels):
-    closest_label = None
-    highest_similarity = -1
-    for lab_label in labels:
-        similarity = fuzz.partial_ratio(label, lab_label)
-        if similarity > highest_similarity:
-            closest_label = lab_label
-            highest_similarity = similarity
-    return closest_label, highest_similarity
+    matches = closest_matches([label], labels)
+    if matches.empty:
+        return None, -1
+    return matches.at[0, 'match'], matches.at[0, 'similarity']
 
-def check_categories_exist(data, outlier_thresholds, category_column):
+def check_categories_exist(data, outlier_thresholds, category_column, top_k=1, return_matches=False):
     """
     Check if categories in outlier thresholds match with categories in the data DataFrame.
 
+    All threshold categories missing from the data are matched against the
+    data categories in one batch with closest_matches.
+
     Parameters:
         data (DataFrame): DataFrame containing the data.
         outlier_thresholds (DataFrame): DataFrame containing outlier thresholds.
         category_column (str): Name of the column containing categories.
+        top_k (int): Closest data categories kept per missing category.
+        return_matches (bool): Also return the closest_matches table.
 
     Returns:
-        None
+        tuple: (similar_categories, missing_categories), where
+               similar_categories pairs missing categories with a data
+               category of similarity 90 or more and missing_categories
+               lists the others, followed by the top_k closest data
+               categories of every missing category if return_matches.
     """
-    categories = data[category_column].unique()
-    # Lower case categories
-    categories = [category.lower() for category in categories]
-    missing_categories = []
+    # Sorted, so ties between equally close categories resolve the same way whatever the row order
+    categories = np.sort(pd.Series(data[category_column].dropna().unique()).astype(str).str.lower().unique())
+    thresholds = outlier_thresholds[category_column]
+    absent = thresholds[~thresholds.isin(categories)].tolist()
+    matches = closest_matches(list(dict.fromkeys(absent)), categories, top_k=top_k)
+    best = matches[matches['rank'] == 1].set_index('query')
     similar_categories = []
-
-    # Iterate through outlier_thresholds DataFrame
-    for _, row in outlier_thresholds.iterrows():
-        category = row[category_column]
-        # Check if category exists in data categories
-        if category not in categories:
-            # If not found, find closest match
-            closest_match, similarity = find_closest_match(category, categories)
-            if similarity >= 90:  # Set a threshold for similarity score
-                similar_categories.append((category, closest_match))
-            else:
-                missing_categories.append(category)  
+    missing_categories = []
+    for category in absent:
+        # Set a threshold for similarity score
+        if category in best.index and best.at[category, 'similarity'] >= 90:
+            similar_categories.append((category, best.at[category, 'match']))
+        else:
+            missing_categories.append(category)
+    if return_matches:
+        return similar_categories, missing_categories, matches
     return similar_categories, missing_categories
 
+def _category_codes(series, categories):
+    """
+    Map each value of a category column to its position in categories
+    (-1 where the value is missing or not listed) without a Python loop.
+    """
+    categories = pd.Index(categories)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Translate the dictionary once, then index it with the row codes
+        lookup = np.append(categories.get_indexer(series.cat.categories), -1)
+        return lookup[series.cat.codes.to_numpy()]
+    return categories.get_indexer(series)
+
 def replace_outliers_with_na_long(df, df_outlier_thresholds, category_variable, numeric_variable):
     """
     Replace outliers in the labs DataFrame with NaNs based on outlier thresholds.
 
+    Each row's category is mapped to its lower/upper limit in one vectorized
+    lookup and all rows are masked in a single pass.
+
     Parameters:
         df (DataFrame): DataFrame containing lab data.
         df_outlier_thresholds (DataFrame): DataFrame containing outlier thresholds.
@@ -136,23 +664,28 @@ def replace_outliers_with_na_long(df, df_outlier_thresholds, category_variable,
         DataFrame: Updated DataFrame with outliers replaced with NaNs.
         int: Count of replaced observations.
         float: Proportion of replaced observations.
+        list: (category, lower limit, upper limit, outlier values) for each threshold category.
     """
-    replaced_count = 0
+    thresholds = df_outlier_thresholds.drop_duplicates(subset=category_variable)
+    codes = _category_codes(df[category_variable], thresholds[category_variable])
+
+    # Index -1 (no threshold) picks the trailing NaN, which never flags an outlier
+    lower_limits = np.append(thresholds['lower_limit'].to_numpy(dtype='float64'), np.nan)[codes]
+    upper_limits = np.append(thresholds['upper_limit'].to_numpy(dtype='float64'), np.nan)[codes]
+    values = pd.to_numeric(df[numeric_variable], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    outliers_mask = (values < lower_limits) | (values > upper_limits)
+    replaced_count = int(outliers_mask.sum())
+
+    # Split the (few) outlier rows by category for display
+    outlier_rows = np.flatnonzero(outliers_mask)
+    outlier_codes = codes[outlier_rows]
+    outlier_values = df[numeric_variable].iloc[outlier_rows]
     outlier_details = []
+    for i, (rclif_category, lower_limit, upper_limit) in enumerate(
+            thresholds[[category_variable, 'lower_limit', 'upper_limit']].itertuples(index=False)):
+        outlier_details.append((rclif_category, lower_limit, upper_limit, outlier_values[outlier_codes == i]))
 
-    for _, row in df_outlier_thresholds.iterrows():
-        rclif_category = row[category_variable]
-        lower_limit = row['lower_limit']
-        upper_limit = row['upper_limit']
-        # Filter DataFrame for the current category
-        recorded_values = df.loc[df[category_variable] == rclif_category, numeric_variable]
-        # Identify outliers
-        outliers = recorded_values[(recorded_values < lower_limit) | (recorded_values > upper_limit)]
-        # Store outlier details for display
-        outlier_details.append((rclif_category, lower_limit, upper_limit, outliers))
-        # Replace values outside the specified range with NaNs
-        replaced_count += len(outliers)
-        df.loc[df[category_variable] == rclif_category, numeric_variable] = np.where((recorded_values < lower_limit) | (recorded_values > upper_limit), np.nan, recorded_values)
+    df[numeric_variable] = df[numeric_variable].mask(outliers_mask)
 
     total_count = len(df)
     proportion_replaced = replaced_count / total_count
@@ -195,30 +728,230 @@ def replace_outliers_with_na_wide(data, outlier_thresholds):
 
     return data, total_replaced, proportion_replaced, outlier_details
 
-def generate_facetgrid_histograms(data, category_column, value_column):
+def threshold_ranges(outlier_thresholds, category_column):
     """
-    Generate histograms using seaborn's FacetGrid.
+    Bin range (lower, upper) of each category from its outlier thresholds.
 
     Parameters:
-        data (DataFrame): DataFrame containing the data.
-        category_column (str): Name of the column containing categories.
-        value_column (str): Name of the column containing values.
+        outlier_thresholds (DataFrame): Outlier thresholds with lower_limit and upper_limit.
+        category_column (str): Column of the thresholds naming the category,
+            e.g. 'vital_category' or 'variable_name'.
+
+    Returns:
+        dict: Category to (lower limit, upper limit).
+    """
+    thresholds = outlier_thresholds.drop_duplicates(subset=category_column)
+    return {category: (float(lower), float(upper))
+            for category, lower, upper in thresholds[[category_column, 'lower_limit', 'upper_limit']].itertuples(index=False)}
+
+def _group_histograms(codes, n_groups, values, lower, upper, bins, weights=None):
+    """
+    Counts of bins equal-width bins between each group's lower and upper
+    bounds, plus the counts below (first) and above (last) the bounds, for
+    values coded by group 0..n_groups-1 (-1 for none). Groups with NaN
+    bounds are binned over their own minimum and maximum. The upper bound
+    falls in the last bin, as with np.histogram.
+
+    Returns:
+        array: Edges, of shape (n_groups, bins + 1).
+        array: Counts, of shape (n_groups, bins + 2).
+    """
+    keep = (codes >= 0) & ~np.isnan(values)
+    codes, values = codes[keep], values[keep]
+    weights = None if weights is None else np.asarray(weights, dtype='float64')[keep]
+    lower = np.array(lower, dtype='float64')
+    upper = np.array(upper, dtype='float64')
+    unbounded = np.isnan(lower) | np.isnan(upper)
+    if unbounded.any():
+        data_range = pd.Series(values).groupby(codes).agg(['min', 'max']).reindex(range(n_groups))
+        lower[unbounded] = data_range['min'].to_numpy()[unbounded]
+        upper[unbounded] = data_range['max'].to_numpy()[unbounded]
+    # Groups without values get a unit range, and a single value a unit-wide
+    # range around it, as with np.histogram
+    empty = np.isnan(lower) | np.isnan(upper)
+    lower[empty], upper[empty] = 0.0, 1.0
+    degenerate = upper <= lower
+    lower[degenerate] -= 0.5
+    upper[degenerate] += 0.5
+
+    if len(values):
+        scaled = (values - lower[codes]) / (upper[codes] - lower[codes]) * bins
+        bin_index = np.floor(scaled).astype('int64')
+        bin_index[values == upper[codes]] = bins - 1
+        bin_index = np.clip(bin_index, -1, bins) + 1
+    else:
+        bin_index = np.zeros(0, dtype='int64')
+    counts = np.bincount(codes * (bins + 2) + bin_index, weights=weights, minlength=n_groups * (bins + 2))
+    edges = lower[:, None] + (upper - lower)[:, None] * np.linspace(0, 1, bins + 1)
+    return edges, np.rint(counts).astype('int64').reshape(n_groups, bins + 2)
+
+def _numeric_values(values):
+    return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+def category_histograms(categories, values, bin_ranges=None, bins=HISTOGRAM_BINS, weights=None):
+    """
+    Histogram bin counts of the values of each category, in one vectorized
+    pass over the rows (a bincount on category code and bin).
+
+    Each category's values are binned over its range in bin_ranges (e.g.
+    its outlier thresholds, see threshold_ranges) or else over its own
+    minimum and maximum. Counts over fixed ranges can be added up across
+    batches or partitions, and plotting the counts takes the same time
+    whatever the number of rows.
+
+    Parameters:
+        categories (Series): Category of each value.
+        values (Series): Values to bin; non-numeric values are ignored.
+        bin_ranges (dict, optional): Category to (lower, upper) bin range.
+        bins (int): Number of bins per category.
+        weights (array, optional): Weight of each value, e.g. the number of
+            values a quantile sketch centroid stands for.
 
     Returns:
-        FacetGrid: Seaborn FacetGrid object containing the generated histograms.
+        dict: Category to (edges, counts) in order of first appearance, with
+              bins + 1 edges and bins + 2 counts: the values below the range,
+              the counts of the bins, and the values above the range.
+    """
+    codes, uniques = pd.factorize(categories)
+    uniques = list(uniques)
+    bin_ranges = bin_ranges or {}
+    lower = [bin_ranges.get(category, (np.nan, np.nan))[0] for category in uniques]
+    upper = [bin_ranges.get(category, (np.nan, np.nan))[1] for category in uniques]
+    edges, counts = _group_histograms(codes, len(uniques), _numeric_values(values), lower, upper, bins, weights)
+    return {category: (edges[code], counts[code]) for code, category in enumerate(uniques)}
+
+def column_histograms(data, columns, bin_ranges=None, bins=HISTOGRAM_BINS):
+    """
+    Histogram bin counts of each of several numeric columns, binned column
+    by column without reshaping the data.
+
+    Returns:
+        dict: Column to (edges, counts), as category_histograms.
+    """
+    histograms = {}
+    bin_ranges = bin_ranges or {}
+    codes = np.zeros(len(data), dtype='int64')
+    for column in columns:
+        lower, upper = bin_ranges.get(column, (np.nan, np.nan))
+        edges, counts = _group_histograms(codes, 1, _numeric_values(data[column]), [lower], [upper], bins)
+        histograms[column] = (edges[0], counts[0])
+    return histograms
+
+def device_mode_histograms(data, variables=RESP_HISTOGRAM_VARIABLES, bin_ranges=None, bins=RESP_HISTOGRAM_BINS):
+    """
+    Histograms of the respiratory support variables for every device
+    category and every (device category, mode category) pair, computed
+    together: the rows are coded by device and by pair once, and each
+    variable is binned for all of them in one pass over its column.
+
+    Parameters:
+        data (DataFrame): Respiratory support data.
+        variables (list): Variables to bin.
+        bin_ranges (dict, optional): Variable to (lower, upper) bin range,
+            e.g. threshold_ranges of the outlier thresholds. Variables
+            without one are binned over each selection's own range.
+        bins (int): Number of bins per variable.
+
+    Returns:
+        dict: (device category, mode category) to {variable: (edges, counts)},
+              with mode category None for all modes of a device category.
+    """
+    device_codes, devices = pd.factorize(data['device_category'])
+    mode_codes, modes = pd.factorize(data['mode_category'])
+    n_modes = max(len(modes), 1)
+    # Rows without both categories are not in any pair
+    has_pair = (device_codes >= 0) & (mode_codes >= 0)
+    pair_codes, pairs = pd.factorize(np.where(has_pair, device_codes * n_modes + mode_codes, np.nan))
+    device_selections = [(device, None) for device in devices]
+    pair_selections = [(devices[int(pair) // n_modes], modes[int(pair) % n_modes]) for pair in pairs]
+    histograms = {selection: {} for selection in device_selections + pair_selections}
+    bin_ranges = bin_ranges or {}
+    for variable in variables:
+        if variable not in data.columns:
+            continue
+        values = _numeric_values(data[variable])
+        lower, upper = bin_ranges.get(variable, (np.nan, np.nan))
+        for codes, keys in ((device_codes, device_selections), (pair_codes, pair_selections)):
+            edges, counts = _group_histograms(codes, len(keys), values, [lower] * len(keys), [upper] * len(keys), bins)
+            for i, key in enumerate(keys):
+                histograms[key][variable] = (edges[i], counts[i])
+    return histograms
+
+def merge_histograms(left, right):
+    """
+    Add up the bin counts of two sets of histograms over the same ranges.
     """
-    # Create a FacetGrid
-    g = sns.FacetGrid(data, col=category_column, col_wrap=3, sharex=False, sharey=False)
-    g.map(sns.histplot, value_column, bins=30, color='dodgerblue', edgecolor='black')
+    merged = dict(left)
+    for category, (edges, counts) in right.items():
+        merged[category] = (edges, counts) if category not in merged else (edges, merged[category][1] + counts)
+    return merged
 
-    # Set titles and labels
-    g.set_titles(col_template='{col_name}')
-    g.set_axis_labels(value_column, 'Frequency')
+def merge_device_mode_histograms(left, right):
+    """
+    Add up two sets of device_mode_histograms over the same bin ranges.
+    """
+    merged = dict(left)
+    for selection, histograms in right.items():
+        merged[selection] = histograms if selection not in merged else merge_histograms(merged[selection], histograms)
+    return merged
 
-    # Adjust layout and add a main title
+def plot_histograms(histograms, value_label, count_label='Frequency', col_wrap=3, color='dodgerblue'):
+    """
+    Draw one histogram facet per category from precomputed bin counts.
+    Values outside a category's bin range are drawn as hatched bars just
+    outside it.
+
+    Parameters:
+        histograms (dict): Category to (edges, counts), from category_histograms.
+        value_label (str): Label of the x axes.
+        count_label (str): Label of the y axes.
+        col_wrap (int): Number of facets per row.
+        color (str): Color of the bars.
+
+    Returns:
+        Figure: Matplotlib figure with the facets.
+    """
+    n_facets = max(len(histograms), 1)
+    n_cols = min(col_wrap, n_facets)
+    n_rows = -(-n_facets // n_cols)
+    figure, axes = plt.subplots(n_rows, n_cols, figsize=(3 * n_cols, 3 * n_rows), squeeze=False)
+    for ax, (category, (edges, counts)) in zip(axes.flat, histograms.items()):
+        widths = np.diff(edges)
+        ax.bar(edges[:-1], counts[1:-1], width=widths, align='edge', color=color, edgecolor='black')
+        if counts[0] > 0 or counts[-1] > 0:
+            ax.bar([edges[0] - widths[0], edges[-1]], [counts[0], counts[-1]], width=widths[0], align='edge',
+                   color='lightgray', edgecolor='black', hatch='//', label='Outside range')
+            ax.legend(fontsize='x-small')
+        ax.set_title(str(category))
+        ax.set_xlabel(value_label)
+        ax.set_ylabel(count_label)
+    for ax in axes.flat[len(histograms):]:
+        ax.set_visible(False)
     plt.subplots_adjust(top=0.9, hspace=0.4, wspace=0.4)
+    return figure
 
-    return g
+def generate_facetgrid_histograms(data, category_column, value_column, outlier_thresholds=None):
+    """
+    Generate histograms of the values of each category, one facet per
+    category in order of appearance.
+
+    The bin counts are computed in one pass (see category_histograms) and
+    the facets are drawn from the counts, so plotting time does not depend
+    on the number of rows.
+
+    Parameters:
+        data (DataFrame): DataFrame containing the data.
+        category_column (str): Name of the column containing categories.
+        value_column (str): Name of the column containing values.
+        outlier_thresholds (DataFrame, optional): Outlier thresholds whose
+            limits are used as the bin ranges of their categories.
+
+    Returns:
+        Figure: Matplotlib figure containing the generated histograms.
+    """
+    bin_ranges = threshold_ranges(outlier_thresholds, category_column) if outlier_thresholds is not None else None
+    histograms = category_histograms(data[category_column], data[value_column], bin_ranges)
+    return plot_histograms(histograms, value_column)
 
 def non_scientific_format(x):
     """
@@ -234,31 +967,197 @@ def plot_histograms_by_device_category(data, selected_category, selected_mode =
         data (DataFrame): DataFrame containing the data.
         selected_category (str): Selected device category.
     """
-    variables_to_plot = ["fio2_set", "lpm_set", "tidal_volume_set", "resp_rate_set", 
-            "pressure_control_set", "pressure_support_set", "flow_rate_set", 
-            "peak_inspiratory_pressure_set", "inspiratory_time_set", "peep_set", 
-            "tidal_volume_obs", "resp_rate_obs", "plateau_pressure_obs", 
-            "peak_inspiratory_pressure_obs", "peep_obs", "minute_vent_obs"]
-    variables_to_plot.sort()
     if selected_mode:
         filtered_df = data[(data['device_category'] == selected_category) & (data['mode_category'] == selected_mode)]
     else:
         filtered_df = data[data['device_category'] == selected_category]
-    data_melted = filtered_df.melt(value_vars=variables_to_plot, 
-                                var_name='Variable', value_name='Value')
-    g = sns.FacetGrid(data_melted, col="Variable", col_wrap=4, sharex=False, sharey=False)
-    g.map(sns.histplot, "Value", kde=False, bins=20)
-    g.set_titles("{col_name}")
-    g.set_axis_labels("Value", "Count")
-    plt.subplots_adjust(top=0.9, hspace=0.4, wspace=0.4)
-    return g
+    return plot_device_histograms(column_histograms(filtered_df, RESP_HISTOGRAM_VARIABLES, bins=RESP_HISTOGRAM_BINS))
+
+def plot_device_histograms(histograms):
+    """
+    Draw the respiratory support variable histograms of one device (and
+    mode) category, e.g. an entry of device_mode_histograms.
+    """
+    return plot_histograms(histograms, "Value", count_label="Count", col_wrap=4, color='steelblue')
+
+def _device_mode_slices(data):
+    """
+    Sort the rows once by device_category and mode_category, so that every
+    device category and every (device category, mode category) pair is a
+    contiguous block of the sorted frame.
+
+    Returns:
+        DataFrame: The sorted rows.
+        dict: (device category, mode category) to the (start, stop) offsets
+              of its rows, with mode category None for all modes of a
+              device category.
+    """
+    device_codes, devices = pd.factorize(data['device_category'], sort=True)
+    mode_codes, modes = pd.factorize(data['mode_category'], sort=True)
+    # Rows without a device category go last
+    device_codes = np.where(device_codes < 0, len(devices), device_codes)
+    order = np.lexsort((mode_codes, device_codes))
+    device_codes = device_codes[order]
+    mode_codes = mode_codes[order]
+    # Codes of the pairs, increasing along the sorted rows
+    pair_codes = device_codes * (len(modes) + 1) + mode_codes + 1
+    slices = {}
+    for codes, with_mode in ((device_codes, False), (pair_codes, True)):
+        starts = np.flatnonzero(np.diff(codes, prepend=-1))
+        stops = np.append(starts[1:], len(codes))
+        for start, stop in zip(starts, stops):
+            if device_codes[start] == len(devices) or (with_mode and mode_codes[start] < 0):
+                continue
+            mode = modes[mode_codes[start]] if with_mode else None
+            slices[(devices[device_codes[start]], mode)] = (int(start), int(stop))
+    return data.iloc[order].reset_index(drop=True), slices
+
+def device_mode_name_counts(data):
+    """
+    Row counts of each combination of device_category, mode_category,
+    device_name and mode_name, missing values included. Counts of two sets
+    of rows add up, and device_mode_mappings derives the name to category
+    mappings of every device and mode selection from them.
+
+    Returns:
+        Series: Row counts indexed by DEVICE_MODE_COLUMNS.
+    """
+    counts = data.groupby(DEVICE_MODE_COLUMNS, observed=True, dropna=False).size()
+    counts.index = pd.MultiIndex.from_arrays([counts.index.get_level_values(level).astype(object)
+                                              for level in range(counts.index.nlevels)], names=DEVICE_MODE_COLUMNS)
+    return counts
+
+def device_mode_mappings(name_counts):
+    """
+    Row count and name to category mappings of every device category and
+    every (device category, mode category) pair.
+
+    Parameters:
+        name_counts (Series): Row counts from device_mode_name_counts.
+
+    Returns:
+        dict: (device category, mode category) to 'count' (rows in the
+              selection) and the 'device_mapping' and 'mode_mapping' name to
+              category counts of its rows, with mode category None for all
+              modes of a device category.
+    """
+    counts = name_counts.reset_index(name='count')
+    selections = {}
+    for keys in (['device_category'], ['device_category', 'mode_category']):
+        for key, rows in counts.dropna(subset=keys).groupby(keys):
+            selection = key if len(keys) == 2 else (key[0], None)
+            selections[selection] = {'count': int(rows['count'].sum())}
+            for mapping, category, name in (('device_mapping', 'device_category', 'device_name'),
+                                            ('mode_mapping', 'mode_category', 'mode_name')):
+                selections[selection][mapping] = (rows.dropna(subset=[category, name])
+                                                  .groupby([category, name])['count'].sum().reset_index())
+    return selections
+
+def device_mode_summaries(data):
+    """
+    Summaries of the respiratory support rows of every device category and
+    every (device category, mode category) pair, for the device category
+    explorer. The rows are sorted once by device and mode category, so each
+    selection is summarized from a slice of the sorted frame.
+
+    Parameters:
+        data (DataFrame): Respiratory support data.
+
+    Returns:
+        dict: Entries of device_mode_mappings, each with its 'summary'
+              (describe() of the selection) added.
+    """
+    summaries = device_mode_mappings(device_mode_name_counts(data))
+    sorted_data, slices = _device_mode_slices(data)
+    for selection, (start, stop) in slices.items():
+        summaries[selection]['summary'] = sorted_data.iloc[start:stop].describe()
+    return summaries
+
+def first_modes(data):
+    """
+    First recorded mode category of each encounter: the earliest row by
+    recorded_dttm with a mode category, the earlier row in the data on
+    ties. Applied to the concatenated first modes of two sets of rows (the
+    earlier set first), it gives the first modes of both.
+
+    Returns:
+        DataFrame: hospitalization_id, recorded_dttm and mode_category, one
+                   row per encounter.
+    """
+    modes = data.loc[data['mode_category'].notna(), ['hospitalization_id', 'recorded_dttm', 'mode_category']]
+    # Sorting on several columns is stable
+    return modes.sort_values(['hospitalization_id', 'recorded_dttm']).drop_duplicates('hospitalization_id')
+
+def initial_mode_counts(modes, encounters):
+    """
+    Counts of the first mode category of the given encounters.
+
+    Parameters:
+        modes (DataFrame): First modes from first_modes.
+        encounters: hospitalization_id values to count.
+
+    Returns:
+        DataFrame: mode_category and count, by mode category.
+    """
+    initial = modes.loc[modes['hospitalization_id'].isin(encounters), 'mode_category'].astype(object)
+    return initial.value_counts().sort_index().rename_axis('mode_category').reset_index(name='count')
+
+def initial_mode_choice(data):
+    """
+    Counts of the first recorded mode category (by recorded_dttm) of each
+    encounter on invasive mechanical ventilation (IMV).
+    """
+    encounters_w_vent = data.loc[data['device_category'] == 'IMV', 'hospitalization_id'].unique()
+    return initial_mode_counts(first_modes(data), encounters_w_vent)
+
+
+def _dtype_matches(actual_dtype, expected_dtype):
+    """
+    Check whether a column dtype satisfies the expected data type. A
+    categorical of strings satisfies 'object'.
+    """
+    if expected_dtype == 'datetime64':
+        return pd.api.types.is_datetime64_any_dtype(actual_dtype)
+    if expected_dtype == 'object' and isinstance(actual_dtype, pd.CategoricalDtype):
+        return pd.api.types.is_object_dtype(actual_dtype.categories.dtype) or \
+            pd.api.types.is_string_dtype(actual_dtype.categories.dtype)
+    return actual_dtype == expected_dtype
+
+def _convert_column(data, column, expected_dtype):
+    """
+    Convert a single column to the expected data type, coercing invalid
+    datetime and numeric values to NaT/NaN.
+    """
+    if expected_dtype == 'datetime64':
+        data[column] = pd.to_datetime(data[column], errors='coerce')
+    elif expected_dtype == 'float64':
+        data[column] = pd.to_numeric(data[column], errors='coerce')
+    elif expected_dtype == 'bool':
+        data[column] = data[column].astype('bool')
+    else:
+        data[column] = data[column].astype(expected_dtype)
 
+def _apply_expected_dtypes(data, dtypes):
+    """
+    Convert the columns that are not yet of their expected data type.
+    """
+    for column, expected_dtype in dtypes.items():
+        if column in data.columns and not _dtype_matches(data[column].dtype, expected_dtype):
+            try:
+                _convert_column(data, column, expected_dtype)
+            except Exception as e:
+                logger.error(f"Error converting column {column} to {expected_dtype}: {e}")
+    return data
 
 def validate_and_convert_dtypes(table_name, data):
     """
     Validate and convert data types of columns in the DataFrame 
     based on expected data types.
 
+    If the data was loaded by read_data with dtypes, validation is
+    reported against the physical dtypes of the file and columns that were
+    already converted during the read are not walked again.
+
     Parameters:
         table_name (str): Name of the table.
         data (DataFrame): DataFrame to validate and convert data types.
@@ -269,44 +1168,25 @@ def validate_and_convert_dtypes(table_name, data):
               expected dtype, and validation status.
     """
     expected_dtypes = expected_data_types[table_name]
+    physical_dtypes = data.attrs.get('physical_dtypes', {})
     validation_results = []
 
     for column, expected_dtype in expected_dtypes.items():
         if column in data.columns:
-            actual_dtype = data[column].dtype
+            if column in physical_dtypes:
+                actual_dtype = pd.api.types.pandas_dtype(physical_dtypes[column])
+            else:
+                actual_dtype = data[column].dtype
 
-            # Check if the expected type is datetime64
-            if expected_dtype == 'datetime64':
-                # Ensure the column is in a valid datetime format
-                if not pd.api.types.is_datetime64_any_dtype(actual_dtype):
-                    validation_results.append((column, actual_dtype, 'datetime64', 'Mismatch'))
+            if _dtype_matches(actual_dtype, expected_dtype):
+                validation_results.append((column, actual_dtype, expected_dtype, 'Match'))
+            else:
+                validation_results.append((column, actual_dtype, expected_dtype, 'Mismatch'))
+                if not _dtype_matches(data[column].dtype, expected_dtype):
                     try:
-                        # Attempt to convert to datetime, coerce errors to NaT
-                        data[column] = pd.to_datetime(data[column], errors='coerce')
-                        # validation_results[-1] = (column, actual_dtype, expected_dtype, 'Converted')
+                        _convert_column(data, column, expected_dtype)
                     except Exception as e:
-                        logger.error(f"Error converting column {column} to datetime: {e}")
-                else:
-                    validation_results.append((column, actual_dtype, 'datetime64', 'Match'))
-
-            # Handle non-datetime expected types
-            elif actual_dtype != expected_dtype:
-                validation_results.append((column, actual_dtype, expected_dtype, 'Mismatch'))
-                try:
-                    # Convert to the expected dtype
-                    if expected_dtype == 'float64':
-                        data[column] = pd.to_numeric(data[column], errors='coerce')
-                    elif expected_dtype == 'bool':
-                        data[column] = data[column].astype('bool')
-                    else:
-                        data[column] = data[column].astype(expected_dtype)
-
-                    # validation_results[-1] = (column, actual_dtype, expected_dtype, 'Converted')
-
-                except Exception as e:
-                    logger.error(f"Error converting column {column} to {expected_dtype}: {e}")
-            else:
-                validation_results.append((column, actual_dtype, expected_dtype, 'Match'))
+                        logger.error(f"Error converting column {column} to {expected_dtype}: {e}")
         else:
             # Log missing columns
             validation_results.append((column, 'Not Found', expected_dtype, 'Missing'))
@@ -314,6 +1194,60 @@ def validate_and_convert_dtypes(table_name, data):
     return data, validation_results         
 
 
+def hash_rows(data, columns=None):
+    """
+    Hash each row (or its values in the given columns) to a uint64, combining
+    the columns one at a time rather than building row tuples.
+    """
+    subset = data if columns is None else data[list(columns)]
+    floats = subset.select_dtypes(include='floating').columns
+    if len(floats):
+        # -0.0 and 0.0 hash differently but are equal to duplicated()
+        subset = subset.assign(**{column: subset[column] + 0.0 for column in floats})
+    try:
+        return pd.util.hash_pandas_object(subset, index=False).to_numpy()
+    except TypeError:
+        # Object columns mixing strings and other types hash as their text
+        return pd.util.hash_pandas_object(subset.astype(str), index=False).to_numpy()
+
+def find_duplicates(data, columns=None, sample_rows=10):
+    """
+    Count rows that repeat an earlier row, as data.duplicated(subset=columns).sum()
+    would, without comparing full rows.
+
+    Rows are hashed to uint64 and only rows whose hash is shared by another
+    row are compared exactly, so hash collisions never produce false
+    duplicates.
+
+    Parameters:
+        data (DataFrame): DataFrame to check.
+        columns (list, optional): Key columns; rows with equal values in these
+            columns count as duplicates. Defaults to all columns.
+        sample_rows (int): Maximum number of duplicated rows returned.
+
+    Returns:
+        int: Number of duplicate rows.
+        DataFrame: Sample of duplicated rows (every occurrence, grouped), or
+                   None when there are no duplicates.
+    """
+    hashes = hash_rows(data, columns)
+    order = np.argsort(hashes, kind='stable')
+    sorted_hashes = hashes[order]
+    shared = np.zeros(len(hashes), dtype=bool)
+    shared[1:] = sorted_hashes[1:] == sorted_hashes[:-1]
+    shared[:-1] |= shared[1:]
+    if not shared.any():
+        return 0, None
+
+    # Verify the candidates exactly, in hash order so equal rows are adjacent
+    candidates = data.iloc[order[shared]]
+    subset = None if columns is None else list(columns)
+    duplicate_count = int(candidates.sort_index().duplicated(subset=subset).sum())
+    if duplicate_count == 0:
+        return 0, None
+    sample = candidates[candidates.duplicated(subset=subset, keep=False)].head(sample_rows)
+    return duplicate_count, sample
+
 def name_category_mapping(data):
     """
     
@@ -324,17 +1258,59 @@ def name_category_mapping(data):
     for var in vars:
         var_category = var.replace('_name', '_category')
         if var_category in data.columns:
-            frequency = data.groupby([var, var_category]).size().reset_index(name='counts')
+            frequency = data.groupby([var, var_category], observed=True).size().reset_index(name='counts')
+            categorical = [col for col in (var, var_category) if isinstance(data[col].dtype, pd.CategoricalDtype)]
+            if categorical:
+                # Categorical keys are grouped in dictionary order; restore value order
+                frequency = frequency.astype({col: object for col in categorical}).sort_values(by=[var, var_category])
             frequency = frequency.sort_values(by='counts', ascending=False)
             mappings.append(frequency)
     return mappings
 
-def check_time_overlap(data, root_location, filetype):
+# ADT columns the overlap check uses
+OVERLAP_COLUMNS = ['hospitalization_id', 'patient_id', 'location_name', 'location_category', 'in_dttm', 'out_dttm']
+
+def _sorted_stays(data):
+    """
+    Sort ADT rows by patient and in_dttm and flag rows whose stay overlaps
+    the next stay of the same patient in a different location.
+
+    Returns:
+        DataFrame: Sorted data.
+        ndarray: Boolean overlap flag for each sorted row.
+    """
+    data = data.sort_values(by=['patient_id', 'in_dttm'])
+    patient_id = data['patient_id'].to_numpy()
+    location_name = data['location_name'].to_numpy()
+    in_dttm = data['in_dttm'].to_numpy()
+    out_dttm = data['out_dttm'].to_numpy()
+    # Compare each row with the next one (the shift(-1) of every column)
+    overlaps = np.zeros(len(data), dtype=bool)
+    overlaps[:-1] = (
+        (patient_id[:-1] == patient_id[1:]) &
+        pd.notna(patient_id[:-1]) &
+        (location_name[:-1] != location_name[1:]) &
+        (out_dttm[:-1] > in_dttm[1:])
+    )
+    return data, overlaps
+
+def check_time_overlap(data, hospitalization_table=None):
+    """
+    Find stays that overlap the next stay of the same patient in a
+    different location.
+
+    Parameters:
+        data (DataFrame): ADT data.
+        hospitalization_table (DataFrame, optional): Already loaded hospitalization
+            data used to look up patient_id when the ADT data has none.
+
+    Returns:
+        DataFrame: One row per overlap with the patient, both locations and
+            the stay times.
+    """
     try:
         # Check if 'patient_id' exists in the data
         if 'patient_id' not in data.columns:
-            hospitalization_path = os.path.join(root_location, f'clif_hospitalization.{filetype}')
-            hospitalization_table = read_data(hospitalization_path, filetype)
             if hospitalization_table is None:
                 raise ValueError("patient_id is missing, and the hospitalization table is not provided.")
             
@@ -349,58 +1325,55 @@ def check_time_overlap(data, root_location, filetype):
             if 'patient_id' not in data.columns or data['patient_id'].isnull().all():
                 raise ValueError("Unable to retrieve patient_id after joining with hospitalization_table.")
         
-        
-        # Sort by patient_id and in_dttm to make comparisons easier
-        data = data.sort_values(by=['patient_id', 'in_dttm'])
-        
-        overlaps = []
-        
-        # Group by patient_id to compare bookings for each patient
-        for patient_id, group in data.groupby('patient_id'):
-            for i in range(len(group) - 1):
-                # Current and next bookings
-                current = group.iloc[i]
-                next = group.iloc[i + 1]
-
-                # Check if the locations are different and times overlap
-                if (
-                    current['location_name'] != next['location_name'] and
-                    current['out_dttm'] > next['in_dttm']
-                ):
-                    overlaps.append({
-                        'patient_id': patient_id,
-                        'Initial Location': (current['location_name'], current['location_category']),
-                        'Overlapping Location': (next['location_name'], next['location_name']),
-                        'Admission Start': current['in_dttm'],
-                        'Admission End': current['out_dttm'],
-                        'Next Admission Start': next['in_dttm']
-                    })
-        
-        return overlaps
+        data, overlaps = _sorted_stays(data)
+        current = data[overlaps]
+        following = data.iloc[np.flatnonzero(overlaps) + 1]
+
+        return pd.DataFrame({
+            'patient_id': current['patient_id'].to_numpy(),
+            'Initial Location': list(zip(current['location_name'], current['location_category'])),
+            'Overlapping Location': list(zip(following['location_name'], following['location_category'])),
+            'Admission Start': current['in_dttm'].to_numpy(),
+            'Admission End': current['out_dttm'].to_numpy(),
+            'Next Admission Start': following['in_dttm'].to_numpy()
+        })
     
     except Exception as e:
         # Handle errors gracefully
         raise RuntimeError(f"Error checking time overlap: {str(e)}")
 
-def fix_overlaps(data, overlapping_patient_ids):
+def fix_overlaps(data, overlapping_patient_ids=None, output_path=None):
     """
-    Fix overlaps only for the specified patient IDs with detected overlaps.
+    Fix overlapping stays by ending each stay one minute before the next
+    stay of the same patient begins.
+
+    All overlapping rows are corrected in one bulk assignment.
+
+    Parameters:
+        data (DataFrame): ADT data with patient_id.
+        overlapping_patient_ids (list, optional): Only fix (and return) these
+            patients. The full table is fixed when not given.
+        output_path (str, optional): Write the corrected table to this parquet file.
+
+    Returns:
+        DataFrame: Corrected data sorted by patient_id and in_dttm.
     """
     # Filter only relevant patients with detected overlaps
-    data = data[data['patient_id'].isin(overlapping_patient_ids)]
+    if overlapping_patient_ids is not None:
+        data = data[data['patient_id'].isin(overlapping_patient_ids)]
 
     # Sort the data to ensure chronological order for adjustments
     data = data.sort_values(by=['patient_id', 'in_dttm'])
+    # The corrected table no longer matches the file it was read from
+    data.attrs = {}
 
-    # Iterate over each patient’s data to fix overlaps
-    for patient_id, group in data.groupby('patient_id'):
-        for i in range(len(group) - 1):
-            current_idx = group.index[i]
-            next_idx = group.index[i + 1]
+    # A stay overlaps when it ends after the same patient's next stay begins
+    next_in_dttm = data['in_dttm'].shift(-1)
+    overlaps = data['patient_id'].eq(data['patient_id'].shift(-1)) & (data['out_dttm'] > next_in_dttm)
+    data.loc[overlaps, 'out_dttm'] = next_in_dttm[overlaps] - pd.Timedelta(minutes=1)
+    logger.info(f"Fixed {overlaps.sum()} overlapping stays.")
 
-            # If there's an overlap, adjust the current out_dttm
-            if data.loc[current_idx, 'out_dttm'] > data.loc[next_idx, 'in_dttm']:
-                # Set the out_dttm to just before the next in_dttm
-                data.loc[current_idx, 'out_dttm'] = data.loc[next_idx, 'in_dttm'] - pd.Timedelta(minutes=1)
+    if output_path is not None:
+        data.to_parquet(output_path, index=False)
 
     return data
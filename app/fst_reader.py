@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Reader for fst files, the columnar format of R's fst package. There is no
+# Python implementation of the format, so each fst file is converted once to
+# parquet with R (fst::read_fst and arrow::write_parquet) and the parquet copy
+# is cached next to the other app caches. All reads then go through the
+# parquet copy, with column projection, filters and row ranges like any other
+# parquet table. The copy is re-made when the fst file changes.
+
+FST_CACHE_DIR = os.environ.get('CLIF_FST_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.clif_lighthouse', 'fst_cache'))
+RSCRIPT = os.environ.get('CLIF_RSCRIPT', 'Rscript')
+# Rows converted at a time, each written as one parquet part file, so R
+# never holds more than this many rows of a table
+FST_CHUNK_ROWS = 1_000_000
+CONVERT_TIMEOUT = 6 * 60 * 60
+
+CONVERT_SCRIPT = r'''
+args <- commandArgs(trailingOnly = TRUE)
+source <- args[1]
+output <- args[2]
+chunk_rows <- as.numeric(args[3])
+n_rows <- fst::metadata_fst(source)$nrOfRows
+dir.create(output, showWarnings = FALSE)
+if (n_rows == 0) {
+  arrow::write_parquet(fst::read_fst(source), file.path(output, "part-00000.parquet"))
+} else {
+  starts <- seq(1, n_rows, by = chunk_rows)
+  for (i in seq_along(starts)) {
+    to <- min(starts[i] + chunk_rows - 1, n_rows)
+    chunk <- fst::read_fst(source, from = starts[i], to = to)
+    arrow::write_parquet(chunk, file.path(output, sprintf("part-%05d.parquet", i - 1)))
+  }
+}
+'''
+
+
+def _path_prefix(filepath):
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    return f"{name}-{hashlib.sha256(os.path.abspath(filepath).encode()).hexdigest()[:12]}"
+
+def _cache_path(filepath):
+    """
+    Directory of the parquet copy of an fst file, named after the file and
+    its size and modification time.
+    """
+    stat = os.stat(filepath)
+    version = hashlib.sha256(repr((stat.st_size, stat.st_mtime_ns)).encode()).hexdigest()[:12]
+    return os.path.join(FST_CACHE_DIR, f"{_path_prefix(filepath)}-{version}")
+
+def _convert(filepath, output_dir):
+    if shutil.which(RSCRIPT) is None:
+        raise RuntimeError(
+            f"Reading fst files needs R with the fst and arrow packages ('{RSCRIPT}' was not found). "
+            "Install R and run install.packages(c('fst', 'arrow')), set CLIF_RSCRIPT to the Rscript "
+            "executable, or convert the tables to parquet.")
+    with tempfile.NamedTemporaryFile('w', suffix='.R', delete=False) as script:
+        script.write(CONVERT_SCRIPT)
+    try:
+        result = subprocess.run([RSCRIPT, script.name, filepath, output_dir, str(FST_CHUNK_ROWS)],
+                                capture_output=True, text=True, timeout=CONVERT_TIMEOUT)
+    finally:
+        os.remove(script.name)
+    if result.returncode != 0:
+        raise RuntimeError(f"Converting {filepath} to parquet failed: {result.stderr.strip()}")
+
+def fst_to_parquet(filepath):
+    """
+    Parquet copy of an fst file, converting it on first use.
+
+    Parameters:
+        filepath (str): Path to the fst file.
+
+    Returns:
+        str: Directory of parquet part files holding the table, in row order.
+    """
+    cache_path = _cache_path(filepath)
+    if os.path.isdir(cache_path):
+        return cache_path
+    os.makedirs(FST_CACHE_DIR, exist_ok=True)
+    logger.info(f"Converting {filepath} to parquet...")
+    # Convert into a temporary directory first so concurrent readers never
+    # see a partial copy
+    tmp_path = tempfile.mkdtemp(dir=FST_CACHE_DIR, prefix='.converting-')
+    try:
+        _convert(filepath, tmp_path)
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        # Another process converted the same file first
+        if not os.path.isdir(cache_path):
+            raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    # Copies of older versions of the file are no longer needed
+    prefix = _path_prefix(filepath)
+    for entry in os.listdir(FST_CACHE_DIR):
+        if entry.startswith(prefix) and entry != os.path.basename(cache_path):
+            shutil.rmtree(os.path.join(FST_CACHE_DIR, entry), ignore_errors=True)
+    logger.info(f"Converted {filepath} to {cache_path}.")
+    return cache_path
+
+def fst_parquet_files(filepath):
+    """
+    Parquet part files holding an fst file's table, in row order.
+    """
+    cache_path = fst_to_parquet(filepath)
+    return [os.path.join(cache_path, entry) for entry in sorted(os.listdir(cache_path)) if entry.endswith('.parquet')]
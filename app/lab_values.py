@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Parser of lab_value strings into lab_value_numeric. A labs table holds a
+# few hundred thousand distinct lab_value strings at most, however many rows
+# it has, so only the distinct strings are parsed and the results are mapped
+# back to the rows through their codes. Parsed strings are kept in a parse
+# table, in memory and on disk, so strings seen in earlier runs (or earlier
+# batches and partitions) are not parsed again.
+#
+# A string that is a plain number is taken as is. Otherwise the first number
+# in it is extracted with its sign, along with a comparison operator in front
+# of it: censored results such as "<0.5" or ">1000" give the limit (0.5,
+# 1000) as lab_value_numeric and the operator in lab_value_operator.
+
+LAB_VALUE_CACHE_DIR = os.environ.get('CLIF_LAB_VALUE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.clif_lighthouse', 'lab_value_cache'))
+LAB_VALUE_CACHE_MAX_ENTRIES = int(os.environ.get('CLIF_LAB_VALUE_CACHE_MAX_ENTRIES', 2_000_000))
+# Bump when the parsing rules change, so cached parse tables are not reused
+PARSER_VERSION = 1
+
+LAB_VALUE_OPERATORS = ['<', '<=', '>', '>=']
+LAB_VALUE_PATTERN = r'(?P<operator>[<>]=?|≤|≥)?\s*(?P<number>[+-]?(?:\d+\.?\d*|\.\d+))'
+OPERATOR_ALIASES = {'≤': '<=', '≥': '>='}
+
+_parse_table = None
+_parse_table_lock = threading.Lock()
+
+
+def _cache_path():
+    return os.path.join(LAB_VALUE_CACHE_DIR, f"lab_values-v{PARSER_VERSION}.parquet")
+
+def _empty_parse_table():
+    return pd.DataFrame({'numeric': pd.Series(dtype='float64'), 'operator': pd.Series(dtype='int8'),
+                         'plain': pd.Series(dtype='bool')}, index=pd.Index([], dtype='object', name='lab_value'))
+
+def _load_parse_table():
+    path = _cache_path()
+    if not os.path.exists(path):
+        return _empty_parse_table()
+    try:
+        return pd.read_parquet(path)
+    except Exception as e:
+        logger.warning(f"Discarding unreadable lab value parse table {path}: {e}")
+        os.remove(path)
+        return _empty_parse_table()
+
+def save_parse_table():
+    """
+    Write the in-memory parse table to disk, keeping the most recently
+    parsed LAB_VALUE_CACHE_MAX_ENTRIES strings.
+    """
+    with _parse_table_lock:
+        if _parse_table is None:
+            return
+        table = _parse_table.iloc[-LAB_VALUE_CACHE_MAX_ENTRIES:]
+        os.makedirs(LAB_VALUE_CACHE_DIR, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial table
+        path = _cache_path()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        table.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+
+def _parse_strings(strings):
+    """
+    Parse lab_value strings, one row per string.
+    """
+    strings = pd.Series(strings, dtype='object')
+    numeric = pd.to_numeric(strings, errors='coerce')
+    plain = numeric.notna().to_numpy()
+    operator = np.full(len(strings), -1, dtype='int8')
+    unparsed = ~plain
+    if unparsed.any():
+        extracted = strings[unparsed].str.extract(LAB_VALUE_PATTERN)
+        numeric[unparsed] = pd.to_numeric(extracted['number'], errors='coerce')
+        operators = extracted['operator'].replace(OPERATOR_ALIASES)
+        operator[unparsed] = pd.Categorical(operators, categories=LAB_VALUE_OPERATORS).codes
+    return pd.DataFrame({'numeric': numeric.to_numpy(dtype='float64'), 'operator': operator, 'plain': plain},
+                        index=pd.Index(strings.to_numpy(), name='lab_value'))
+
+def lab_value_parse_table(strings, persist=True):
+    """
+    Parse results of distinct lab_value strings, from the parse table where
+    the strings were parsed before.
+
+    Parameters:
+        strings (array-like): Distinct lab_value strings.
+        persist (bool): Write the parse table to disk when new strings were
+            parsed. Callers parsing many batches can write it once at the end
+            with save_parse_table instead.
+
+    Returns:
+        DataFrame: One row per string, with 'numeric' (the value),
+                   'operator' (code into LAB_VALUE_OPERATORS, -1 when the
+                   value is exact) and 'plain' (whether the string is a plain
+                   number).
+    """
+    global _parse_table
+    strings = pd.Index(strings, dtype='object')
+    with _parse_table_lock:
+        if _parse_table is None:
+            _parse_table = _load_parse_table()
+        positions = _parse_table.index.get_indexer(strings)
+        new_strings = strings[positions < 0]
+        if len(new_strings):
+            _parse_table = pd.concat([_parse_table, _parse_strings(new_strings)])
+            positions = _parse_table.index.get_indexer(strings)
+        table = _parse_table.iloc[positions]
+    if len(new_strings):
+        logger.info(f"Parsed {len(new_strings):,} new lab_value strings.")
+        if persist:
+            save_parse_table()
+    return table
+
+def parse_lab_values(values, persist=True):
+    """
+    Parse a lab_value column into numeric values and censoring operators.
+
+    Parameters:
+        values (Series): lab_value column.
+        persist (bool): See lab_value_parse_table.
+
+    Returns:
+        DataFrame: 'lab_value_numeric' and 'lab_value_operator' (one of
+                   LAB_VALUE_OPERATORS for censored values, else NaN), on the
+                   index of values. attrs['non_numeric'] is True when any
+                   value is missing or is not a plain number.
+    """
+    codes, uniques = pd.factorize(values)
+    table = lab_value_parse_table(np.asarray(uniques, dtype='object').astype(str), persist=persist)
+    # Missing values have code -1 and take the extra last row
+    numeric = np.append(table['numeric'].to_numpy(), np.nan)[codes]
+    operator = np.append(table['operator'].to_numpy(), np.int8(-1))[codes]
+    parsed = pd.DataFrame({'lab_value_numeric': numeric,
+                           'lab_value_operator': pd.Categorical.from_codes(operator, categories=LAB_VALUE_OPERATORS)},
+                          index=values.index)
+    parsed.attrs['non_numeric'] = bool((codes < 0).any() or not table['plain'].all())
+    return parsed
@@ -1,15 +1,14 @@
 import streamlit as st
-import pandas as pd
 import os
 import logging
 import time
-from common_qc import read_data, check_required_variables
-from common_qc import replace_outliers_with_na_wide, plot_histograms_by_device_category
-from common_qc import validate_and_convert_dtypes, name_category_mapping
+from common_qc import plot_device_histograms
+from qc_cache import cached_table_qc
+from qc_checks import table_filepath
 from logging_config import setup_logging
 from common_features import set_bg_hack_url
 
-def show_respiratory_support_qc():
+def show_respiratory_support_qc(artifacts=None):
     '''
     '''
     set_bg_hack_url()
@@ -24,14 +23,10 @@ def show_respiratory_support_qc():
 
     logger.info(f"!!! Starting QC for {TABLE}.")
 
-    # Main 
-    qc_summary = []
-    qc_recommendations = []
-
     if 'root_location' in st.session_state and 'filetype' in st.session_state:
         root_location = st.session_state['root_location']
         filetype = st.session_state['filetype']
-        filepath = os.path.join(root_location, f'clif_respiratory_support.{filetype}')
+        filepath = table_filepath(root_location, TABLE, filetype)
 
         logger.info(f"Filepath set to {filepath}")
 
@@ -46,240 +41,121 @@ def show_respiratory_support_qc():
 
             progress_bar.progress(10, text='Starting QC...')
 
-            # 1. Respiratory Support Detailed QC 
+            # Run the checks, or load their results from the cache if the file is unchanged.
+            # Results computed ahead of time (e.g. by the parallel QC run) are passed in.
+            if artifacts is None:
+                with st.spinner("Running quality checks..."):
+                    artifacts = cached_table_qc(TABLE, root_location, filetype,
+                                                progress=lambda percent, text: progress_bar.progress(percent, text=text),
+                                                memory_budget_mb=st.session_state.get('memory_budget_mb'),
+                                                engine=st.session_state.get('qc_engine'))
+            qc_summary = artifacts['qc_summary']
+            qc_recommendations = artifacts['qc_recommendations']
+
             with st.expander("Expand to view", expanded=False):
-                    # Load the file
-                with st.spinner("Loading data..."):
-                    progress_bar.progress(15, text='Loading data...')
-                    logger.info("~~~ Loading data ~~~")
-                    data = read_data(filepath, filetype)
-                    df = data.copy()
-                    logger.info("Data loaded successfully.")
-
-                    
                 # Display the data
                 logger.info("~~~ Displaying data ~~~")
                 st.write(f"## Respiratory Support Data Preview")
-                with st.spinner("Loading data preview..."):
-                    progress_bar.progress(20, text='Loading data preview...')
-                    total_counts = data.shape[0]
-                    ttl_unique_encounters = data['hospitalization_id'].nunique()
-                    duplicate_count = data.duplicated().sum()
-                    st.write(f"Total records: {total_counts}")
-                    st.write(f"Total unique hospital encounters: {ttl_unique_encounters}")
-                    if duplicate_count > 0:
-                        st.write(f"Duplicate records: {duplicate_count}")
-                        qc_summary.append(f"{duplicate_count} duplicate(s) found in the data.")
-                        qc_recommendations.append("Duplicate records found. Please review and remove duplicates.")
-                    else:
-                        st.write("No duplicate records found.")
-                    st.write(data.head())
-                    logger.info("Displayed data.")
-
-
-                # Validate and convert data types
+                st.write(f"Total records: {artifacts['total_counts']}")
+                if artifacts.get('mode') == 'incremental':
+                    st.write(f"Partitions: {artifacts['partition_count']} ({artifacts['partitions_read']} new or changed since the last check)")
+                st.write(f"Total unique hospital encounters: {artifacts['ttl_unique_encounters']}")
+                if artifacts['duplicate_count'] > 0:
+                    st.write(f"Duplicate records: {artifacts['duplicate_count']}")
+                    if artifacts['duplicate_sample'] is not None:
+                        st.write(artifacts['duplicate_sample'])
+                else:
+                    st.write("No duplicate records found.")
+                if artifacts['key_duplicate_count'] > artifacts['duplicate_count']:
+                    st.write(f"Records sharing the same {', '.join(artifacts['duplicate_keys'])}: {artifacts['key_duplicate_count']}")
+                    if artifacts['key_duplicate_sample'] is not None:
+                        st.write(artifacts['key_duplicate_sample'])
+                st.write(artifacts['head'])
+
+
+                # Data type validation
                 st.write("## Data Type Validation")
-                with st.spinner("Validating data types..."):
-                    progress_bar.progress(30, text='Validating data types...')
-                    logger.info("~~~ Validating data types ~~~")
-                    data, validation_results = validate_and_convert_dtypes(TABLE, data)
-                    validation_df = pd.DataFrame(validation_results, columns=['Column', 'Actual', 'Expected', 'Status'])
-                    mismatch_columns = [row[0] for row in validation_results if row[1] != row[2]]
-                    convert_dtypes = False
-                    if mismatch_columns:
-                        convert_dtypes = True
-                        qc_summary.append("Some columns have mismatched data types.")
-                        qc_recommendations.append("Some columns have mismatched data types. Please review and convert to the expected data types.")
-                    st.write(validation_df)
-                    logger.info("Data type validation completed.")
-
-
-                # Display missingness for each column
+                st.write(artifacts['validation_df'])
+
+
+                # Missingness for each column
                 st.write(f"## Missingness")
-                with st.spinner("Checking for missing values..."):
-                    progress_bar.progress(40, text='Checking for missing values...')
-                    logger.info("~~~ Checking for missing values ~~~")
-                    missing_counts = data.isnull().sum()
-                    if missing_counts.any():
-                        missing_percentages = (missing_counts / total_counts) * 100
-                        missing_info = pd.DataFrame({
-                            'Missing Count': missing_counts,
-                            'Missing Percentage': missing_percentages.map('{:.2f}%'.format)
-                        })
-                        missing_info_sorted = missing_info.sort_values(by='Missing Count', ascending=False)
-                        st.write(missing_info_sorted)
-                        qc_summary.append("Missing values found in columns - " + ', '.join(missing_info[missing_info['Missing Count'] > 0].index.tolist()))
-                    else:
-                        st.write("No missing values found in all required columns.")
-                    logger.info("Checked for missing values.")
-
-
-                # Display summary statistics
+                if artifacts['missing_info'] is not None:
+                    st.write(artifacts['missing_info'])
+                else:
+                    st.write("No missing values found in all required columns.")
+
+
+                # Summary statistics
                 st.write(f"## Respiratory Support Summary Statistics")
-                with st.spinner("Displaying summary statistics..."):  
-                    progress_bar.progress(50, text='Displaying summary statistics...')
-                    logger.info("~~~ Displaying summary statistics ~~~")  
-                    summary = data.describe()
-                    st.write(summary)
-                    logger.info("Displayed summary statistics.")
-
-                
-                # Check for required columns
-                logger.info("~~~ Checking for required columns ~~~")    
+                if artifacts.get('mode') == 'streaming':
+                    st.caption("Checked in streaming mode: only the count of each column and the mean, min and max of numeric columns are computed.")
+                st.write(artifacts['summary'])
+
+
+                # Required columns
                 st.write(f"## Respiratory Support Required Columns")
-                with st.spinner("Checking for required columns..."):
-                    progress_bar.progress(60, text='Checking for required columns...')
-                    required_cols_check = check_required_variables(TABLE, data)
-                    st.write(required_cols_check)
-                    qc_summary.append(required_cols_check)
-                    if required_cols_check != f"All required columns present for '{TABLE}'.":
-                        qc_recommendations.append("Some required columns are missing. Please ensure all required columns are present.")  
-                        logger.warning("Some required columns are missing.")
-                    logger.info("Checked for required columns.")
-
-                # Check for outliers
+                st.write(artifacts['required_cols_check'])
+
+
+                # Outliers
                 st.write("## Outliers")
-                with st.spinner("Checking for outliers..."):
-                    resp_outlier_thresholds_filepath = "thresholds/nejm_outlier_thresholds_respiratory_support.csv"
-                    resp_outlier_thresholds = read_data(resp_outlier_thresholds_filepath, 'csv')
-                    data, replaced_count, _, _ = replace_outliers_with_na_wide(data, resp_outlier_thresholds)
-                    if replaced_count > 0:
-                        qc_summary.append("Outliers found in the data.")
-                        qc_recommendations.append("Outliers found. Please replace values with NA.")
-                        st.write("Outliers found in the data.")
+                if artifacts['replaced_count'] > 0:
+                    st.write("Outliers found in the data.")
 
                 st.write("## Device Category Summaries")
                 st.write("###### * With Outliers")
-                with st.spinner("Displaying summaries by device category..."):
-                    st.info("The page will reload to display the summaries by device category. Please wait for the page to reload.")
-                    progress_bar.progress(70, text='Displaying summaries by device category...')
-                    logger.info("~~~ Diplaying summaries by device category ~~~")
-                    categories = data['device_category'].dropna().unique()
-                    categories.sort()
-                    with st.form(key='device_mode_category_form'):
-                        selected_category = st.selectbox('Select Device Category:', options = categories)
-                        opt_mode_category = st.radio("Would you like to choose a mode category for the selected device category?", ['No', 'Yes'], horizontal=True, captions=['Ignore next dropdown if No', 'Select mode category below'])
-                        modes = data['mode_category'].dropna().unique()
-                        modes.sort()
-                        selected_mode = st.selectbox('Select Mode Category:', options = modes)
-                        st.session_state['selected_category'] = selected_category
-                        st.session_state['selected_mode'] = selected_mode
-                        submit_mode_opt = st.form_submit_button(label='Submit')
-                        if submit_mode_opt and opt_mode_category == 'Yes':
-                            filtered_df = df[(df['device_category'] == st.session_state['selected_category']) & (df['mode_category'] == st.session_state['selected_mode'])]
-                            if filtered_df.empty:
-                                st.warning(f"No data found for device category '{st.session_state['selected_category']}' and mode category '{st.session_state['selected_mode']}'.")
-                            else:
-                                st.write(f"### 1. Histograms for {st.session_state['selected_category']} with Mode Category {st.session_state['selected_mode']}")
-                                cat_plot = plot_histograms_by_device_category(df, st.session_state['selected_category'], st.session_state['selected_mode'])
-                                st.pyplot(cat_plot)
-
-                                st.write(f"### 2. Summary for {st.session_state['selected_category']} with Mode Category {st.session_state['selected_mode']}")
-                                cat_data = df[(df['device_category'] == st.session_state['selected_category']) & (df['mode_category'] == st.session_state['selected_mode'])]
-                                cat_summary = cat_data.describe()
-                                st.write(cat_summary)
-
-                                i = 3
-                                device_cat_count = cat_data.groupby(['device_category', 'device_name']).size().reset_index(name='count')
-                                sorted_dev = device_cat_count.sort_values(by=['device_category', 'device_name'], ascending=[True, True])
-                                if not sorted_dev.empty:
-                                    st.write(f"### {i}. Device Name to Device Category Mapping for {st.session_state['selected_category']}")
-                                    st.write(sorted_dev)
-                                    i += 1
-
-                                # st.write(f"### {i}. Mode Name to Mode Category Mapping for {st.session_state['selected_category']}")
-                                mode_cat_count = cat_data.groupby(['mode_category', 'mode_name']).size().reset_index(name='count')
-                                sorted_mode = mode_cat_count.sort_values(by=['mode_category', 'mode_name'], ascending=[True, True])
-                                if not sorted_mode.empty:
-                                    st.write(f"### {i}. Mode Name to Mode Category Mapping for {st.session_state['selected_category']}")
-
-                                    st.write(sorted_mode)
-                                    i += 1
-
-                                encounters_w_vent = df.loc[df['device_category'] == 'IMV', 'hospitalization_id'].unique()
-                                vent_resp_tables = df[df['hospitalization_id'].isin(encounters_w_vent)]
-                                vent_resp_tables['min_time'] = vent_resp_tables.groupby('hospitalization_id')['recorded_dttm'].transform('min')
-                                vent_resp_tables['time'] = (vent_resp_tables['recorded_dttm'] - vent_resp_tables['min_time']).dt.total_seconds() / 3600
-                                vent_resp_tables = vent_resp_tables.drop(columns=['recorded_dttm', 'min_time'])
-                                
-                                if st.session_state['selected_category'] == 'IMV':
-                                    st.write(f"#### {i}. Initial Mode Choice for Mechanical Ventilation")
-                                    initial_mode_choice = (
-                                    vent_resp_tables
-                                    .dropna(subset=['mode_category'])  
-                                    .groupby('hospitalization_id')           
-                                    .apply(lambda x: x.iloc[0])                    
-                                    .groupby('mode_category')          
-                                    .size()
-                                    .rename('count')                            
-                                    )
-                                    st.write(initial_mode_choice)
-                        if submit_mode_opt and opt_mode_category == 'No':
-                            filtered_df = df[df['device_category'] == st.session_state['selected_category']]
-                            if filtered_df.empty:
-                                st.warning(f"No data found for device category '{st.session_state['selected_category']}'.")
-                            else:
-                                st.write(f"### 1. Histograms for {st.session_state['selected_category']}")
-                                cat_plot = plot_histograms_by_device_category(data, st.session_state['selected_category'])
-                                st.pyplot(cat_plot)
-
-                                st.write(f"### 2. Summary for {st.session_state['selected_category']}")
-                                cat_data = df[df['device_category'] == st.session_state['selected_category']]
-                                cat_summary = cat_data.describe()
-                                st.write(cat_summary)
-
-                                i = 3
-                                device_cat_count = cat_data.groupby(['device_category', 'device_name']).size().reset_index(name='count')
-                                # filtered_dev = device_cat_count[device_cat_count['count'] > 100]
-                                sorted_dev = device_cat_count.sort_values(by=['device_category', 'device_name'], ascending=[True, True])
-                                if not sorted_dev.empty:
-                                    st.write(f"### {i}. Device Name to Device Category Mapping for {st.session_state['selected_category']}")
-                                    # st.write("*for counts > 100")
-                                    st.write(sorted_dev)
-                                    i += 1
-
-                                mode_cat_count = cat_data.groupby(['mode_category', 'mode_name']).size().reset_index(name='count')
-                                # filtered_mode = mode_cat_count[mode_cat_count['count'] > 100]
-                                sorted_mode = mode_cat_count.sort_values(by=['mode_category', 'mode_name'], ascending=[True, True])
-                                if not sorted_mode.empty:
-                                    st.write(f"### {i}. Mode Name to Mode Category Mapping for {st.session_state['selected_category']}")
-                                    # st.write("*for counts > 100")
-                                    st.write(sorted_mode)
-                                    i += 1
-
-                                encounters_w_vent = df.loc[df['device_category'] == 'IMV', 'hospitalization_id'].unique()
-                                vent_resp_tables = df[df['hospitalization_id'].isin(encounters_w_vent)]
-                                vent_resp_tables['min_time'] = vent_resp_tables.groupby('hospitalization_id')['recorded_dttm'].transform('min')
-                                vent_resp_tables['time'] = (vent_resp_tables['recorded_dttm'] - vent_resp_tables['min_time']).dt.total_seconds() / 3600
-                                vent_resp_tables = vent_resp_tables.drop(columns=['recorded_dttm', 'min_time'])
-                                
-                                if st.session_state['selected_category'] == 'IMV':
-                                    st.write(f"#### {i}. Initial Mode Choice for Mechanical Ventilation")
-                                    initial_mode_choice = (
-                                    vent_resp_tables
-                                    .dropna(subset=['mode_category'])  
-                                    .groupby('hospitalization_id')           
-                                    .apply(lambda x: x.iloc[0])                    
-                                    .groupby('mode_category')          
-                                    .size()
-                                    .rename('count')                            
-                                    )
-                                    st.write(initial_mode_choice)
-                
+                logger.info("~~~ Diplaying summaries by device category ~~~")
+                with st.form(key='device_mode_category_form'):
+                    selected_category = st.selectbox('Select Device Category:', options = artifacts['device_categories'])
+                    opt_mode_category = st.radio("Would you like to choose a mode category for the selected device category?", ['No', 'Yes'], horizontal=True, captions=['Ignore next dropdown if No', 'Select mode category below'])
+                    selected_mode = st.selectbox('Select Mode Category:', options = artifacts['mode_categories'])
+                    st.session_state['selected_category'] = selected_category
+                    st.session_state['selected_mode'] = selected_mode
+                    submit_mode_opt = st.form_submit_button(label='Submit')
+                    if submit_mode_opt:
+                        # The summaries of every device and mode category are computed with the QC run
+                        if opt_mode_category == 'Yes':
+                            selection = f"{selected_category} with Mode Category {selected_mode}"
+                        else:
+                            selection = selected_category
+                            selected_mode = None
+                        cat_summary = artifacts.get('device_summaries', {}).get((selected_category, selected_mode))
+                        if cat_summary is None:
+                            st.warning(f"No data found for device category '{selected_category}'" + (f" and mode category '{selected_mode}'." if selected_mode else "."))
+                        else:
+                            st.write(f"### 1. Histograms for {selection}")
+                            cat_plot = plot_device_histograms(artifacts['device_histograms'].get((selected_category, selected_mode), {}))
+                            st.pyplot(cat_plot)
+
+                            st.write(f"### 2. Summary for {selection}")
+                            if artifacts.get('mode') in ('streaming', 'incremental'):
+                                st.caption("Checked in streaming mode: only the count, mean, min and max of numeric columns are computed.")
+                            st.write(cat_summary['summary'])
+
+                            i = 3
+                            if not cat_summary['device_mapping'].empty:
+                                st.write(f"### {i}. Device Name to Device Category Mapping for {selected_category}")
+                                st.write(cat_summary['device_mapping'])
+                                i += 1
+
+                            if not cat_summary['mode_mapping'].empty:
+                                st.write(f"### {i}. Mode Name to Mode Category Mapping for {selected_category}")
+                                st.write(cat_summary['mode_mapping'])
+                                i += 1
+
+                            if selected_category == 'IMV' and 'initial_mode_choice' in artifacts:
+                                st.write(f"#### {i}. Initial Mode Choice for Mechanical Ventilation")
+                                st.write(artifacts['initial_mode_choice'])
+
                 # Name to Category mappings
-                logger.info("~~~ Mapping ~~~")
                 st.write('## Name to Category Mapping')
-                with st.spinner("Displaying Name to Category Mapping..."):
-                    progress_bar.progress(90, text='Displaying Name to Category Mapping...')
-                    mappings = name_category_mapping(data)
-                    n = 1
-                    for i, mapping in enumerate(mappings):
-                        mapping_name = mapping.columns[0]
-                        mapping_cat = mapping.columns[1]
-                        st.write(f"{n}. Mapping `{mapping_name}` to `{mapping_cat}`")
-                        st.write(mapping.reset_index().drop("index", axis = 1))
-                        n += 1
-                
+                for n, mapping in enumerate(artifacts['mappings'], start=1):
+                    mapping_name = mapping.columns[0]
+                    mapping_cat = mapping.columns[1]
+                    st.write(f"{n}. Mapping `{mapping_name}` to `{mapping_cat}`")
+                    st.write(mapping)
+
                 progress_bar.progress(100, text='Quality check completed. Displaying results...')
 
 
@@ -294,24 +170,21 @@ def show_respiratory_support_qc():
             logger.info("Displaying QC Summary and Recommendations.")
 
             with st.expander("Expand to view", expanded=False):
-                # if st.session_state:
-                    st.write("## Summary")
-                    for i, point in enumerate(qc_summary):
-                        st.markdown(f"{i + 1}. {point}")
+                st.write("## Summary")
+                for i, point in enumerate(qc_summary):
+                    st.markdown(f"{i + 1}. {point}")
 
-                    st.write("## Recommendations")
-                    for i, recommendation in enumerate(qc_recommendations):
-                        st.markdown(f"{i + 1}. {recommendation}")
-            
-            logger.info("Displayed QC Summary and Recommendations.")
+                st.write("## Recommendations")
+                for i, recommendation in enumerate(qc_recommendations):
+                    st.markdown(f"{i + 1}. {recommendation}")
+
+            logger.info("QC Summary and Recommendations displayed.")
 
         else:
-            st.write(f"File not found. Please provide the correct root location and/or file type to proceed.")
+            st.write(f"File not found. Please provide the correct root location and file type to proceed.")
 
     else:
         st.write("Please provide the root location and file type to proceed.")
         logger.warning("Root location and/or file type not provided.")
 
-
-
-
+    logger.info(f"!!! Completed QC for {TABLE}.")
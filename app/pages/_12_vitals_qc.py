@@ -1,15 +1,13 @@
 import streamlit as st
-import pandas as pd
 import os
 import logging
 import time
-from common_qc import read_data, check_required_variables, check_categories_exist
-from common_qc import replace_outliers_with_na_long, generate_facetgrid_histograms, generate_summary_stats
-from common_qc import validate_and_convert_dtypes, name_category_mapping
+from qc_cache import cached_table_qc
+from qc_checks import table_filepath
 from logging_config import setup_logging
 from common_features import set_bg_hack_url
 
-def show_vitals_qc():
+def show_vitals_qc(artifacts=None):
     '''
     '''
     set_bg_hack_url()
@@ -24,14 +22,10 @@ def show_vitals_qc():
 
     logger.info(f"!!! Starting QC for {TABLE}.")
 
-    # Main
-    qc_summary = []
-    qc_recommendations = []
-
     if 'root_location' in st.session_state and 'filetype' in st.session_state:
         root_location = st.session_state['root_location']
         filetype = st.session_state['filetype']
-        filepath = os.path.join(root_location, f'clif_vitals.{filetype}')
+        filepath = table_filepath(root_location, TABLE, filetype)
 
         logger.info(f"Filepath set to {filepath}")
 
@@ -47,165 +41,101 @@ def show_vitals_qc():
 
             progress_bar.progress(10, text='Starting QC...')
 
-            # 1. Vitals Detailed QC 
-            with st.expander("Expand to view", expanded=False):
-                # Load the file
-                with st.spinner("Loading data..."):
-                    progress_bar.progress(15, text='Loading data...')
-                    logger.info("~~~ Loading data ~~~")
-                    data = read_data(filepath, filetype)
-                    df = data.copy()
-                    logger.info("Data loaded successfully.")
-
+            # Run the checks, or load their results from the cache if the file is unchanged.
+            # Results computed ahead of time (e.g. by the parallel QC run) are passed in.
+            if artifacts is None:
+                with st.spinner("Running quality checks..."):
+                    artifacts = cached_table_qc(TABLE, root_location, filetype,
+                                                progress=lambda percent, text: progress_bar.progress(percent, text=text),
+                                                memory_budget_mb=st.session_state.get('memory_budget_mb'),
+                                                engine=st.session_state.get('qc_engine'))
+            qc_summary = artifacts['qc_summary']
+            qc_recommendations = artifacts['qc_recommendations']
 
+            with st.expander("Expand to view", expanded=False):
                 # Display the data
+                logger.info("~~~ Displaying data ~~~")
                 st.write(f"## {TABLE} Data Preview")
-                with st.spinner("Loading data preview..."):
-                    progress_bar.progress(20, text='Loading data preview...')
-                    logger.info("~~~ Displaying data ~~~")
-                    total_counts = data.shape[0]
-                    ttl_unique_encounters = data['hospitalization_id'].nunique()
-                    duplicate_count = data.duplicated().sum()
-                    st.write(f"Total records: {total_counts}")
-                    st.write(f"Total unique hospital encounters: {ttl_unique_encounters}")
-                    if duplicate_count > 0:
-                        st.write(f"Duplicate records: {duplicate_count}")
-                        qc_summary.append(f"{duplicate_count} duplicate(s) found in the data.")
-                        qc_recommendations.append("Duplicate records found. Please review and remove duplicates.")
-                    else:
-                        st.write("No duplicate records found.")
-                    st.write(data.head())
-                    logger.info("Data displayed.")
-
-
-                # Validate and convert data types
+                st.write(f"Total records: {artifacts['total_counts']}")
+                if artifacts.get('mode') == 'incremental':
+                    st.write(f"Partitions: {artifacts['partition_count']} ({artifacts['partitions_read']} new or changed since the last check)")
+                st.write(f"Total unique hospital encounters: {artifacts['ttl_unique_encounters']}")
+                if artifacts['duplicate_count'] > 0:
+                    st.write(f"Duplicate records: {artifacts['duplicate_count']}")
+                    if artifacts['duplicate_sample'] is not None:
+                        st.write(artifacts['duplicate_sample'])
+                else:
+                    st.write("No duplicate records found.")
+                if artifacts['key_duplicate_count'] > artifacts['duplicate_count']:
+                    st.write(f"Records sharing the same {', '.join(artifacts['duplicate_keys'])}: {artifacts['key_duplicate_count']}")
+                    if artifacts['key_duplicate_sample'] is not None:
+                        st.write(artifacts['key_duplicate_sample'])
+                st.write(artifacts['head'])
+
+
+                # Data type validation
                 st.write("## Data Type Validation")
-                with st.spinner("Validating data types..."):
-                    progress_bar.progress(30, text='Validating data types...')
-                    logger.info("~~~ Validating data types ~~~")
-                    data, validation_results = validate_and_convert_dtypes(TABLE, data)
-                    validation_df = pd.DataFrame(validation_results, columns=['Column', 'Actual', 'Expected', 'Status'])
-                    mismatch_columns = [row[0] for row in validation_results if row[1] != row[2]]
-                    convert_dtypes = False
-                    if mismatch_columns:
-                        convert_dtypes = True
-                        qc_summary.append("Some columns have mismatched data types.")
-                        qc_recommendations.append("Some columns have mismatched data types. Please review and convert to the expected data types.")
-                    st.write(validation_df)
-                    logger.info("Data type validation completed.")
-
-
-                # Display missingness for each column
+                st.write(artifacts['validation_df'])
+
+
+                # Missingness for each column
                 st.write(f"## Missingness")
-                with st.spinner("Checking for missing values..."):
-                    progress_bar.progress(40, text='Checking for missing values...')
-                    logger.info("~~~ Checking for missing values ~~~")
-                    missing_counts = data.isnull().sum()
-                    if missing_counts.any():
-                        missing_percentages = (missing_counts / total_counts) * 100
-                        missing_info = pd.DataFrame({
-                            'Missing Count': missing_counts,
-                            'Missing Percentage': missing_percentages.map('{:.2f}%'.format)
-                        })
-                        missing_info_sorted = missing_info.sort_values(by='Missing Count', ascending=False)
-                        st.write(missing_info_sorted)
-                        qc_summary.append("Missing values found in columns - " + ', '.join(missing_info[missing_info['Missing Count'] > 0].index.tolist()))
-                    else:
-                        st.write("No missing values found in all required columns.")
-                    logger.info("Checked for missing values.")
-
-
-                # Check for required columns    
-                logger.info("~~~ Checking for required columns ~~~")  
+                if artifacts['missing_info'] is not None:
+                    st.write(artifacts['missing_info'])
+                else:
+                    st.write("No missing values found in all required columns.")
+
+
+                # Required columns
                 st.write(f"## {TABLE} Required Columns")
-                with st.spinner("Checking for required columns..."):
-                    progress_bar.progress(50, text='Checking for required columns...')
-                    required_cols_check = check_required_variables(TABLE, data)
-                    st.write(required_cols_check)
-                    qc_summary.append(required_cols_check)
-                    if required_cols_check != f"All required columns present for '{TABLE}'.":
-                        qc_recommendations.append("Some required columns are missing. Please ensure all required columns are present.")  
-                        logger.warning("Some required columns are missing.")
-                    logger.info("Checked for required columns.")
-
-    
-                # Check for presence of all vital categories
-                logger.info("~~~ Checking for presence of all vital categories ~~~")
-                vitals_outlier_thresholds_filepath = "thresholds/nejm_outlier_thresholds_vitals.csv"
-                vitals_outlier_thresholds = read_data(vitals_outlier_thresholds_filepath, 'csv')
+                st.write(artifacts['required_cols_check'])
+
+
+                # Presence of all vital categories
                 st.write('## Presence of All Vital Categories')
-                with st.spinner("Checking for presence of all vital categories..."):
-                    progress_bar.progress(60, text='Checking for presence of all vital categories...')
-                    similar_cats, missing_cats = check_categories_exist(data, vitals_outlier_thresholds, 'vital_category')    
-                    if missing_cats:
-                        if similar_cats:
-                            qc_summary.append("Some vital categories are missing. Similar categories are present.")
-                            qc_recommendations.append("Some vital categories are missing. Please ensure all lab categories are present. Review similar categories for potential duplicates.")
-                            st.write("##### Missing categories:")
-                            with st.container(border=True):
-                                cols = st.columns(3)  
-                                for i, missing in enumerate(missing_cats):  
-                                    col = cols[i % 3]  
-                                    col.markdown(f"{i + 1}. {missing}")
-                            logger.warning("Missing vital categories found. Similar categories found.")
-                        else:
-                            qc_summary.append("Some vital categories are missing. No similar categories found.")
-                            qc_recommendations.append("Some vital categories are missing. Please ensure all vital categories are present. No similar categories found.")
-                            st.write("##### Missing categories:")
-                            with st.container(border=True):
-                                cols = st.columns(3)  
-                                for i, missing in enumerate(missing_cats):  
-                                    col = cols[i % 3]  
-                                    col.markdown(f"{i + 1}. {missing}")
-                            logger.warning("Missing vital categories found. No similar categories found.")
-                    else:
-                        st.write("All vital categories are present.")
-                        qc_summary.append("All vital categories are present.")
-                        logger.info("All vital categories are present.")
- 
-             
-                # Vitals category summary statistics
-                logger.info("~~~ Generating vital category summary statistics ~~~")
+                if artifacts['missing_categories']:
+                    st.write("##### Missing categories:")
+                    with st.container(border=True):
+                        cols = st.columns(3)
+                        for i, missing in enumerate(artifacts['missing_categories']):
+                            col = cols[i % 3]
+                            col.markdown(f"{i + 1}. {missing}")
+                    if artifacts['similar_categories']:
+                        st.write("##### Similar categories:")
+                        st.write(artifacts['similar_categories'])
+                    matches = artifacts['category_matches']
+                    st.write("##### Closest categories in the data:")
+                    st.write(matches[matches['query'].isin(artifacts['missing_categories'])].reset_index(drop=True))
+                else:
+                    st.write("All vital categories are present.")
+
+
+                # Vital category summary statistics
                 st.write("## Vital Category Summary Statistics")
-                with st.spinner("Generating vital category summary statistics..."):
-                    progress_bar.progress(70, text='Generating vital category summary statistics...')
-                    vitals_summary_stats = generate_summary_stats(data, 'vital_category', 'vital_value')
-                    st.write(vitals_summary_stats)
-                    logger.info("Vital category summary statistics displayed.")
+                st.write(artifacts['summary_stats'])
 
+
+                # Outliers
                 st.write("## Outliers")
-                with st.spinner("Checking for outliers..."):
-                    data, replaced_count, _, _ = replace_outliers_with_na_long(data, vitals_outlier_thresholds, 'vital_category', 'vital_value')
-                    if replaced_count > 0:
-                        st.write(replaced_count, "outliers found in the data.")
-                        qc_summary.append("Outliers found in data.")
-                        qc_recommendations.append("Outliers found. Please replace values with NA.")
-                        st.write("<a href='https://github.com/kaveriC/CLIF-1.0/blob/main/outlier-handling/nejm_outlier_thresholds_vitals.csv' id='labs_thresh'>Acceptable vitals thresholds.</a>", unsafe_allow_html=True)
+                if artifacts['replaced_count'] > 0:
+                    st.write(artifacts['replaced_count'], "outliers found in the data.")
+                    st.write("<a href='https://github.com/kaveriC/CLIF-1.0/blob/main/outlier-handling/nejm_outlier_thresholds_vitals.csv' id='labs_thresh'>Acceptable vitals thresholds.</a>", unsafe_allow_html=True)
 
 
-                # Value Distribution - Vital Categories
+                # Value distribution - vital categories
                 st.write("## Value Distribution* - Vital Categories")
                 st.write("###### * With Outliers")
-                with st.spinner("Displaying value distribution - vital categories..."):
-                    progress_bar.progress(80, text='Displaying value distribution - vital categories...')
-                    logger.info("~~~ Displaying value distribution - vital categories ~~~") 
-                    vitals_plot = generate_facetgrid_histograms(df, 'vital_category', 'vital_value')
-                    st.pyplot(vitals_plot)
-                    logger.info("Value distribution - vital categories displayed.")
-                
+                st.write("Values outside the outlier thresholds are shown as hatched bars at the edges of each histogram.")
+                st.image(artifacts['histogram'])
+
+
                 # Name to Category mappings
-                logger.info("~~~ Mapping ~~~")
                 st.write('## Name to Category Mapping')
-                with st.spinner("Displaying Name to Category Mapping..."):
-                    progress_bar.progress(90, text='Displaying Name to Category Mapping...')
-                    mappings = name_category_mapping(data)
-                    n = 1
-                    for i, mapping in enumerate(mappings):
-                        mapping_name = mapping.columns[0]
-                        mapping_cat = mapping.columns[1]
-                        st.write(f"{n}. Mapping `{mapping_name}` to `{mapping_cat}`")
-                        st.write(mapping.reset_index().drop("index", axis = 1))
-                        n += 1
+                for n, mapping in enumerate(artifacts['mappings'], start=1):
+                    mapping_name = mapping.columns[0]
+                    mapping_cat = mapping.columns[1]
+                    st.write(f"{n}. Mapping `{mapping_name}` to `{mapping_cat}`")
+                    st.write(mapping)
 
                 progress_bar.progress(100, text='Quality check completed. Displaying results...')
 
@@ -215,7 +145,7 @@ def show_vitals_qc():
             elapsed_time = end_time - start_time
             st.success(f"Quality check completed. Time taken to run summary: {elapsed_time:.2f} seconds", icon="✅")
             logger.info(f"Time taken to run summary: {elapsed_time:.2f} seconds")
-            
+
             # Display QC Summary and Recommendations
             st.write("# QC Summary and Recommendations")
             logger.info("Displaying QC Summary and Recommendations.")
@@ -238,5 +168,4 @@ def show_vitals_qc():
         st.write("Please provide the root location and file type to proceed.")
         logger.warning("Root location and/or file type not provided.")
 
-    logger.info(f"!!! Completed QC for {TABLE}.")       
-
+    logger.info(f"!!! Completed QC for {TABLE}.")
@@ -1,25 +1,137 @@
 from pygwalker.api.streamlit import StreamlitRenderer
+from pygwalker.data_parsers.database_parser import Connector
+import duckdb
+import os
 import pandas as pd
 import streamlit as st
+from cohort import cohort_view_sql, explorer_engine_params, run_cohort_query, COHORT_OPERATORS
 from common_features import set_bg_hack_url
+from qc_cache import file_fingerprint
+from qc_checks import TABLE_FILES
+
+# Chart specs of the explorer, read and saved by pygwalker
+GW_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gw_config.json')
+
+def get_pyg_renderer(filepath) -> "StreamlitRenderer":
+    '''
+    Explorer of a cohort file, kept in the session until the file changes.
+    pygwalker queries the file in place through a DuckDB connection, so no
+    copy of it is loaded and only chart results are sent to the browser.
+    '''
+    key = file_fingerprint(filepath)
+    if st.session_state.get('cohort_renderer_key') != key:
+        connector = Connector("duckdb:///:memory:", cohort_view_sql(filepath), explorer_engine_params())
+        st.session_state['cohort_renderer'] = StreamlitRenderer(connector, appearance='light', spec=GW_CONFIG, spec_io_mode="rw")
+        st.session_state['cohort_renderer_key'] = key
+    return st.session_state['cohort_renderer']
+
+# Criteria shown when the builder is first opened
+DEFAULT_CRITERIA = pd.DataFrame([
+    {'criterion': 1, 'table': 'Respiratory_Support', 'column': 'device_category', 'operator': '==', 'value': 'IMV',
+     'within_hours': None, 'exclude': False},
+    {'criterion': 2, 'table': 'Labs', 'column': 'lab_category', 'operator': '==', 'value': 'lactate',
+     'within_hours': 24.0, 'exclude': False},
+    {'criterion': 2, 'table': 'Labs', 'column': 'lab_value_numeric', 'operator': '>', 'value': '4',
+     'within_hours': 24.0, 'exclude': False},
+])
+
+def _filter_value(value, operator):
+    # Values stay text, typed by the column's type in the query; lists for
+    # 'in' are comma separated
+    value = '' if pd.isna(value) else str(value)
+    if operator in ('in', 'not in'):
+        return [part.strip() for part in value.split(',')]
+    return value.strip()
+
+def criteria_from_rows(rows):
+    '''
+    Criteria of run_cohort_query from the builder's rows, one criterion per
+    criterion number, its rows' filters all applying.
+    '''
+    criteria = []
+    rows = rows.dropna(subset=['criterion', 'table', 'column', 'operator'])
+    for _, group in rows.groupby('criterion', sort=True):
+        first = group.iloc[0]
+        criterion = {'table': first['table'],
+                     'filters': [[row['column'], row['operator'], _filter_value(row['value'], row['operator'])]
+                                 for _, row in group.iterrows()]}
+        if pd.notna(first['within_hours']):
+            criterion['within_hours'] = float(first['within_hours'])
+        if bool(first['exclude']):
+            criterion['exclude'] = True
+        criteria.append(criterion)
+    return criteria
+
+def show_cohort_builder():
+    '''
+    Cohort of hospitalizations meeting criteria across the CLIF tables, with
+    the hospitalizations left after each criterion.
+    '''
+    st.write("## Cohort Builder")
+    st.write("Rows with the same criterion number form one criterion on one table, met by a hospitalization with a row "
+             "meeting all of them (within the hours from admission, when given). The cohort meets every criterion, "
+             "except those marked exclude. Criteria already evaluated are reused, so refining one re-runs only that one.")
+    root_location = st.text_input("Root location of the CLIF tables", value=st.session_state.get('root_location', ''),
+                                  key='cohort_root_location')
+    filetypes = ["", "csv", "parquet", "fst"]
+    filetype = st.selectbox("File type", filetypes, index=filetypes.index(st.session_state.get('filetype', '')),
+                            format_func=lambda x: "Select..." if x == "" else x, key='cohort_filetype')
+    rows = st.data_editor(
+        st.session_state.get('cohort_criteria', DEFAULT_CRITERIA), key='cohort_criteria_editor', num_rows='dynamic',
+        hide_index=True, use_container_width=True,
+        column_config={'criterion': st.column_config.NumberColumn("criterion", min_value=1, step=1),
+                       'table': st.column_config.SelectboxColumn("table", options=list(TABLE_FILES)),
+                       'operator': st.column_config.SelectboxColumn("operator", options=COHORT_OPERATORS),
+                       'value': st.column_config.TextColumn("value"),
+                       'within_hours': st.column_config.NumberColumn("within_hours", min_value=0),
+                       'exclude': st.column_config.CheckboxColumn("exclude")})
+    if not st.button("Run cohort query"):
+        result = st.session_state.get('cohort_result')
+    elif not root_location or not filetype:
+        st.write("Please provide the root location and file type to proceed.")
+        return
+    else:
+        st.session_state['cohort_criteria'] = rows
+        status = st.progress(0)
+        try:
+            result = run_cohort_query(criteria_from_rows(rows), root_location, filetype,
+                                      progress=lambda percent, text: status.progress(percent, text=text))
+        except (ValueError, FileNotFoundError, duckdb.Error) as e:
+            st.write(str(e))
+            return
+        st.session_state['cohort_result'] = result
+    if result is None:
+        return
+    st.dataframe(result['counts'], hide_index=True, use_container_width=True)
+    ids = pd.DataFrame({'hospitalization_id': result['hospitalization_ids']})
+    st.write(f"{len(ids):,} hospitalizations in the cohort.")
+    st.download_button("Download hospitalization IDs", ids.to_csv(index=False), file_name='cohort_hospitalization_ids.csv',
+                       mime='text/csv')
 
 def show_cohort():
     set_bg_hack_url()
+    _, builder, _ = st.columns([1, 3, 1])
+    with builder:
+        show_cohort_builder()
+        st.write("## Cohort Explorer")
     _, cohort_form, _ = st.columns([1, 3, 1])
     with cohort_form:
         with st.form(key='cohort_form', clear_on_submit=False):
-            filepath = st.text_input("Input filepath")  
-            submit_button = st.form_submit_button(label='Submit') 
-        
-    def get_pyg_renderer() -> "StreamlitRenderer":
-        df = pd.read_csv(filepath)
-        return StreamlitRenderer(df, dark='light', spec_io_mode="rw")
-    
-    if submit_button:
-        renderer = get_pyg_renderer()
-        renderer.explorer()
-    
-    
-
+            filepath = st.text_input("Input filepath (csv, parquet or fst file, or a directory of them)")
+            submit_button = st.form_submit_button(label='Submit')
 
+    # The explorer stays open across reruns once a file is submitted
+    if submit_button:
+        st.session_state['cohort_filepath'] = filepath
 
+    filepath = st.session_state.get('cohort_filepath')
+    if filepath:
+        if not os.path.exists(filepath):
+            st.write("File not found. Please provide the correct filepath to proceed.")
+            return
+        try:
+            renderer = get_pyg_renderer(filepath)
+        except (ValueError, duckdb.Error) as e:
+            st.write(str(e))
+            return
+        renderer.explorer()
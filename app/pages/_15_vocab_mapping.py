@@ -0,0 +1,97 @@
+import streamlit as st
+import os
+import logging
+from logging_config import setup_logging
+from common_features import set_bg_hack_url
+from qc_cache import table_cache_key
+from qc_checks import TABLE_FILES, table_filepath
+from vocab_mapping import name_columns, discover_names, suggest_mapping, load_mapping, save_mapping, apply_mappings
+
+# Tables with name columns mapped to CLIF categories
+MAPPING_TABLES = [table_name for table_name in TABLE_FILES if name_columns(table_name)]
+
+def _suggestions(table_name, root_location, filetype):
+    '''
+    Suggested mappings of each name column of a table, kept in the session
+    until the table file changes.
+    '''
+    key = table_cache_key(table_name, root_location, filetype)
+    if st.session_state.get('vocab_suggestions_key') != key:
+        with st.spinner("Finding names and ranking categories..."):
+            frequencies = discover_names(table_name, root_location, filetype)
+            st.session_state['vocab_suggestions'] = {name: suggest_mapping(frequency) for name, frequency in frequencies.items()}
+        st.session_state['vocab_suggestions_key'] = key
+    return st.session_state['vocab_suggestions']
+
+def show_vocab_mapping():
+    '''
+    '''
+    set_bg_hack_url()
+
+    # Initialize logger
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    _, main_form, _ = st.columns([1, 3, 1])
+    with main_form:
+        st.title("Vocabulary Mapping")
+        with st.form(key='vocab_form', clear_on_submit=False):
+            root_location = st.text_input("Enter root location to proceed", value=st.session_state.get('root_location', ''))
+            filetypes = ["", "csv", "parquet", "fst"]
+            filetype = st.selectbox("File type", filetypes, index=filetypes.index(st.session_state.get('filetype', '')),
+                                    format_func=lambda x: "Select..." if x == "" else x)
+            table_name = st.selectbox("Table", MAPPING_TABLES)
+            submit = st.form_submit_button(label='Submit')
+            if submit and root_location and filetype:
+                st.session_state['root_location'] = root_location
+                st.session_state['filetype'] = filetype
+                st.session_state['vocab_table'] = table_name
+
+    if 'vocab_table' not in st.session_state:
+        st.write("Please provide the root location, file type and table to proceed.")
+        return
+    root_location = st.session_state['root_location']
+    filetype = st.session_state['filetype']
+    table_name = st.session_state['vocab_table']
+    filepath = table_filepath(root_location, table_name, filetype)
+    if not os.path.exists(filepath):
+        st.write(f"File not found. Please provide the correct root location and file type to proceed.")
+        return
+
+    suggestions = _suggestions(table_name, root_location, filetype)
+    st.write("Each site name is listed with its current category, the CLIF category suggested for it and the closest candidates. "
+             "Edit the accepted category where needed and save the mapping; saved mappings are loaded the next time.")
+    tabs = st.tabs([name for name in suggestions])
+    for tab, (name, suggested) in zip(tabs, suggestions.items()):
+        with tab:
+            category = name.replace('_name', '_category')
+            saved = load_mapping(table_name, name)
+            accepted = suggested['suggested_category']
+            if saved is not None:
+                accepted = suggested[name].map(saved.set_index(name)[category]).fillna(accepted)
+            options = sorted(set(suggested.attrs['categories']) | set(saved[category] if saved is not None else []))
+            edited = st.data_editor(
+                suggested.assign(accepted_category=accepted.to_numpy()),
+                key=f'vocab_editor_{table_name}_{name}', hide_index=True, use_container_width=True,
+                disabled=[column for column in suggested.columns],
+                column_config={'accepted_category': st.column_config.SelectboxColumn("accepted_category", options=options)})
+            st.write(f"{len(suggested):,} distinct names, {(edited['accepted_category'].fillna('') != edited['current_category'].fillna('')).sum():,} mapped differently from the data.")
+            if st.button("Save mapping", key=f'vocab_save_{table_name}_{name}'):
+                save_mapping(table_name, name, edited[[name, 'accepted_category']].rename(columns={'accepted_category': category}))
+                st.success(f"Saved the mapping of {name}.")
+
+    st.write("## Apply Saved Mappings")
+    saved_mappings = {name: mapping for name, mapping in ((name, load_mapping(table_name, name)) for name in suggestions)
+                      if mapping is not None}
+    if not saved_mappings:
+        st.write("No mapping of this table has been saved yet.")
+        return
+    st.write(f"Saved mappings: {', '.join(saved_mappings)}")
+    output_path = st.text_input("Output file", value=os.path.join(root_location, 'mapped', f"{TABLE_FILES[table_name]}.parquet"))
+    if st.button("Apply saved mappings"):
+        status = st.empty()
+        with st.spinner("Applying mappings..."):
+            rows = apply_mappings(table_name, root_location, filetype, saved_mappings, output_path,
+                                  progress=lambda written: status.write(f"Wrote {written:,} rows..."))
+        st.success(f"Wrote {rows:,} rows with mapped categories to {output_path}.")
+        logger.info(f"Applied vocabulary mappings of {table_name} to {output_path}.")
@@ -2,6 +2,11 @@ import streamlit as st
 import logging
 from logging_config import setup_logging
 from common_features import set_bg_hack_url
+from qc_cache import invalidate_cache, QC_ENGINES, QC_ENGINE
+from qc_preview import PREVIEW_ROWS
+from qc_checks import TABLE_FILES, table_filepath
+from qc_scheduler import run_tables_parallel
+from qc_streaming import MEMORY_BUDGET_MB
 from pages._3_adt_qc import show_adt_qc
 from pages._4_hosp_qc import show_hosp_qc
 from pages._5_labs_qc import show_labs_qc
@@ -13,6 +18,88 @@ from pages._10_position_qc import show_position_qc
 from pages._11_resp_qc import show_respiratory_support_qc
 from pages._12_vitals_qc import show_vitals_qc
 
+# Tab label and page for each table, in tab order
+QC_TABS = {
+    'ADT': ("ADT", show_adt_qc),
+    'Hospitalization': ("Hospitalization", show_hosp_qc),
+    'Labs': ("Labs", show_labs_qc),
+    'Medication_admin_continuous': ("Medication", show_meds_qc),
+    'Microbiology_Culture': ("Microbiology", show_microbio_qc),
+    'Patient': ("Patient", show_patient_qc),
+    'Patient_Assessments': ("Patient Assessment", show_patient_assess_qc),
+    'Position': ("Position", show_position_qc),
+    'Respiratory_Support': ("Respiratory Support", show_respiratory_support_qc),
+    'Vitals': ("Vitals", show_vitals_qc)
+}
+RUN_MODES = ["Full", "Preview"]
+
+
+def run_full_qc():
+    '''
+    Escalate from the preview to the full, exact quality checks.
+    '''
+    st.session_state['qc_run_mode'] = "Full"
+
+def show_preview_qc(artifacts):
+    '''
+    Display the estimated quality checks of one table from a preview run.
+    '''
+    table_name = artifacts['table']
+    st.title(f"{QC_TABS[table_name][0]} Quality Check (Preview)")
+    about = "about " if artifacts.get('counts_estimated') else ""
+    st.warning(f"Preview: these results are estimates from a stratified random sample of {artifacts['sample_rows']:,} "
+               f"of {about}{artifacts['total_counts']:,} rows, with 95% confidence intervals. Run the full quality checks for exact results.",
+               icon="⚠️")
+
+    with st.expander("Expand to view", expanded=False):
+        st.write(f"## {table_name} Data Preview (sampled rows)")
+        st.write(f"Total records: {about}{artifacts['total_counts']}")
+        st.write(f"Sampled records: {artifacts['sample_rows']} from {artifacts['strata_count']} strata")
+        st.write(artifacts['head'])
+
+        st.write("## Data Type Validation")
+        st.write(artifacts['validation_df'])
+
+        st.write("## Missingness (estimated)")
+        st.write(artifacts['missing_info'])
+
+        st.write(f"## {table_name} Required Columns")
+        st.write(artifacts['required_cols_check'])
+
+        if 'missing_categories' in artifacts:
+            st.write("## Presence of All Categories")
+            if artifacts.get('categories_sampled'):
+                st.write("Categories found in the sampled part of the file.")
+            if artifacts['missing_categories']:
+                st.write("##### Missing categories:")
+                st.write(artifacts['missing_categories'])
+                if artifacts['similar_categories']:
+                    st.write("##### Similar categories:")
+                    st.write(artifacts['similar_categories'])
+            else:
+                st.write("All categories are present.")
+
+        if 'summary_stats' in artifacts:
+            st.write("## Category Summary Statistics (estimated)")
+            st.write("Min, max and quartiles are those of the sampled values.")
+            st.write(artifacts['summary_stats'])
+
+        if 'outlier_rates' in artifacts:
+            st.write("## Outliers (estimated)")
+            lower, upper = artifacts['replaced_count_ci']
+            st.write(f"Estimated outliers: {artifacts['replaced_count']:,} (95% CI {lower:,} – {upper:,})")
+            st.write(artifacts['outlier_rates'])
+
+    st.write("# QC Summary and Recommendations (estimated)")
+    with st.expander("Expand to view", expanded=False):
+        st.write("## Summary")
+        for i, point in enumerate(artifacts['qc_summary']):
+            st.markdown(f"{i + 1}. {point}")
+
+        st.write("## Recommendations")
+        for i, recommendation in enumerate(artifacts['qc_recommendations']):
+            st.markdown(f"{i + 1}. {recommendation}")
+
 def show_qc():
     '''
     '''
@@ -32,12 +119,26 @@ def show_qc():
             # File type selection
             filetype = st.selectbox("File type", ["", "csv", "parquet", "fst"], format_func=lambda x: "Select..." if x == "" else x)
 
+            # Shared by the tables checked in parallel; tables larger than
+            # their share are checked in streaming mode
+            memory_budget_mb = st.number_input("Memory budget in MB (0 for no limit)", min_value=0,
+                                               value=MEMORY_BUDGET_MB, step=512)
+
+            # DuckDB runs the checks as SQL over the files without loading them
+            engine = st.selectbox("QC engine", QC_ENGINES, index=QC_ENGINES.index(QC_ENGINE))
+
+            # A preview estimates the results from a sample of each table
+            run_mode = st.radio("Run mode", RUN_MODES, horizontal=True, key='qc_run_mode',
+                                help=f"Preview estimates the checks from a stratified sample of about {PREVIEW_ROWS:,} rows per table.")
+
             submit = st.form_submit_button(label='Submit')
+            clear_cache = st.form_submit_button(label='Clear cached results and re-run')
 
             if submit:
                 st.write("The quality controls for each table are displayed in the respective tabs below. Please navigate to the appropriate tab to view the relevant quality control details.")
-                st.write("Allow some time for each tab to load.")
-                st.info("Note that a new tab will not load until the current tab has finished loading. " \
+                st.write("Only the required CLIF columns of each table are loaded, so columns outside the CLIF schema are not part of the duplicate, missingness and summary checks.")
+                st.write("Allow some time for each tab to load. Results are cached, so revisiting unchanged files is fast.")
+                st.info("The tables are checked in parallel and each tab loads as soon as its checks have finished. " \
                     "The overall progress of the quality control checks is displayed below. For detailed progress information, please expand the QC section.", 
                     icon="ℹ️")
         
@@ -50,35 +151,52 @@ def show_qc():
             logger.info(f"File type selected: {filetype}")
             st.session_state['filetype'] = filetype
 
-        if root_location and filetype:
-            tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9, tab10 = st.tabs(["ADT", 
-                "Hospitalization", "Labs", "Medication", "Microbiology", "Patient", 
-                "Patient Assessment", "Position", "Respiratory Support", "Vitals"])
-
-            with tab1:
-                show_adt_qc()
-            with tab2:
-                show_hosp_qc()
-            with tab3:
-                show_labs_qc()
-            with tab4:
-                show_meds_qc()
-            with tab5:
-                show_microbio_qc()
-            with tab6:
-                show_patient_qc()
-            with tab7:
-                show_patient_assess_qc()
-            with tab8:
-                show_position_qc()
-            with tab9:
-                show_respiratory_support_qc()
-            with tab10:
-                show_vitals_qc()
-
-                
+        st.session_state['memory_budget_mb'] = memory_budget_mb
+        st.session_state['qc_engine'] = engine
+        preview = run_mode == "Preview"
 
+        if clear_cache and root_location and filetype:
+            for table_name in TABLE_FILES:
+                invalidate_cache(table_filepath(root_location, table_name, filetype), table_name)
+            logger.info(f"Cleared cached QC results for {root_location}.")
 
+        if root_location and filetype:
+            if preview:
+                st.button("Run full QC", on_click=run_full_qc,
+                          help="Replace the estimates with the results of the full, exact quality checks.")
+            tabs = dict(zip(QC_TABS, st.tabs([label for label, _ in QC_TABS.values()])))
+            overall_progress = st.progress(0, text="Running quality checks...")
 
+            # Placeholder progress for each tab until its results are ready
+            tab_progress = {}
+            for table_name, tab in tabs.items():
+                with tab:
+                    tab_progress[table_name] = st.empty()
+                    tab_progress[table_name].progress(0, text="Waiting for results...")
 
+            # Tables run concurrently; each tab is rendered as soon as its table finishes
+            finished = []
+            for event, table_name, payload in run_tables_parallel(root_location, filetype, memory_budget_mb=memory_budget_mb, engine=engine,
+                                                                  preview=preview):
+                if event == 'progress':
+                    percent, text = payload
+                    tab_progress[table_name].progress(percent, text=text)
+                    continue
+                tab_progress[table_name].empty()
+                with tabs[table_name]:
+                    if event == 'done' and preview:
+                        show_preview_qc(payload)
+                    elif event == 'done':
+                        QC_TABS[table_name][1](artifacts=payload)
+                    else:
+                        st.error(f"Quality check for {table_name} failed: {payload}")
+                finished.append(table_name)
+                overall_progress.progress(int(100 * len(finished) / len(tabs)), text=f"Finished {table_name} ({len(finished)}/{len(tabs)})")
 
+            # Tables that were not run (e.g. missing files) show their own message
+            for table_name, tab in tabs.items():
+                if table_name not in finished:
+                    tab_progress[table_name].empty()
+                    with tab:
+                        QC_TABS[table_name][1]()
+            overall_progress.progress(100, text="Quality checks completed.")
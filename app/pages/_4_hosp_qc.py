@@ -1,14 +1,13 @@
 import streamlit as st
-import pandas as pd
 import os
 import logging
 import time
-from common_qc import read_data, check_required_variables
-from common_qc import validate_and_convert_dtypes, name_category_mapping
+from qc_cache import cached_table_qc
+from qc_checks import table_filepath
 from logging_config import setup_logging
 from common_features import set_bg_hack_url
 
-def show_hosp_qc():
+def show_hosp_qc(artifacts=None):
     '''
     '''
     set_bg_hack_url()
@@ -23,15 +22,10 @@ def show_hosp_qc():
 
     logger.info(f"!!! Starting QC for {TABLE}.")
 
-    # Main
-    qc_summary = []
-    qc_recommendations = []
-
-
     if 'root_location' in st.session_state and 'filetype' in st.session_state:
         root_location = st.session_state['root_location']
         filetype = st.session_state['filetype']
-        filepath = os.path.join(root_location, f'clif_hospitalization.{filetype}')
+        filepath = table_filepath(root_location, TABLE, filetype)
 
         logger.info(f"Filepath set to {filepath}")
 
@@ -45,109 +39,75 @@ def show_hosp_qc():
             progress_bar.progress(5, text='File found...')
 
             progress_bar.progress(10, text='Starting QC...')
-    
-            with st.expander("Expand to view", expanded=False):
-                # Load the file
-                with st.spinner("Loading data..."):
-                    progress_bar.progress(15, text='Loading data...')
-                    logger.info("~~~ Loading data ~~~")
-                    data = read_data(filepath, filetype)
-                    logger.info("Data loaded successfully.")
 
+            # Run the checks, or load their results from the cache if the file is unchanged.
+            # Results computed ahead of time (e.g. by the parallel QC run) are passed in.
+            if artifacts is None:
+                with st.spinner("Running quality checks..."):
+                    artifacts = cached_table_qc(TABLE, root_location, filetype,
+                                                progress=lambda percent, text: progress_bar.progress(percent, text=text),
+                                                memory_budget_mb=st.session_state.get('memory_budget_mb'),
+                                                engine=st.session_state.get('qc_engine'))
+            qc_summary = artifacts['qc_summary']
+            qc_recommendations = artifacts['qc_recommendations']
 
+            with st.expander("Expand to view", expanded=False):
                 # Display the data
                 logger.info("~~~ Displaying data ~~~")
                 st.write(f"## {TABLE} Data Preview")
-                with st.spinner("Loading data preview..."):
-                    progress_bar.progress(20, text='Loading data preview...')
-                    total_counts = data.shape[0]
-                    ttl_unique_patients = data['patient_id'].nunique()
-                    ttl_unique_encounters = data['hospitalization_id'].nunique()
-                    duplicate_count = data.duplicated().sum()
-                    st.write(f"Total records: {total_counts}")
-                    st.write(f"Total unique patients: {ttl_unique_patients}")
-                    st.write(f"Total unique hospital encounters: {ttl_unique_encounters}")
-                    if duplicate_count > 0:
-                        st.write(f"Duplicate records: {duplicate_count}")
-                        qc_summary.append(f"{duplicate_count} duplicate(s) found in the data.")
-                        qc_recommendations.append("Duplicate records found. Please review and remove duplicates.")
-                    else:
-                        st.write("No duplicate records found.")
-                    st.write(data.head())
-                    logger.info("Data displayed.")
-
-                
-                # Validate and convert data types
+                st.write(f"Total records: {artifacts['total_counts']}")
+                if artifacts.get('mode') == 'incremental':
+                    st.write(f"Partitions: {artifacts['partition_count']} ({artifacts['partitions_read']} new or changed since the last check)")
+                st.write(f"Total unique patients: {artifacts['ttl_unique_patients']}")
+                st.write(f"Total unique hospital encounters: {artifacts['ttl_unique_encounters']}")
+                if artifacts['duplicate_count'] > 0:
+                    st.write(f"Duplicate records: {artifacts['duplicate_count']}")
+                    if artifacts['duplicate_sample'] is not None:
+                        st.write(artifacts['duplicate_sample'])
+                else:
+                    st.write("No duplicate records found.")
+                if artifacts['key_duplicate_count'] > artifacts['duplicate_count']:
+                    st.write(f"Records sharing the same {', '.join(artifacts['duplicate_keys'])}: {artifacts['key_duplicate_count']}")
+                    if artifacts['key_duplicate_sample'] is not None:
+                        st.write(artifacts['key_duplicate_sample'])
+                st.write(artifacts['head'])
+
+
+                # Data type validation
                 st.write("## Data Type Validation")
-                with st.spinner("Validating data types..."):
-                    progress_bar.progress(30, text='Validating data types...')
-                    logger.info("~~~ Validating data types ~~~")
-                    data, validation_results = validate_and_convert_dtypes(TABLE, data)
-                    validation_df = pd.DataFrame(validation_results, columns=['Column', 'Actual', 'Expected', 'Status'])
-                    mismatch_columns = [row[0] for row in validation_results if row[1] != row[2]]
-                    if mismatch_columns:
-                        qc_summary.append("Some columns have mismatched data types.")
-                        qc_recommendations.append("Some columns have mismatched data types. Please review and convert to the expected data types.")
-                    st.write(validation_df)
-                    logger.info("Data type validation completed.")
-
-                
-                # Display missingness for each column
+                st.write(artifacts['validation_df'])
+
+
+                # Missingness for each column
                 st.write(f"## Missingness")
-                with st.spinner("Checking for missing values..."):
-                    progress_bar.progress(40, text='Checking for missing values...')
-                    logger.info("~~~ Checking for missing values ~~~")
-                    missing_counts = data.isnull().sum()
-                    if missing_counts.any():
-                        missing_percentages = (missing_counts / total_counts) * 100
-                        missing_info = pd.DataFrame({
-                            'Missing Count': missing_counts,
-                            'Missing Percentage': missing_percentages.map('{:.2f}%'.format)
-                        })
-                        missing_info_sorted = missing_info.sort_values(by='Missing Count', ascending=False)
-                        st.write(missing_info_sorted)
-                        qc_summary.append("Missing values found in columns - " + ', '.join(missing_info[missing_info['Missing Count'] > 0].index.tolist()))
-                    else:
-                        st.write("No missing values found in all required columns.")
-                    logger.info("Checked for missing values.")
-
-            
-                # Check for required columns    
-                logger.info("~~~ Checking for required columns ~~~")  
+                if artifacts['missing_info'] is not None:
+                    st.write(artifacts['missing_info'])
+                else:
+                    st.write("No missing values found in all required columns.")
+
+
+                # Required columns
                 st.write(f"## {TABLE} Required Columns")
-                with st.spinner("Checking for required columns..."):
-                    progress_bar.progress(60, text='Checking for required columns...')
-                    required_cols_check = check_required_variables(TABLE, data)
-                    st.write(required_cols_check)
-                    qc_summary.append(required_cols_check)
-                    if required_cols_check != f"All required columns present for '{TABLE}'.":
-                        qc_recommendations.append("Some required columns are missing. Please ensure all required columns are present.")  
-                        logger.warning("Some required columns are missing.")
-                    logger.info("Checked for required columns.")
-                
+                st.write(artifacts['required_cols_check'])
+
+
                 # Name to Category mappings
-                logger.info("~~~ Mapping ~~~")
                 st.write('## Name to Category Mapping')
-                with st.spinner("Displaying Name to Category Mapping..."):
-                    progress_bar.progress(90, text='Displaying Name to Category Mapping...')
-                    mappings = name_category_mapping(data)
-                    n = 1
-                    for i, mapping in enumerate(mappings):
-                        mapping_name = mapping.columns[0]
-                        mapping_cat = mapping.columns[1]
-                        st.write(f"{n}. Mapping `{mapping_name}` to `{mapping_cat}`")
-                        st.write(mapping.reset_index().drop("index", axis = 1))
-                        n += 1
+                for n, mapping in enumerate(artifacts['mappings'], start=1):
+                    mapping_name = mapping.columns[0]
+                    mapping_cat = mapping.columns[1]
+                    st.write(f"{n}. Mapping `{mapping_name}` to `{mapping_cat}`")
+                    st.write(mapping)
 
                 progress_bar.progress(100, text='Quality check completed. Displaying results...')
-             
+
 
             # End time
             end_time = time.time()
             elapsed_time = end_time - start_time
             st.success(f"Quality check completed. Time taken to run summary: {elapsed_time:.2f} seconds", icon="✅")
             logger.info(f"Time taken to run summary: {elapsed_time:.2f} seconds")
-            
+
             # Display QC Summary and Recommendations
             st.write("# QC Summary and Recommendations")
             logger.info("Displaying QC Summary and Recommendations.")
@@ -170,5 +130,4 @@ def show_hosp_qc():
         st.write("Please provide the root location and file type to proceed.")
         logger.warning("Root location and/or file type not provided.")
 
-    logger.info(f"!!! Completed QC for {TABLE}.")       
-
+    logger.info(f"!!! Completed QC for {TABLE}.")
@@ -0,0 +1,325 @@
+import hashlib
+import logging
+import os
+import pickle
+import time
+from qc_checks import QC_RUNNERS, OUTLIER_THRESHOLDS, table_filepath, table_dependencies, table_partitions, _report_progress
+from qc_streaming import run_streaming_qc, use_streaming, stream_partial, merge_partials, finalize_partial, check_adt_overlaps
+from qc_duckdb import run_duckdb_qc
+from qc_preview import run_preview_qc, PREVIEW_ROWS
+
+logger = logging.getLogger(__name__)
+
+# On-disk cache of QC artifacts. Entries are keyed by the table and a
+# fingerprint of its input files, so a re-visit with unchanged inputs is
+# served from disk and any change to the files produces a new key. Least
+# recently used entries are evicted once the directory exceeds its size limit.
+#
+# Tables stored as a directory of partition files are checked incrementally:
+# the partial result of each partition is cached under that file's own
+# fingerprint, so when a new partition is appended only the new file is read
+# and its partial is merged with the cached ones. Partition entries carry the
+# directory's table prefix, so the entries of removed partitions can be found
+# and pruned.
+
+CACHE_DIR = os.environ.get('CLIF_QC_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.clif_lighthouse', 'qc_cache'))
+CACHE_MAX_BYTES = int(os.environ.get('CLIF_QC_CACHE_MAX_MB', 2048)) * 1024 * 1024
+# QC engine: 'pandas' loads tables into pandas (streaming them when over the
+# memory budget), 'duckdb' runs the checks as SQL over the files
+QC_ENGINES = ['pandas', 'duckdb']
+QC_ENGINE = os.environ.get('CLIF_QC_ENGINE', 'pandas')
+# Bump when the structure of the QC artifacts changes
+CACHE_VERSION = 9
+
+PARQUET_MAGIC = b'PAR1'
+
+
+def _parquet_footer_hash(filepath):
+    """
+    Hash the parquet footer (file metadata), which changes whenever the
+    schema, row groups or column statistics change.
+    """
+    with open(filepath, 'rb') as f:
+        f.seek(-8, os.SEEK_END)
+        trailer = f.read(8)
+        if trailer[4:] != PARQUET_MAGIC:
+            return None
+        footer_length = int.from_bytes(trailer[:4], 'little')
+        f.seek(-(8 + footer_length), os.SEEK_END)
+        return hashlib.sha256(f.read(footer_length)).hexdigest()
+
+def file_fingerprint(filepath):
+    """
+    Fingerprint a file by its size, modification time and, for parquet
+    files, a hash of the footer. A directory is fingerprinted by the files
+    it contains.
+
+    Parameters:
+        filepath (str): Path to the file.
+
+    Returns:
+        tuple: (path, size, mtime_ns, footer_hash), or (path, fingerprints
+               of the files) for a directory
+    """
+    if os.path.isdir(filepath):
+        # Hidden and marker files (e.g. _SUCCESS) are not data
+        filepaths = sorted(os.path.join(dirpath, filename)
+                           for dirpath, _, filenames in os.walk(filepath)
+                           for filename in filenames if not filename.startswith(('.', '_')))
+        return (os.path.abspath(filepath), tuple(file_fingerprint(path) for path in filepaths))
+    stat = os.stat(filepath)
+    footer_hash = _parquet_footer_hash(filepath) if filepath.endswith('.parquet') else None
+    return (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns, footer_hash)
+
+def _table_prefix(filepath, table_name):
+    return hashlib.sha256(f"{table_name}|{os.path.abspath(filepath)}".encode()).hexdigest()[:16]
+
+def _mode_prefix(mode):
+    return hashlib.sha256(mode.encode()).hexdigest()[:8]
+
+def _fingerprint_digest(table_name, mode, filepaths):
+    fingerprints = [file_fingerprint(path) for path in filepaths]
+    return hashlib.sha256(repr((CACHE_VERSION, table_name, mode, fingerprints)).encode()).hexdigest()[:32]
+
+def cache_key(table_name, filepath, dependencies=(), mode='full'):
+    """
+    Cache key for the QC artifacts of a table:
+    '<table prefix>-<mode prefix>-<fingerprint hash>'.
+    """
+    digest = _fingerprint_digest(table_name, mode, [filepath, *dependencies])
+    return f"{_table_prefix(filepath, table_name)}-{_mode_prefix(mode)}-{digest}"
+
+def _partition_prefix(directory, table_name):
+    return f"{_table_prefix(directory, table_name)}-{_mode_prefix('partition')}-"
+
+def partition_cache_key(table_name, directory, filepath, dependencies=()):
+    """
+    Cache key for the partial result of one partition file of a table
+    directory: '<directory prefix>-<mode prefix>-<file prefix>-<fingerprint hash>'.
+    """
+    digest = _fingerprint_digest(table_name, 'partition', [filepath, *dependencies])
+    return f"{_partition_prefix(directory, table_name)}{_table_prefix(filepath, table_name)}-{digest}"
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.pkl")
+
+def load_artifacts(key):
+    """
+    Load cached artifacts, or return None on a miss. A hit refreshes the
+    entry's modification time, which is used for LRU eviction.
+    """
+    path = _entry_path(key)
+    try:
+        with open(path, 'rb') as f:
+            artifacts = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+        os.remove(path)
+        return None
+    os.utime(path)
+    return artifacts
+
+def store_artifacts(key, artifacts):
+    """
+    Store artifacts, replacing entries for older versions of the same file
+    in the same mode, and evict least recently used entries beyond the size
+    limit.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    prefix = key.rsplit('-', 1)[0] + '-'
+    for entry in os.listdir(CACHE_DIR):
+        if entry.startswith(prefix) and entry != f"{key}.pkl":
+            os.remove(os.path.join(CACHE_DIR, entry))
+    # Write to a temporary file first so readers never see a partial entry
+    path = _entry_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(artifacts, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    evict_lru()
+
+def evict_lru(max_bytes=None):
+    """
+    Remove least recently used entries until the cache fits in max_bytes.
+    """
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(CACHE_DIR):
+        return
+    entries = []
+    for entry in os.listdir(CACHE_DIR):
+        if entry.endswith('.pkl'):
+            stat = os.stat(os.path.join(CACHE_DIR, entry))
+            entries.append((stat.st_mtime, stat.st_size, entry))
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        os.remove(os.path.join(CACHE_DIR, entry))
+        total_bytes -= size
+        logger.info(f"Evicted QC cache entry {entry}.")
+
+def invalidate_cache(filepath=None, table_name=None):
+    """
+    Remove cached artifacts for one table file, or the whole cache when no
+    file is given. For a table stored as a directory, the cached partials of
+    its partition files are removed too, as their keys start with the
+    directory's prefix.
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return
+    prefix = _table_prefix(filepath, table_name) if filepath is not None else ''
+    for entry in os.listdir(CACHE_DIR):
+        if entry.startswith(prefix):
+            os.remove(os.path.join(CACHE_DIR, entry))
+
+def table_cache_key(table_name, root_location, filetype, mode='full'):
+    """
+    Cache key for a CLIF table under the root location and the files it depends on.
+    """
+    filepath = table_filepath(root_location, table_name, filetype)
+    if mode == 'preview':
+        # Previews of different sample sizes are cached separately
+        mode = f'preview-{PREVIEW_ROWS}'
+    return cache_key(table_name, filepath, table_dependencies(root_location, table_name, filetype), mode)
+
+def table_qc_mode(table_name, root_location, filetype, memory_budget_mb=None, engine=None, preview=False):
+    """
+    'preview' for an estimate from a sample, 'duckdb' for the DuckDB engine
+    (which scans a directory of partitions as one table), 'incremental' for
+    a table stored as a directory of partitions; otherwise 'streaming' when
+    the table does not fit in the memory budget, else 'full'.
+    """
+    if preview:
+        return 'preview'
+    if (engine or QC_ENGINE) == 'duckdb':
+        return 'duckdb'
+    if table_partitions(root_location, table_name, filetype) is not None:
+        return 'incremental'
+    return 'streaming' if use_streaming(table_name, root_location, filetype, memory_budget_mb) else 'full'
+
+def cached_table_qc(table_name, root_location, filetype, progress=None, refresh=False, memory_budget_mb=None, engine=None,
+                    preview=False):
+    """
+    Run the QC for a table, serving the artifacts from the on-disk cache
+    when its input files are unchanged.
+
+    Parameters:
+        table_name (str): Name of the table, e.g. 'Labs'.
+        root_location (str): Directory containing the CLIF tables.
+        filetype (str): Type of the files ('csv', 'parquet' or 'fst').
+        progress (callable, optional): Called with (percent, text) as checks run.
+        refresh (bool): Recompute and overwrite any cached artifacts.
+        memory_budget_mb (int, optional): Memory budget in MB; tables estimated
+            to exceed it are checked in streaming mode. Defaults to
+            CLIF_QC_MEMORY_BUDGET_MB (no budget when unset).
+        engine (str, optional): 'pandas' or 'duckdb'. Defaults to QC_ENGINE.
+        preview (bool): Estimate the results from a sample of the table
+            (see qc_preview) instead of running the exact checks.
+
+    Returns:
+        dict: QC artifacts for the table.
+    """
+    mode = table_qc_mode(table_name, root_location, filetype, memory_budget_mb, engine, preview)
+    key = table_cache_key(table_name, root_location, filetype, mode)
+    if not refresh:
+        artifacts = load_artifacts(key)
+        if artifacts is not None:
+            logger.info(f"Loaded cached QC results for {table_name}.")
+            return artifacts
+    start_time = time.time()
+    if mode == 'preview':
+        artifacts = run_preview_qc(table_name, root_location, filetype, progress)
+    elif mode == 'incremental':
+        artifacts = run_incremental_qc(table_name, root_location, filetype, progress, refresh, memory_budget_mb)
+    elif mode == 'duckdb':
+        artifacts = run_duckdb_qc(table_name, root_location, filetype, progress, memory_budget_mb)
+    elif mode == 'streaming':
+        artifacts = run_streaming_qc(table_name, root_location, filetype, progress, memory_budget_mb)
+    else:
+        artifacts = QC_RUNNERS[table_name](root_location, filetype, progress)
+    artifacts['compute_time'] = time.time() - start_time
+    store_artifacts(key, artifacts)
+    return artifacts
+
+def cached_partition_partial(table_name, directory, filepath, filetype, refresh=False, memory_budget_mb=None):
+    """
+    Partial QC result of one partition file, streamed within the memory
+    budget and cached under the file's fingerprint.
+
+    Returns:
+        dict: The partial result.
+        bool: Whether the partition was read (not served from the cache).
+    """
+    dependencies = [OUTLIER_THRESHOLDS[table_name]] if table_name in OUTLIER_THRESHOLDS else []
+    key = partition_cache_key(table_name, directory, filepath, dependencies)
+    partial = None if refresh else load_artifacts(key)
+    if partial is not None:
+        return partial, False
+    partial = stream_partial(table_name, filepath, filetype, memory_budget_mb)
+    store_artifacts(key, partial)
+    return partial, True
+
+def prune_partition_partials(table_name, directory, partitions):
+    """
+    Remove the cached partials of partition files that are no longer in the
+    table directory.
+
+    Returns:
+        int: Number of entries removed.
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+    prefix = _partition_prefix(directory, table_name)
+    current = {_table_prefix(filepath, table_name) for filepath in partitions}
+    removed = 0
+    for entry in os.listdir(CACHE_DIR):
+        if entry.startswith(prefix) and entry[len(prefix):].split('-', 1)[0] not in current:
+            os.remove(os.path.join(CACHE_DIR, entry))
+            removed += 1
+    return removed
+
+def run_incremental_qc(table_name, root_location, filetype, progress=None, refresh=False, memory_budget_mb=None):
+    """
+    Run the QC for a table stored as a directory of partition files, reading
+    only the partitions without a cached partial result. Cached partials of
+    partitions removed from the directory are pruned.
+
+    Parameters:
+        table_name (str): Name of the table, e.g. 'Vitals'.
+        root_location (str): Directory containing the CLIF tables.
+        filetype (str): Type of the partition files ('csv' or 'parquet').
+        progress (callable, optional): Called with (percent, text) as partitions are checked.
+        refresh (bool): Re-read every partition instead of using cached partials.
+        memory_budget_mb (int, optional): Memory budget in MB for reading a partition.
+
+    Returns:
+        dict: QC artifacts for the table, with the number of partitions and
+              of partitions read in this run.
+    """
+    directory = table_filepath(root_location, table_name, filetype)
+    partitions = table_partitions(root_location, table_name, filetype)
+    if not partitions:
+        raise FileNotFoundError(f"No .{filetype} files found in {directory}.")
+    removed = prune_partition_partials(table_name, directory, partitions)
+    if removed:
+        logger.info(f"{table_name}: removed the cached partials of {removed} partition(s) no longer in {directory}.")
+    partial = None
+    read_count = 0
+    for i, filepath in enumerate(partitions):
+        _report_progress(progress, 10 + int(80 * i / len(partitions)),
+                         f'Checking partition {i + 1} of {len(partitions)}: {os.path.basename(filepath)}...')
+        partition, was_read = cached_partition_partial(table_name, directory, filepath, filetype, refresh, memory_budget_mb)
+        read_count += was_read
+        partial = partition if partial is None else merge_partials(partial, partition)
+    logger.info(f"{table_name}: read {read_count} of {len(partitions)} partition(s), "
+                f"{len(partitions) - read_count} served from the cache.")
+    _report_progress(progress, 90, 'Merging partitions...')
+    artifacts = finalize_partial(partial)
+    artifacts['mode'] = 'incremental'
+    artifacts['partition_count'] = len(partitions)
+    artifacts['partitions_read'] = read_count
+    if table_name == 'ADT':
+        check_adt_overlaps(artifacts, root_location, filetype)
+    return artifacts
@@ -0,0 +1,540 @@
+import hashlib
+import pandas as pd
+import matplotlib.pyplot as plt
+import logging
+import os
+from io import BytesIO
+from common_qc import read_data, partition_files, check_required_variables, check_categories_exist, check_time_overlap, fix_overlaps
+from common_qc import replace_outliers_with_na_long, replace_outliers_with_na_wide, generate_facetgrid_histograms
+from common_qc import device_mode_histograms, device_mode_summaries, initial_mode_choice, threshold_ranges
+from common_qc import validate_and_convert_dtypes, generate_summary_stats, name_category_mapping, find_duplicates
+from reqd_vars_dtypes import required_variables, expected_data_types, categorical_variables
+from lab_values import parse_lab_values
+
+logger = logging.getLogger(__name__)
+
+# Quality checks for each CLIF table. Every run_*_qc function loads its table,
+# runs the same checks as the corresponding page and returns the results as a
+# dictionary of artifacts (counts, DataFrames and rendered figures) so they
+# can be cached and rendered without Streamlit.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TABLE_FILES = {
+    'ADT': 'clif_adt',
+    'Hospitalization': 'clif_hospitalization',
+    'Labs': 'clif_labs',
+    'Medication_admin_continuous': 'clif_medication_admin_continuous',
+    'Microbiology_Culture': 'clif_microbiology_culture',
+    'Patient': 'clif_patient',
+    'Patient_Assessments': 'clif_patient_assessments',
+    'Position': 'clif_position',
+    'Respiratory_Support': 'clif_respiratory_support',
+    'Vitals': 'clif_vitals'
+}
+
+OUTLIER_THRESHOLDS = {
+    'Labs': os.path.join(APP_DIR, 'thresholds', 'nejm_outlier_thresholds_labs.csv'),
+    'Respiratory_Support': os.path.join(APP_DIR, 'thresholds', 'nejm_outlier_thresholds_respiratory_support.csv'),
+    'Vitals': os.path.join(APP_DIR, 'thresholds', 'nejm_outlier_thresholds_vitals.csv')
+}
+
+# Corrected tables written by the app, kept out of the CLIF table directory
+OUTPUT_DIR = os.environ.get('CLIF_QC_OUTPUT_DIR', os.path.join(os.path.expanduser('~'), '.clif_lighthouse', 'output'))
+
+REQUIRED_LOCATION_CATEGORIES = ["ER", "OR", "ICU", "Ward", "Other"]
+# Closest data categories listed for each missing threshold category
+CATEGORY_MATCHES = 3
+
+# Load the name, category and group columns as pandas categoricals. Set
+# CLIF_QC_CATEGORICAL=0 to load them as plain strings.
+LOAD_CATEGORICAL = os.environ.get('CLIF_QC_CATEGORICAL', '1') != '0'
+
+# Columns identifying a record; rows sharing them are reported even when
+# other values differ
+DUPLICATE_KEYS = {
+    'ADT': ['hospitalization_id', 'in_dttm'],
+    'Hospitalization': ['hospitalization_id'],
+    'Labs': ['hospitalization_id', 'lab_collect_dttm', 'lab_category'],
+    'Medication_admin_continuous': ['hospitalization_id', 'admin_dttm', 'med_category'],
+    'Microbiology_Culture': ['hospitalization_id', 'collect_dttm', 'organism_id'],
+    'Patient': ['patient_id'],
+    'Patient_Assessments': ['hospitalization_id', 'recorded_dttm', 'assessment_category'],
+    'Position': ['hospitalization_id', 'recorded_dttm'],
+    'Respiratory_Support': ['hospitalization_id', 'recorded_dttm'],
+    'Vitals': ['hospitalization_id', 'recorded_dttm', 'vital_category']
+}
+
+
+def table_filepath(root_location, table_name, filetype):
+    """
+    Path of a CLIF table under the root location: the clif_<table>.<filetype>
+    file, or the clif_<table> directory when the table is stored as a
+    directory of partition files instead.
+    """
+    filepath = os.path.join(root_location, f'{TABLE_FILES[table_name]}.{filetype}')
+    directory = os.path.join(root_location, TABLE_FILES[table_name])
+    if not os.path.exists(filepath) and os.path.isdir(directory):
+        return directory
+    return filepath
+
+def table_partitions(root_location, table_name, filetype):
+    """
+    Partition files of a table stored as a directory, or None when the
+    table is a single file.
+    """
+    filepath = table_filepath(root_location, table_name, filetype)
+    return partition_files(filepath, filetype) if os.path.isdir(filepath) else None
+
+def table_dependencies(root_location, table_name, filetype):
+    """
+    Files other than the table itself whose contents affect its QC results.
+    """
+    dependencies = []
+    if table_name in OUTLIER_THRESHOLDS:
+        dependencies.append(OUTLIER_THRESHOLDS[table_name])
+    if table_name == 'ADT':
+        hospitalization_path = table_filepath(root_location, 'Hospitalization', filetype)
+        if os.path.exists(hospitalization_path):
+            dependencies.append(hospitalization_path)
+    return dependencies
+
+def figure_to_png(figure):
+    """
+    Render a matplotlib figure to PNG bytes and close it.
+    """
+    buffer = BytesIO()
+    figure.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(getattr(figure, 'figure', figure))
+    return buffer.getvalue()
+
+def _report_progress(progress, percent, text):
+    if progress is not None:
+        progress(percent, text)
+
+
+# Checks shared by all tables
+def check_data_preview(data, artifacts, id_columns=('hospitalization_id',)):
+    """
+    Record counts, unique IDs, duplicates and the first rows of the data.
+    """
+    artifacts['total_counts'] = data.shape[0]
+    if 'patient_id' in id_columns:
+        artifacts['ttl_unique_patients'] = data['patient_id'].nunique()
+    if 'hospitalization_id' in id_columns:
+        artifacts['ttl_unique_encounters'] = data['hospitalization_id'].nunique()
+    duplicate_count, duplicate_sample = find_duplicates(data)
+    artifacts['duplicate_count'] = duplicate_count
+    artifacts['duplicate_sample'] = duplicate_sample
+    if duplicate_count > 0:
+        artifacts['qc_summary'].append(f"{duplicate_count} duplicate(s) found in the data.")
+        artifacts['qc_recommendations'].append("Duplicate records found. Please review and remove duplicates.")
+    keys = [key for key in DUPLICATE_KEYS.get(artifacts['table'], []) if key in data.columns]
+    artifacts['duplicate_keys'] = keys
+    artifacts['key_duplicate_count'], artifacts['key_duplicate_sample'] = find_duplicates(data, keys) if keys else (0, None)
+    check_key_duplicates(artifacts)
+    artifacts['head'] = data.head()
+
+def check_key_duplicates(artifacts):
+    """
+    Record a summary point for records that share their key columns without
+    being full duplicates.
+    """
+    repeated = artifacts['key_duplicate_count'] - artifacts['duplicate_count']
+    if repeated > 0:
+        keys = ', '.join(artifacts['duplicate_keys'])
+        artifacts['qc_summary'].append(f"{repeated} record(s) share the same {keys} as another record with different values.")
+        artifacts['qc_recommendations'].append(f"Records sharing the same {keys} found. Please review whether they are conflicting entries.")
+
+def check_data_types(table_name, data, artifacts):
+    """
+    Validate data types and return the converted data.
+    """
+    data, validation_results = validate_and_convert_dtypes(table_name, data)
+    artifacts['validation_df'] = pd.DataFrame(validation_results, columns=['Column', 'Actual', 'Expected', 'Status'])
+    mismatch_columns = [row[0] for row in validation_results if row[1] != row[2]]
+    if mismatch_columns:
+        artifacts['qc_summary'].append("Some columns have mismatched data types.")
+        artifacts['qc_recommendations'].append("Some columns have mismatched data types. Please review and convert to the expected data types.")
+    return data
+
+def check_missingness(data, artifacts):
+    """
+    Record missing counts and percentages for columns with missing values.
+    """
+    missing_counts = data.isnull().sum()
+    artifacts['missing_info'] = None
+    if missing_counts.any():
+        missing_percentages = (missing_counts / data.shape[0]) * 100
+        missing_info = pd.DataFrame({
+            'Missing Count': missing_counts,
+            'Missing (%)': missing_percentages.map('{:.2f}%'.format)
+        })
+        artifacts['missing_info'] = missing_info.sort_values(by='Missing Count', ascending=False)
+        artifacts['qc_summary'].append("Missing values found in columns - " + ', '.join(missing_info[missing_info['Missing Count'] > 0].index.tolist()))
+
+def check_required_columns(table_name, data, artifacts):
+    """
+    Record whether all required columns are present.
+    """
+    required_cols_check = check_required_variables(table_name, data)
+    artifacts['required_cols_check'] = required_cols_check
+    artifacts['qc_summary'].append(required_cols_check)
+    if required_cols_check != f"All required columns present for '{table_name}'.":
+        artifacts['qc_recommendations'].append("Some required columns are missing. Please ensure all required columns are present.")
+        logger.warning("Some required columns are missing.")
+
+def check_mappings(data, artifacts):
+    """
+    Record the name to category mapping frequencies.
+    """
+    artifacts['mappings'] = [mapping.reset_index(drop=True) for mapping in name_category_mapping(data)]
+
+def check_category_presence(data, outlier_thresholds, category_column, label, artifacts):
+    """
+    Record threshold categories missing from the data and their closest matches.
+    """
+    similar_cats, missing_cats, matches = check_categories_exist(data, outlier_thresholds, category_column,
+                                                                 top_k=CATEGORY_MATCHES, return_matches=True)
+    artifacts['similar_categories'] = similar_cats
+    artifacts['category_matches'] = matches
+    artifacts['missing_categories'] = missing_cats
+    if missing_cats:
+        if similar_cats:
+            artifacts['qc_summary'].append(f"Some {label} categories are missing. Similar categories are present.")
+            artifacts['qc_recommendations'].append(f"Some {label} categories are missing. Please ensure all {label} categories are present. Review similar categories for potential duplicates.")
+        else:
+            artifacts['qc_summary'].append(f"Some {label} categories are missing. No similar categories found.")
+            artifacts['qc_recommendations'].append(f"Some {label} categories are missing. Please ensure all {label} categories are present. No similar categories found.")
+        logger.warning(f"Missing {label} categories found.")
+    else:
+        artifacts['qc_summary'].append(f"All {label} categories are present.")
+
+def check_lab_value_status(artifacts, present, non_numeric=False, censored_count=0):
+    """
+    Record whether lab_value_numeric is present or was parsed from lab_value,
+    and how many parsed values are censored.
+    """
+    artifacts['censored_count'] = censored_count
+    if present:
+        artifacts['lab_value_status'] = 'present'
+        return
+    if non_numeric:
+        artifacts['lab_value_status'] = 'non_numeric'
+        artifacts['qc_summary'].append("Non-numeric characters present in lab_value.")
+        artifacts['qc_recommendations'].append("Recommend extracting numeric values and creating a new column - 'lab_value_numeric'.")
+    else:
+        artifacts['lab_value_status'] = 'numeric'
+    if censored_count > 0:
+        artifacts['qc_summary'].append(f"{censored_count:,} lab values are censored at a limit (e.g. '<0.5' or '>1000').")
+        artifacts['qc_recommendations'].append("Recommend keeping the censoring operator of censored lab values alongside 'lab_value_numeric', which holds the limit.")
+
+def check_outliers_long(data, outlier_thresholds, category_column, value_column, artifacts):
+    """
+    Replace outliers with NA and record how many were replaced.
+    """
+    data, replaced_count, _, _ = replace_outliers_with_na_long(data, outlier_thresholds, category_column, value_column)
+    artifacts['replaced_count'] = replaced_count
+    if replaced_count > 0:
+        artifacts['qc_summary'].append("Outliers found in data.")
+        artifacts['qc_recommendations'].append("Outliers found. Please replace values with NA.")
+    return data
+
+
+def table_categorical_columns(table_name):
+    """
+    Columns of the table loaded as categoricals, or None when disabled.
+    """
+    return categorical_variables[table_name] if LOAD_CATEGORICAL else None
+
+def _load_table(table_name, root_location, filetype, extra_columns=()):
+    filepath = table_filepath(root_location, table_name, filetype)
+    logger.info("~~~ Loading data ~~~")
+    data = read_data(filepath, filetype, columns=required_variables[table_name] + list(extra_columns),
+                     dtypes=expected_data_types[table_name], categorical=table_categorical_columns(table_name))
+    logger.info("Data loaded successfully.")
+    return data
+
+def _new_artifacts(table_name):
+    return {'table': table_name, 'qc_summary': [], 'qc_recommendations': []}
+
+def _run_basic_qc(table_name, root_location, filetype, progress=None, id_columns=('hospitalization_id',)):
+    """
+    Checks shared by the tables without table-specific checks.
+    """
+    artifacts = _new_artifacts(table_name)
+    _report_progress(progress, 15, 'Loading data...')
+    data = _load_table(table_name, root_location, filetype)
+    _report_progress(progress, 20, 'Loading data preview...')
+    check_data_preview(data, artifacts, id_columns)
+    _report_progress(progress, 30, 'Validating data types...')
+    data = check_data_types(table_name, data, artifacts)
+    _report_progress(progress, 40, 'Checking for missing values...')
+    check_missingness(data, artifacts)
+    _report_progress(progress, 60, 'Checking for required columns...')
+    check_required_columns(table_name, data, artifacts)
+    _report_progress(progress, 90, 'Displaying Name to Category Mapping...')
+    check_mappings(data, artifacts)
+    return artifacts
+
+
+# Table QCs
+def run_adt_qc(root_location, filetype, progress=None):
+    table_name = 'ADT'
+    artifacts = _new_artifacts(table_name)
+    _report_progress(progress, 15, 'Loading data...')
+    data = _load_table(table_name, root_location, filetype)
+    _report_progress(progress, 20, 'Loading data preview...')
+    check_data_preview(data, artifacts)
+    _report_progress(progress, 30, 'Validating data types...')
+    data = check_data_types(table_name, data, artifacts)
+    _report_progress(progress, 40, 'Checking for missing values...')
+    check_missingness(data, artifacts)
+    _report_progress(progress, 60, 'Checking for required columns...')
+    check_required_columns(table_name, data, artifacts)
+
+    _report_progress(progress, 80, 'Checking for presence of all location categories...')
+    categories = data['location_category'].unique()
+    missing_cats = [cat for cat in REQUIRED_LOCATION_CATEGORIES if cat not in categories]
+    artifacts['missing_location_categories'] = missing_cats
+    if missing_cats:
+        artifacts['qc_summary'].append("Some location categories are missing.")
+        artifacts['qc_recommendations'].append("Some location categories are missing. Please ensure all location categories are present.")
+        logger.warning("Some location categories are missing.")
+    else:
+        artifacts['qc_summary'].append("All location categories are present.")
+
+    _report_progress(progress, 85, 'Displaying Name to Category Mapping...')
+    check_mappings(data, artifacts)
+
+    _report_progress(progress, 90, 'Checking for Overlapping Admissions...')
+    check_overlaps(data, root_location, filetype, artifacts)
+    return artifacts
+
+def read_hospitalization_patients(root_location, filetype, hospitalization_ids=None):
+    """
+    patient_id of each hospitalization, for ADT data without patient_id.
+
+    Parameters:
+        root_location (str): Directory containing the CLIF tables.
+        filetype (str): Type of the files.
+        hospitalization_ids (array, optional): Only read these hospitalizations.
+
+    Returns:
+        DataFrame: hospitalization_id and patient_id.
+    """
+    filters = None
+    if hospitalization_ids is not None:
+        filters = [('hospitalization_id', 'in', pd.unique(pd.Series(hospitalization_ids).dropna()).tolist())]
+    return read_data(table_filepath(root_location, 'Hospitalization', filetype), filetype,
+                     columns=['hospitalization_id', 'patient_id'], filters=filters)
+
+def check_overlaps(data, root_location, filetype, artifacts):
+    """
+    Record stays overlapping the same patient's next stay. ADT data without
+    patient_id is linked to patients by the Hospitalization table, loaded
+    here once for the hospitalizations in the data.
+    """
+    hospitalization_table = None
+    if 'patient_id' not in data.columns:
+        hospitalization_table = read_hospitalization_patients(root_location, filetype, data['hospitalization_id'])
+    overlaps = check_time_overlap(data, hospitalization_table)
+    artifacts['overlaps'] = overlaps
+    if not overlaps.empty:
+        artifacts['qc_summary'].append("There appears to be overlapping admissions to different locations.")
+        artifacts['qc_recommendations'].append("Please revise patient out_dttms to reflect appropraitely.")
+    else:
+        artifacts['qc_summary'].append("No overlapping admissions found.")
+
+def fix_adt_overlaps(root_location, filetype, output_path=None):
+    """
+    Fix overlapping stays across the full ADT table and write the corrected
+    table to a parquet file. The CLIF table directory is left untouched.
+
+    Parameters:
+        root_location (str): Directory containing the CLIF tables.
+        filetype (str): Type of the files.
+        output_path (str, optional): Parquet file to write. Defaults to
+            clif_adt_fixed-<hash of the root location>.parquet in OUTPUT_DIR.
+
+    Returns:
+        str: Path of the corrected table.
+    """
+    data = read_data(table_filepath(root_location, 'ADT', filetype), filetype, dtypes=expected_data_types['ADT'])
+    join_patient_id = 'patient_id' not in data.columns
+    if join_patient_id:
+        hospitalization_table = read_data(table_filepath(root_location, 'Hospitalization', filetype), filetype,
+                                          columns=['hospitalization_id', 'patient_id'])
+        data = data.merge(hospitalization_table, on='hospitalization_id', how='left')
+    data = fix_overlaps(data)
+    if join_patient_id:
+        data = data.drop(columns='patient_id')
+    if output_path is None:
+        location = hashlib.sha256(os.path.abspath(root_location).encode()).hexdigest()[:12]
+        output_path = os.path.join(OUTPUT_DIR, f'clif_adt_fixed-{location}.parquet')
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    data.to_parquet(output_path, index=False)
+    return output_path
+
+def run_hosp_qc(root_location, filetype, progress=None):
+    return _run_basic_qc('Hospitalization', root_location, filetype, progress,
+                         id_columns=('patient_id', 'hospitalization_id'))
+
+def run_labs_qc(root_location, filetype, progress=None):
+    table_name = 'Labs'
+    artifacts = _new_artifacts(table_name)
+    _report_progress(progress, 15, 'Loading data...')
+    data = _load_table(table_name, root_location, filetype, extra_columns=['lab_value_numeric'])
+    _report_progress(progress, 20, 'Loading data preview...')
+    check_data_preview(data, artifacts)
+    _report_progress(progress, 30, 'Validating data types...')
+    data = check_data_types(table_name, data, artifacts)
+    _report_progress(progress, 50, 'Checking for missing values...')
+    check_missingness(data, artifacts)
+    _report_progress(progress, 55, 'Displaying summary statistics...')
+    artifacts['summary'] = data.describe(include="all")
+    _report_progress(progress, 60, 'Checking for required columns...')
+    check_required_columns(table_name, data, artifacts)
+
+    _report_progress(progress, 65, 'Checking for lab_value_numeric...')
+    if 'lab_value_numeric' in data.columns:
+        check_lab_value_status(artifacts, present=True)
+    else:
+        parsed = parse_lab_values(data['lab_value'])
+        data['lab_value_numeric'] = parsed['lab_value_numeric']
+        check_lab_value_status(artifacts, present=False, non_numeric=parsed.attrs['non_numeric'],
+                               censored_count=int(parsed['lab_value_operator'].notna().sum()))
+        logger.info("Created 'lab_value_numeric' column.")
+
+    _report_progress(progress, 70, 'Checking for presence of all lab categories...')
+    labs_outlier_thresholds = read_data(OUTLIER_THRESHOLDS[table_name], 'csv')
+    check_category_presence(data, labs_outlier_thresholds, 'lab_category', 'lab', artifacts)
+
+    _report_progress(progress, 75, 'Summarizing lab categories...')
+    artifacts['summary_stats'] = generate_summary_stats(data, 'lab_category', 'lab_value_numeric')
+
+    data = check_outliers_long(data, labs_outlier_thresholds, 'lab_category', 'lab_value_numeric', artifacts)
+
+    _report_progress(progress, 80, 'Displaying lab category value distribution...')
+    artifacts['histogram'] = figure_to_png(generate_facetgrid_histograms(data, 'lab_category', 'lab_value_numeric',
+                                                                             labs_outlier_thresholds))
+
+    _report_progress(progress, 90, 'Displaying Name to Category Mapping...')
+    check_mappings(data, artifacts)
+    return artifacts
+
+def run_meds_qc(root_location, filetype, progress=None):
+    table_name = 'Medication_admin_continuous'
+    artifacts = _new_artifacts(table_name)
+    _report_progress(progress, 20, 'Loading data...')
+    data = _load_table(table_name, root_location, filetype)
+    _report_progress(progress, 25, 'Loading data preview...')
+    check_data_preview(data, artifacts)
+    _report_progress(progress, 30, 'Validating data types...')
+    data = check_data_types(table_name, data, artifacts)
+    _report_progress(progress, 40, 'Checking for missing values...')
+    check_missingness(data, artifacts)
+    _report_progress(progress, 60, 'Checking for required columns...')
+    check_required_columns(table_name, data, artifacts)
+    _report_progress(progress, 75, 'Summarizing medication doses by categories...')
+    artifacts['summary_stats'] = generate_summary_stats(data, 'med_category', 'med_dose')
+    _report_progress(progress, 90, 'Displaying Name to Category Mapping...')
+    check_mappings(data, artifacts)
+    return artifacts
+
+def run_microbio_qc(root_location, filetype, progress=None):
+    return _run_basic_qc('Microbiology_Culture', root_location, filetype, progress)
+
+def run_patient_qc(root_location, filetype, progress=None):
+    return _run_basic_qc('Patient', root_location, filetype, progress, id_columns=('patient_id',))
+
+def run_patient_assess_qc(root_location, filetype, progress=None):
+    return _run_basic_qc('Patient_Assessments', root_location, filetype, progress)
+
+def run_position_qc(root_location, filetype, progress=None):
+    return _run_basic_qc('Position', root_location, filetype, progress)
+
+def run_respiratory_support_qc(root_location, filetype, progress=None):
+    table_name = 'Respiratory_Support'
+    artifacts = _new_artifacts(table_name)
+    _report_progress(progress, 15, 'Loading data...')
+    data = _load_table(table_name, root_location, filetype)
+    _report_progress(progress, 20, 'Loading data preview...')
+    check_data_preview(data, artifacts)
+    _report_progress(progress, 30, 'Validating data types...')
+    data = check_data_types(table_name, data, artifacts)
+    _report_progress(progress, 40, 'Checking for missing values...')
+    check_missingness(data, artifacts)
+    _report_progress(progress, 50, 'Displaying summary statistics...')
+    artifacts['summary'] = data.describe()
+    _report_progress(progress, 60, 'Checking for required columns...')
+    check_required_columns(table_name, data, artifacts)
+
+    # The device category summaries are shown with outliers, so compute them before they are replaced
+    _report_progress(progress, 62, 'Binning values by device and mode category...')
+    resp_outlier_thresholds = read_data(OUTLIER_THRESHOLDS[table_name], 'csv')
+    artifacts['device_histograms'] = device_mode_histograms(data, bin_ranges=threshold_ranges(resp_outlier_thresholds, 'variable_name'))
+    _report_progress(progress, 63, 'Summarizing by device and mode category...')
+    artifacts['device_summaries'] = device_mode_summaries(data)
+    artifacts['initial_mode_choice'] = initial_mode_choice(data)
+
+    _report_progress(progress, 65, 'Checking for outliers...')
+    data, replaced_count, _, _ = replace_outliers_with_na_wide(data, resp_outlier_thresholds)
+    artifacts['replaced_count'] = replaced_count
+    if replaced_count > 0:
+        artifacts['qc_summary'].append("Outliers found in the data.")
+        artifacts['qc_recommendations'].append("Outliers found. Please replace values with NA.")
+
+    _report_progress(progress, 70, 'Displaying summaries by device category...')
+    artifacts['device_categories'] = sorted(data['device_category'].dropna().unique())
+    artifacts['mode_categories'] = sorted(data['mode_category'].dropna().unique())
+
+    _report_progress(progress, 90, 'Displaying Name to Category Mapping...')
+    check_mappings(data, artifacts)
+    return artifacts
+
+def run_vitals_qc(root_location, filetype, progress=None):
+    table_name = 'Vitals'
+    artifacts = _new_artifacts(table_name)
+    _report_progress(progress, 15, 'Loading data...')
+    data = _load_table(table_name, root_location, filetype)
+    _report_progress(progress, 20, 'Loading data preview...')
+    check_data_preview(data, artifacts)
+    _report_progress(progress, 30, 'Validating data types...')
+    data = check_data_types(table_name, data, artifacts)
+    _report_progress(progress, 40, 'Checking for missing values...')
+    check_missingness(data, artifacts)
+    _report_progress(progress, 50, 'Checking for required columns...')
+    check_required_columns(table_name, data, artifacts)
+
+    _report_progress(progress, 60, 'Checking for presence of all vital categories...')
+    vitals_outlier_thresholds = read_data(OUTLIER_THRESHOLDS[table_name], 'csv')
+    check_category_presence(data, vitals_outlier_thresholds, 'vital_category', 'vital', artifacts)
+
+    _report_progress(progress, 70, 'Generating vital category summary statistics...')
+    artifacts['summary_stats'] = generate_summary_stats(data, 'vital_category', 'vital_value')
+
+    # The distribution is shown with outliers, so plot before they are replaced
+    _report_progress(progress, 80, 'Displaying value distribution - vital categories...')
+    artifacts['histogram'] = figure_to_png(generate_facetgrid_histograms(data, 'vital_category', 'vital_value',
+                                                                             vitals_outlier_thresholds))
+
+    data = check_outliers_long(data, vitals_outlier_thresholds, 'vital_category', 'vital_value', artifacts)
+
+    _report_progress(progress, 90, 'Displaying Name to Category Mapping...')
+    check_mappings(data, artifacts)
+    return artifacts
+
+
+QC_RUNNERS = {
+    'ADT': run_adt_qc,
+    'Hospitalization': run_hosp_qc,
+    'Labs': run_labs_qc,
+    'Medication_admin_continuous': run_meds_qc,
+    'Microbiology_Culture': run_microbio_qc,
+    'Patient': run_patient_qc,
+    'Patient_Assessments': run_patient_assess_qc,
+    'Position': run_position_qc,
+    'Respiratory_Support': run_respiratory_support_qc,
+    'Vitals': run_vitals_qc
+}
@@ -0,0 +1,668 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import duckdb
+import logging
+import os
+import tempfile
+from common_qc import partition_files, _apply_expected_dtypes, threshold_ranges, plot_histograms, HISTOGRAM_BINS, OVERLAP_COLUMNS
+from common_qc import RESP_HISTOGRAM_VARIABLES, RESP_HISTOGRAM_BINS, DEVICE_MODE_COLUMNS, device_mode_mappings
+from fst_reader import fst_parquet_files
+from qc_checks import (OUTLIER_THRESHOLDS, REQUIRED_LOCATION_CATEGORIES, table_filepath, figure_to_png, _new_artifacts, _report_progress,
+                       check_data_types, check_required_columns, check_category_presence, check_key_duplicates, check_lab_value_status,
+                       check_overlaps, DUPLICATE_KEYS)
+from lab_values import lab_value_parse_table
+from qc_streaming import MEMORY_BUDGET_MB, CATEGORY_VALUE_COLUMNS, ID_COLUMNS
+from reqd_vars_dtypes import required_variables, expected_data_types
+
+logger = logging.getLogger(__name__)
+
+# QC engine that runs the checks as SQL over the table files with DuckDB, so
+# the table is scanned out of core by DuckDB's multi-threaded reader and never
+# loaded into pandas; only aggregates and the preview rows come back. The
+# artifacts have the same form as those of the pandas runners.
+
+# Physical dtype pandas would report for each DuckDB column type
+DUCKDB_PANDAS_DTYPES = {
+    'BOOLEAN': 'bool',
+    'TINYINT': 'int64', 'SMALLINT': 'int64', 'INTEGER': 'int64', 'BIGINT': 'int64', 'HUGEINT': 'int64',
+    'UTINYINT': 'int64', 'USMALLINT': 'int64', 'UINTEGER': 'int64', 'UBIGINT': 'int64',
+    'FLOAT': 'float64', 'DOUBLE': 'float64',
+    'TIMESTAMP': 'datetime64[ns]', 'TIMESTAMP_NS': 'datetime64[ns]', 'TIMESTAMP_MS': 'datetime64[ns]',
+    'TIMESTAMP_S': 'datetime64[ns]', 'TIMESTAMP WITH TIME ZONE': 'datetime64[ns]', 'DATE': 'datetime64[ns]'
+}
+# Strings pandas.read_csv reads as missing by default; CSV files are read with
+# the same ones so both engines count the same missing values
+CSV_NULL_STRINGS = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+                    'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+CSV_BOOL_STRINGS = ['True', 'TRUE', 'true', 'False', 'FALSE', 'false']
+
+
+def _quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _quote_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _source_sql(filepath, filetype):
+    """
+    SQL table expression scanning a table file, or a directory of partition
+    files with hive-style directory names as partition columns.
+    """
+    # CSV columns are read as text, typed the way pandas would by csv_column_types
+    csv_options = f"all_varchar = true, nullstr = [{', '.join(map(_quote_literal, CSV_NULL_STRINGS))}]"
+    if os.path.isdir(filepath):
+        files = partition_files(filepath, filetype)
+        if filetype == 'fst':
+            files = [part for fst_file in files for part in fst_parquet_files(fst_file)]
+        paths = f"[{', '.join(_quote_literal(path) for path in files)}]"
+        if filetype in ('parquet', 'fst'):
+            return f"read_parquet({paths}, hive_partitioning = true, union_by_name = true)"
+        if filetype == 'csv':
+            return f"read_csv({paths}, {csv_options}, hive_partitioning = true, union_by_name = true)"
+    if filetype == 'parquet':
+        return f"read_parquet({_quote_literal(filepath)})"
+    if filetype == 'csv':
+        return f"read_csv({_quote_literal(filepath)}, {csv_options})"
+    if filetype == 'fst':
+        # Scan the parquet copy of the fst file
+        parts = ', '.join(_quote_literal(part) for part in fst_parquet_files(filepath))
+        return f"read_parquet([{parts}])"
+    raise ValueError("The DuckDB engine supports 'csv', 'parquet' and 'fst' files.")
+
+def _physical_dtype(duckdb_type, filetype):
+    if duckdb_type.startswith('DECIMAL'):
+        return 'float64'
+    dtype = DUCKDB_PANDAS_DTYPES.get(duckdb_type, 'object')
+    # pandas reads CSV dates as text, so report them the way the pandas engine does
+    if filetype == 'csv' and dtype == 'datetime64[ns]':
+        return 'object'
+    return dtype
+
+def connection_config(memory_budget_mb=None):
+    """
+    DuckDB configuration limiting a connection to the memory budget,
+    spilling to a temporary directory beyond it, and to the process's read
+    threads.
+    """
+    memory_budget_mb = MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+    # pyarrow's pool size, which set_read_threads limits in QC workers
+    config = {'threads': pa.cpu_count()}
+    if memory_budget_mb:
+        config['memory_limit'] = f"{int(memory_budget_mb)}MB"
+        config['temp_directory'] = os.path.join(tempfile.gettempdir(), 'clif_qc_duckdb')
+    return config
+
+def connect(memory_budget_mb=None):
+    """
+    DuckDB connection configured by connection_config.
+    """
+    return duckdb.connect(config=connection_config(memory_budget_mb))
+
+def csv_column_types(con, source, columns, dtypes=None):
+    """
+    dtype pandas.read_csv would give each column of a CSV source read as
+    text: int64 when every value is an integer (float64 when some are
+    missing), float64 when every value is a number or none is present, bool
+    when every value is True or False, else object.
+
+    Parameters:
+        con: DuckDB connection.
+        source (str): SQL table expression from _source_sql.
+        columns (list): Columns to type.
+        dtypes (dict, optional): Expected dtypes; text columns expected to
+            be datetimes are converted to TIMESTAMP when every value parses.
+
+    Returns:
+        dict: (pandas dtype, SQL expression converting the column to it) of
+              each column.
+    """
+    if not columns:
+        return {}
+    dtypes = dtypes or {}
+    counts = []
+    for column in columns:
+        c = _quote_identifier(column)
+        counts += [f"count({c})",
+                   f"count(*) FILTER (WHERE regexp_full_match(trim({c}), '[+-]?[0-9]+'))",
+                   f"count(TRY_CAST({c} AS DOUBLE))",
+                   f"count(*) FILTER (WHERE {c} IN ({', '.join(map(_quote_literal, CSV_BOOL_STRINGS))}))",
+                   f"count(TRY_CAST({c} AS TIMESTAMP))"]
+    rows, *counts = con.execute(f"SELECT count(*), {', '.join(counts)} FROM {source}").fetchone()
+    types = {}
+    for i, column in enumerate(columns):
+        present, integers, numbers, booleans, timestamps = counts[5 * i:5 * i + 5]
+        c = _quote_identifier(column)
+        if present and integers == present:
+            types[column] = ('int64' if present == rows else 'float64', f"CAST(trim({c}) AS BIGINT)")
+        elif numbers == present:
+            types[column] = ('float64', f"TRY_CAST({c} AS DOUBLE)")
+        elif booleans == present == rows:
+            types[column] = ('bool', f"lower({c}) = 'true'")
+        elif dtypes.get(column) == 'datetime64' and timestamps == present:
+            # pandas parses these while reading, but they are physically text
+            types[column] = ('object', f"TRY_CAST({c} AS TIMESTAMP)")
+        else:
+            types[column] = ('object', c)
+    return types
+
+def source_select_sql(con, filepath, filetype, columns=None, dtypes=None):
+    """
+    SELECT statement over the columns of a table file (all columns by
+    default) present in it, typed as the pandas engine reads them.
+
+    Returns:
+        str: The SELECT statement.
+        dict: Physical dtype of each column it selects.
+    """
+    source = _source_sql(filepath, filetype)
+    schema = con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()
+    names = [name for name, *_ in schema if columns is None or name in columns]
+    if filetype == 'csv':
+        types = csv_column_types(con, source, names, dtypes)
+        physical_dtypes = {column: dtype for column, (dtype, _) in types.items()}
+        select_list = ', '.join(f"{sql} AS {_quote_identifier(column)}" for column, (_, sql) in types.items())
+    else:
+        physical_dtypes = {name: _physical_dtype(column_type, filetype) for name, column_type, *_ in schema if name in names}
+        select_list = ', '.join(_quote_identifier(column) for column in names)
+    return f"SELECT {select_list or '*'} FROM {source}", physical_dtypes
+
+def create_source_view(con, filepath, filetype, view_name, columns=None, dtypes=None):
+    """
+    Create a view over the columns of a table file (all columns by default)
+    present in it, typed as the pandas engine reads them.
+
+    Returns:
+        dict: Physical dtype of each column in the view.
+    """
+    select_sql, physical_dtypes = source_select_sql(con, filepath, filetype, columns, dtypes)
+    con.execute(f"CREATE OR REPLACE VIEW {view_name} AS {select_sql}")
+    return physical_dtypes
+
+def create_table_view(con, table_name, filepath, filetype, view_name='qc_table'):
+    """
+    Create a view over the table's required columns (and lab_value_numeric
+    for labs) present in the file.
+
+    Returns:
+        dict: Physical dtype of each column in the view.
+    """
+    wanted = set(required_variables[table_name]) | ({'lab_value_numeric'} if table_name == 'Labs' else set())
+    return create_source_view(con, filepath, filetype, view_name, wanted, expected_data_types[table_name])
+
+
+# Checks as SQL over the view
+def sql_missing_counts(con, columns, view_name='qc_table'):
+    """
+    Number of missing values in each column.
+    """
+    counts = ', '.join(f"count(*) - count({_quote_identifier(column)})" for column in columns)
+    values = con.execute(f"SELECT {counts} FROM {view_name}").fetchone()
+    return pd.Series(values, index=list(columns), dtype='int64')
+
+def sql_key_duplicates(con, keys, sample_rows=10, view_name='qc_table'):
+    """
+    Number of rows repeating the key values of an earlier row, and a sample
+    of the rows involved (NULLs compare equal).
+    """
+    key_list = ', '.join(_quote_identifier(key) for key in keys)
+    count = con.execute(f"SELECT (SELECT count(*) FROM {view_name}) - (SELECT count(*) FROM (SELECT DISTINCT {key_list} FROM {view_name}))").fetchone()[0]
+    if count == 0:
+        return 0, None
+    sample = con.execute(f"""
+        SELECT * FROM {view_name}
+        QUALIFY count(*) OVER (PARTITION BY {key_list}) > 1
+        ORDER BY {key_list}
+        LIMIT {int(sample_rows)}
+    """).df()
+    return count, sample
+
+def sql_nunique(con, column, view_name='qc_table'):
+    return con.execute(f"SELECT count(DISTINCT {_quote_identifier(column)}) FROM {view_name}").fetchone()[0]
+
+def sql_distinct(con, column, view_name='qc_table'):
+    rows = con.execute(f"SELECT DISTINCT {_quote_identifier(column)} FROM {view_name} "
+                       f"WHERE {_quote_identifier(column)} IS NOT NULL ORDER BY 1").fetchall()
+    return [row[0] for row in rows]
+
+def sql_summary_stats(con, category_column, value_sql, view_name='qc_table'):
+    """
+    Per-category summary statistics with the columns of generate_summary_stats.
+    Quartiles use linear interpolation, as pandas does.
+    """
+    category = _quote_identifier(category_column)
+    return con.execute(f"""
+        SELECT {category} AS "Category",
+               count(v) AS "N",
+               (count(*) - count(v)) * 100.0 / (SELECT count(*) FROM {view_name}) AS "Missing (%)",
+               min(v) AS "Min",
+               avg(v) AS "Mean",
+               quantile_cont(v, 0.25) AS "Q1",
+               quantile_cont(v, 0.5) AS "Median",
+               quantile_cont(v, 0.75) AS "Q3",
+               max(v) AS "Max"
+        FROM (SELECT {category}, {value_sql} AS v FROM {view_name})
+        WHERE {category} IS NOT NULL
+        GROUP BY {category}
+        ORDER BY {category}
+    """).df()
+
+# Statistics of numeric and datetime columns, in the order pandas' describe() gives them
+DESCRIBE_STATS = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+def _describe_column(column, column_type, expected_dtype):
+    """
+    SQL expression of a column describe() summarizes as numeric or datetime,
+    and whether it is a datetime, or None for other columns. Text columns
+    expected to be datetimes are summarized as the datetimes the pandas
+    engine converts them to.
+    """
+    c = _quote_identifier(column)
+    if column_type == 'VARCHAR' and expected_dtype == 'datetime64':
+        c, column_type = f"TRY_CAST({c} AS TIMESTAMP)", 'TIMESTAMP'
+    if column_type.split('(')[0] in DUCKDB_PANDAS_DTYPES and column_type != 'BOOLEAN' \
+            or column_type.startswith('DECIMAL'):
+        return c, column_type.startswith(('TIMESTAMP', 'DATE'))
+    return None
+
+def _describe_stats_sql(c, is_datetime):
+    mean = f"to_timestamp(avg(epoch({c})))::TIMESTAMP" if is_datetime else f"avg({c})"
+    std = "NULL" if is_datetime else f"stddev_samp({c})"
+    return f"count({c}), {mean}, {std}, min({c}), quantile_cont({c}, 0.25), quantile_cont({c}, 0.5), quantile_cont({c}, 0.75), max({c})"
+
+def _describe_values(row, is_datetime):
+    values = dict(zip(DESCRIBE_STATS, row))
+    if is_datetime:
+        del values['std']
+        values = {stat: pd.NaT if value is None else pd.Timestamp(value) for stat, value in values.items()}
+        values['count'] = row[0]
+    else:
+        values = {stat: np.nan if value is None else float(value) for stat, value in values.items()}
+    return values
+
+def _describe_frame(summary):
+    index = []
+    for values in summary.values():
+        index += [stat for stat in values if stat not in index]
+    return pd.DataFrame({column: pd.Series(values, dtype='object') for column, values in summary.items()}, index=index)
+
+def sql_describe(con, dtypes, include_all=False, view_name='qc_table'):
+    """
+    describe() of the numeric and datetime columns, or with include_all
+    describe(include='all'), which adds count, unique, top and freq of the
+    other columns. Statistics are ordered as pandas orders them. Text
+    columns expected to be datetimes are summarized as the datetimes the
+    pandas engine converts them to.
+    """
+    summary = {}
+    for column, column_type, *_ in con.execute(f"DESCRIBE {view_name}").fetchall():
+        described = _describe_column(column, column_type, dtypes.get(column))
+        if described is not None:
+            c, is_datetime = described
+            row = con.execute(f"SELECT {_describe_stats_sql(c, is_datetime)} FROM {view_name}").fetchone()
+            values = _describe_values(row, is_datetime)
+        elif include_all:
+            c = _quote_identifier(column)
+            count, unique = con.execute(f"SELECT count({c}), count(DISTINCT {c}) FROM {view_name}").fetchone()
+            top = con.execute(f"""
+                SELECT {c}, count(*) FROM {view_name} WHERE {c} IS NOT NULL
+                GROUP BY {c} ORDER BY count(*) DESC LIMIT 1
+            """).fetchone()
+            values = {'count': count, 'unique': unique, 'top': top[0] if top else np.nan, 'freq': top[1] if top else np.nan}
+        else:
+            continue
+        summary[column] = values
+    return _describe_frame(summary)
+
+def sql_device_mode_summaries(con, dtypes, view_name='qc_table'):
+    """
+    device_mode_summaries as SQL: the describe() of every device category
+    and every (device category, mode category) pair in one grouped query,
+    and their name to category mappings from the row counts of each
+    combination of DEVICE_MODE_COLUMNS.
+    """
+    name_counts = con.execute(f"""
+        SELECT {', '.join(f'CAST({column} AS VARCHAR) AS {column}' for column in DEVICE_MODE_COLUMNS)}, count(*) AS count
+        FROM {view_name}
+        GROUP BY ALL
+    """).df().set_index(DEVICE_MODE_COLUMNS)['count']
+    summaries = device_mode_mappings(name_counts)
+    described = []
+    for column, column_type, *_ in con.execute(f"DESCRIBE {view_name}").fetchall():
+        found = _describe_column(column, column_type, dtypes.get(column))
+        if found is not None:
+            described.append((column, *found))
+    stats = ''.join(f", {_describe_stats_sql(c, is_datetime)}" for _, c, is_datetime in described)
+    rows = con.execute(f"""
+        SELECT CAST(device_category AS VARCHAR), CAST(mode_category AS VARCHAR), GROUPING(mode_category){stats}
+        FROM {view_name}
+        WHERE device_category IS NOT NULL
+        GROUP BY GROUPING SETS ((device_category), (device_category, mode_category))
+    """).fetchall()
+    n_stats = len(DESCRIBE_STATS)
+    for device, mode, all_modes, *values in rows:
+        if not all_modes and mode is None:
+            continue
+        summary = {column: _describe_values(values[n_stats * i:n_stats * (i + 1)], is_datetime)
+                   for i, (column, _, is_datetime) in enumerate(described)}
+        summaries[(device, None if all_modes else mode)]['summary'] = _describe_frame(summary)
+    return summaries
+
+def sql_initial_mode_choice(con, view_name='qc_table'):
+    """
+    initial_mode_choice as SQL. Rows of an encounter recorded at the same
+    time may resolve in any order, where the pandas engine takes the
+    earlier row of the file.
+    """
+    return con.execute(f"""
+        SELECT mode_category, count(*) AS count
+        FROM (
+            SELECT first(CAST(mode_category AS VARCHAR) ORDER BY TRY_CAST(recorded_dttm AS TIMESTAMP)) AS mode_category
+            FROM {view_name}
+            WHERE mode_category IS NOT NULL
+              AND hospitalization_id IN (SELECT hospitalization_id FROM {view_name} WHERE device_category = 'IMV')
+            GROUP BY hospitalization_id
+        )
+        GROUP BY mode_category
+        ORDER BY mode_category
+    """).df()
+
+def sql_outlier_count_long(con, outlier_thresholds, category_column, value_sql, view_name='qc_table'):
+    """
+    Number of values outside their category's limits.
+    """
+    thresholds = outlier_thresholds.drop_duplicates(subset=category_column)[[category_column, 'lower_limit', 'upper_limit']]
+    con.register('qc_thresholds', thresholds)
+    category = _quote_identifier(category_column)
+    count = con.execute(f"""
+        SELECT count(*)
+        FROM (SELECT {category}, {value_sql} AS v FROM {view_name}) AS data
+        JOIN qc_thresholds AS t ON CAST(data.{category} AS VARCHAR) = t.{category}
+        WHERE v < t.lower_limit OR v > t.upper_limit
+    """).fetchone()[0]
+    con.unregister('qc_thresholds')
+    return count
+
+def sql_category_histograms(con, category_column, value_sql, bin_ranges, bins=HISTOGRAM_BINS, view_name='qc_table'):
+    """
+    Histogram bin counts of each category's values over its bin range, with
+    the counts below and above the range, in the form of category_histograms.
+    """
+    ranges = pd.DataFrame([(category, lower, upper) for category, (lower, upper) in bin_ranges.items()],
+                          columns=['category', 'lower', 'upper'])
+    # A single value gets a unit-wide range around it, as with np.histogram
+    degenerate = ranges['upper'] <= ranges['lower']
+    ranges.loc[degenerate, 'lower'] -= 0.5
+    ranges.loc[degenerate, 'upper'] += 0.5
+    con.register('qc_ranges', ranges)
+    category = _quote_identifier(category_column)
+    binned = con.execute(f"""
+        SELECT category, bin, count(*) AS count
+        FROM (
+            SELECT r.category,
+                   CASE WHEN v < r.lower THEN 0
+                        WHEN v > r.upper THEN {bins + 1}
+                        WHEN v = r.upper THEN {bins}
+                        ELSE CAST(floor((v - r.lower) / (r.upper - r.lower) * {bins}) AS BIGINT) + 1 END AS bin
+            FROM (SELECT {category}, {value_sql} AS v FROM {view_name}) AS data
+            JOIN qc_ranges AS r ON CAST(data.{category} AS VARCHAR) = r.category
+            WHERE v IS NOT NULL
+        )
+        GROUP BY category, bin
+    """).df()
+    con.unregister('qc_ranges')
+    histograms = {}
+    for category, lower, upper in ranges.itertuples(index=False):
+        counts = np.zeros(bins + 2, dtype='int64')
+        rows = binned[binned['category'] == category]
+        counts[rows['bin'].to_numpy(dtype='int64')] = rows['count'].to_numpy(dtype='int64')
+        histograms[category] = (lower + (upper - lower) * np.linspace(0, 1, bins + 1), counts)
+    return histograms
+
+def sql_device_mode_histograms(con, variables, bin_ranges, bins=RESP_HISTOGRAM_BINS, view_name='qc_table'):
+    """
+    Histogram bin counts of each variable for every device category and
+    every (device category, mode category) pair, in the form of
+    device_mode_histograms. Each variable is binned over its range in
+    bin_ranges, for all selections in one grouped query.
+    """
+    histograms = {}
+    for variable in variables:
+        lower, upper = bin_ranges[variable]
+        if upper <= lower:
+            lower, upper = lower - 0.5, upper + 0.5
+        v = f"TRY_CAST({_quote_identifier(variable)} AS DOUBLE)"
+        binned = con.execute(f"""
+            SELECT device_category, mode_category, GROUPING(mode_category) AS all_modes, bin, count(*) AS count
+            FROM (
+                SELECT CAST(device_category AS VARCHAR) AS device_category,
+                       CAST(mode_category AS VARCHAR) AS mode_category,
+                       CASE WHEN {v} < {lower} THEN 0
+                            WHEN {v} > {upper} THEN {bins + 1}
+                            WHEN {v} = {upper} THEN {bins}
+                            ELSE CAST(floor(({v} - {lower}) / ({upper - lower}) * {bins}) AS BIGINT) + 1 END AS bin
+                FROM {view_name}
+                WHERE device_category IS NOT NULL AND {v} IS NOT NULL
+            )
+            GROUP BY GROUPING SETS ((device_category, bin), (device_category, mode_category, bin))
+        """).df()
+        edges = lower + (upper - lower) * np.linspace(0, 1, bins + 1)
+        for device, mode, all_modes, bin_index, count in binned.itertuples(index=False):
+            if not all_modes and pd.isna(mode):
+                continue
+            selection = histograms.setdefault((device, None if all_modes else mode), {})
+            counts = selection.setdefault(variable, (edges, np.zeros(bins + 2, dtype='int64')))[1]
+            counts[bin_index] = count
+    return histograms
+
+def sql_lab_values(con, view_name='qc_table', values_view='qc_lab_table'):
+    """
+    Parse the distinct lab_value strings of the table with the lab value
+    parser and create a view of the table with their lab_value_numeric.
+
+    Returns:
+        tuple: Whether any lab_value is missing or not a plain number, and
+               the number of censored values.
+    """
+    counts = con.execute(f"""
+        SELECT CAST(lab_value AS VARCHAR) AS lab_value, count(*) AS count
+        FROM {view_name} GROUP BY 1
+    """).df()
+    missing = counts['lab_value'].isna()
+    strings = counts.loc[~missing, 'lab_value']
+    table = lab_value_parse_table(strings.to_numpy())
+    con.register('qc_lab_values', pd.DataFrame({'lab_value': strings.to_numpy(), 'lab_value_numeric': table['numeric'].to_numpy()}))
+    con.execute(f"""
+        CREATE OR REPLACE VIEW {values_view} AS
+        SELECT data.*, parsed.lab_value_numeric
+        FROM {view_name} AS data LEFT JOIN qc_lab_values AS parsed ON CAST(data.lab_value AS VARCHAR) = parsed.lab_value
+    """)
+    non_numeric = bool(missing.any() or not table['plain'].all())
+    censored_count = int(counts.loc[~missing, 'count'].to_numpy()[table['operator'].to_numpy() >= 0].sum())
+    return non_numeric, censored_count
+
+def sql_outlier_count_wide(con, outlier_thresholds, columns, view_name='qc_table'):
+    """
+    Number of values outside the limits of their column.
+    """
+    conditions = []
+    for col, lower_limit, upper_limit in outlier_thresholds[['variable_name', 'lower_limit', 'upper_limit']].itertuples(index=False):
+        if col in columns:
+            c = _quote_identifier(col)
+            conditions.append(f"count(*) FILTER (WHERE {c} < {float(lower_limit)} OR {c} > {float(upper_limit)})")
+    if not conditions:
+        return 0
+    return int(sum(con.execute(f"SELECT {', '.join(conditions)} FROM {view_name}").fetchone()))
+
+def sql_name_category_mapping(con, columns, view_name='qc_table'):
+    """
+    name_category_mapping as SQL: frequency of each name to category pair.
+    """
+    mappings = []
+    for var in [col for col in columns if col.endswith('_name')]:
+        var_category = var.replace('_name', '_category')
+        if var_category in columns:
+            name, category = _quote_identifier(var), _quote_identifier(var_category)
+            mappings.append(con.execute(f"""
+                SELECT {name}, {category}, count(*) AS counts
+                FROM {view_name}
+                WHERE {name} IS NOT NULL AND {category} IS NOT NULL
+                GROUP BY {name}, {category}
+                ORDER BY counts DESC, {name}, {category}
+            """).df())
+    return mappings
+
+
+def run_duckdb_qc(table_name, root_location, filetype, progress=None, memory_budget_mb=None):
+    """
+    Run the QC for a table as SQL over its file with DuckDB.
+
+    Parameters:
+        table_name (str): Name of the table, e.g. 'Labs'.
+        root_location (str): Directory containing the CLIF tables.
+        filetype (str): Type of the files ('csv' or 'parquet').
+        progress (callable, optional): Called with (percent, text) as checks run.
+        memory_budget_mb (int, optional): DuckDB memory limit in MB. Defaults to
+            MEMORY_BUDGET_MB; DuckDB spills to disk beyond it.
+
+    Returns:
+        dict: QC artifacts for the table.
+    """
+    filepath = table_filepath(root_location, table_name, filetype)
+    artifacts = _new_artifacts(table_name)
+    artifacts['mode'] = 'duckdb'
+    con = connect(memory_budget_mb)
+    try:
+        _report_progress(progress, 15, 'Scanning data...')
+        columns = create_table_view(con, table_name, filepath, filetype)
+
+        _report_progress(progress, 20, 'Loading data preview...')
+        artifacts['total_counts'] = con.execute("SELECT count(*) FROM qc_table").fetchone()[0]
+        for column in ID_COLUMNS.get(table_name, ('hospitalization_id',)):
+            key = 'ttl_unique_patients' if column == 'patient_id' else 'ttl_unique_encounters'
+            artifacts[key] = sql_nunique(con, column) if column in columns else 0
+        duplicate_count, duplicate_sample = sql_key_duplicates(con, list(columns))
+        artifacts['duplicate_count'] = duplicate_count
+        artifacts['duplicate_sample'] = duplicate_sample
+        if duplicate_count > 0:
+            artifacts['qc_summary'].append(f"{duplicate_count} duplicate(s) found in the data.")
+            artifacts['qc_recommendations'].append("Duplicate records found. Please review and remove duplicates.")
+        keys = [key for key in DUPLICATE_KEYS.get(table_name, []) if key in columns]
+        artifacts['duplicate_keys'] = keys
+        artifacts['key_duplicate_count'], artifacts['key_duplicate_sample'] = sql_key_duplicates(con, keys) if keys else (0, None)
+        check_key_duplicates(artifacts)
+        head = _apply_expected_dtypes(con.execute("SELECT * FROM qc_table LIMIT 5").df(), expected_data_types[table_name])
+        artifacts['head'] = head.copy()
+
+        _report_progress(progress, 30, 'Validating data types...')
+        head.attrs['physical_dtypes'] = columns
+        check_data_types(table_name, head, artifacts)
+
+        _report_progress(progress, 40, 'Checking for missing values...')
+        missing_counts = sql_missing_counts(con, columns)
+        artifacts['missing_info'] = None
+        if missing_counts.any():
+            missing_info = pd.DataFrame({
+                'Missing Count': missing_counts,
+                'Missing (%)': (missing_counts / artifacts['total_counts'] * 100).map('{:.2f}%'.format)
+            })
+            artifacts['missing_info'] = missing_info.sort_values(by='Missing Count', ascending=False)
+            artifacts['qc_summary'].append("Missing values found in columns - " + ', '.join(missing_info[missing_info['Missing Count'] > 0].index.tolist()))
+
+        if table_name in ('Labs', 'Respiratory_Support'):
+            _report_progress(progress, 50, 'Displaying summary statistics...')
+            artifacts['summary'] = sql_describe(con, expected_data_types[table_name], include_all=table_name == 'Labs')
+
+        _report_progress(progress, 60, 'Checking for required columns...')
+        check_required_columns(table_name, head, artifacts)
+
+        if table_name == 'ADT':
+            _report_progress(progress, 70, 'Checking for presence of all location categories...')
+            categories = sql_distinct(con, 'location_category')
+            missing_cats = [cat for cat in REQUIRED_LOCATION_CATEGORIES if cat not in categories]
+            artifacts['missing_location_categories'] = missing_cats
+            if missing_cats:
+                artifacts['qc_summary'].append("Some location categories are missing.")
+                artifacts['qc_recommendations'].append("Some location categories are missing. Please ensure all location categories are present.")
+            else:
+                artifacts['qc_summary'].append("All location categories are present.")
+
+        value_sql = None
+        value_view = 'qc_table'
+        if table_name in CATEGORY_VALUE_COLUMNS:
+            category_column, value_column = CATEGORY_VALUE_COLUMNS[table_name]
+            value_sql = f"TRY_CAST({_quote_identifier(value_column)} AS DOUBLE)"
+        if table_name == 'Labs':
+            _report_progress(progress, 65, 'Checking for lab_value_numeric...')
+            if 'lab_value_numeric' in columns:
+                check_lab_value_status(artifacts, present=True)
+            else:
+                non_numeric, censored_count = sql_lab_values(con)
+                check_lab_value_status(artifacts, present=False, non_numeric=non_numeric, censored_count=censored_count)
+                value_sql = 'lab_value_numeric'
+                value_view = 'qc_lab_table'
+
+        if table_name in CATEGORY_VALUE_COLUMNS:
+            _report_progress(progress, 70, 'Summarizing categories...')
+            if table_name in OUTLIER_THRESHOLDS:
+                outlier_thresholds = pd.read_csv(OUTLIER_THRESHOLDS[table_name])
+                present = pd.DataFrame({category_column: sql_distinct(con, category_column)})
+                label = 'lab' if table_name == 'Labs' else 'vital'
+                check_category_presence(present, outlier_thresholds, category_column, label, artifacts)
+            artifacts['summary_stats'] = sql_summary_stats(con, category_column, value_sql, view_name=value_view)
+            if table_name in OUTLIER_THRESHOLDS:
+                _report_progress(progress, 80, 'Checking for outliers...')
+                replaced_count = sql_outlier_count_long(con, outlier_thresholds, category_column, value_sql, view_name=value_view)
+                artifacts['replaced_count'] = replaced_count
+                if replaced_count > 0:
+                    artifacts['qc_summary'].append("Outliers found in data.")
+                    artifacts['qc_recommendations'].append("Outliers found. Please replace values with NA.")
+
+                _report_progress(progress, 82, 'Binning category values...')
+                # Thresholded categories are binned over their thresholds, the others over their range
+                summary_stats = artifacts['summary_stats'].dropna(subset=['Min'])
+                bin_ranges = {str(category): (low, high) for category, low, high
+                              in summary_stats[['Category', 'Min', 'Max']].itertuples(index=False)}
+                bin_ranges.update(threshold_ranges(outlier_thresholds, category_column))
+                bin_ranges = {category: bin_ranges[category] for category in map(str, summary_stats['Category'])}
+                histograms = sql_category_histograms(con, category_column, value_sql, bin_ranges, view_name=value_view)
+                if table_name == 'Labs':
+                    # Labs are plotted without their outliers, as in the full QC
+                    histograms = {category: (edges, np.concatenate(([0], counts[1:-1], [0])))
+                                  for category, (edges, counts) in histograms.items()}
+                artifacts['histogram'] = figure_to_png(plot_histograms(histograms, value_column))
+
+        if table_name == 'Respiratory_Support':
+            _report_progress(progress, 65, 'Checking for outliers...')
+            replaced_count = sql_outlier_count_wide(con, pd.read_csv(OUTLIER_THRESHOLDS[table_name]), columns)
+            artifacts['replaced_count'] = replaced_count
+            if replaced_count > 0:
+                artifacts['qc_summary'].append("Outliers found in the data.")
+                artifacts['qc_recommendations'].append("Outliers found. Please replace values with NA.")
+            artifacts['device_categories'] = sql_distinct(con, 'device_category')
+            artifacts['mode_categories'] = sql_distinct(con, 'mode_category')
+            if 'device_category' in columns and 'mode_category' in columns:
+                _report_progress(progress, 75, 'Binning values by device and mode category...')
+                ranges = threshold_ranges(pd.read_csv(OUTLIER_THRESHOLDS[table_name]), 'variable_name')
+                variables = [variable for variable in RESP_HISTOGRAM_VARIABLES if variable in ranges and variable in columns]
+                artifacts['device_histograms'] = sql_device_mode_histograms(con, variables, ranges)
+            if all(column in columns for column in DEVICE_MODE_COLUMNS):
+                _report_progress(progress, 78, 'Summarizing by device and mode category...')
+                artifacts['device_summaries'] = sql_device_mode_summaries(con, expected_data_types[table_name])
+            if all(column in columns for column in ('hospitalization_id', 'recorded_dttm', 'device_category', 'mode_category')):
+                artifacts['initial_mode_choice'] = sql_initial_mode_choice(con)
+
+        _report_progress(progress, 85, 'Displaying Name to Category Mapping...')
+        artifacts['mappings'] = sql_name_category_mapping(con, columns)
+
+        if table_name == 'ADT':
+            # The overlap sweep needs each patient's stays in order; only the
+            # ADT columns it uses are fetched
+            _report_progress(progress, 90, 'Checking for Overlapping Admissions...')
+            overlap_columns = [column for column in OVERLAP_COLUMNS if column in columns]
+            data = con.execute(f"SELECT {', '.join(map(_quote_identifier, overlap_columns))} FROM qc_table").df()
+            data = _apply_expected_dtypes(data, expected_data_types[table_name])
+            check_overlaps(data, root_location, filetype, artifacts)
+    finally:
+        con.close()
+    return artifacts
@@ -0,0 +1,396 @@
+import pandas as pd
+import numpy as np
+import logging
+import os
+from common_qc import (_concat_csv_frames, read_blocks, read_data, table_blocks, generate_summary_stats,
+                       replace_outliers_with_na_long, replace_outliers_with_na_wide)
+from qc_checks import (OUTLIER_THRESHOLDS, table_filepath, table_categorical_columns, _new_artifacts, _report_progress,
+                       check_data_types, check_required_columns, check_category_presence)
+from qc_streaming import CATEGORY_VALUE_COLUMNS, _outlier_thresholds, _table_columns
+from lab_values import parse_lab_values
+from reqd_vars_dtypes import expected_data_types
+
+logger = logging.getLogger(__name__)
+
+# Preview QC: approximate results from a stratified random sample of the
+# table, for a quick look before the full, exact run. The sample is read in
+# blocks, a random subset of the parquet row groups or of byte ranges of the
+# CSV files, so its I/O is a fraction of a full read; rows are then drawn
+# within those blocks by stratum. For the tables summarized per category
+# (labs, medications, vitals) every category found is a stratum. Missingness,
+# outlier rates and summary statistics are estimated with 95% confidence
+# intervals. Only the sampled blocks are read: on parquet and fst files the
+# row count comes from the metadata and is exact, on CSV files it is scaled
+# from the byte ranges read, and category sizes and presence come from the
+# rows of the sampled blocks. The intervals treat the rows of the sampled
+# blocks as a random sample, so they are too narrow when blocks differ a
+# lot, e.g. in a file sorted by category or time.
+
+# Target number of sampled rows per table
+PREVIEW_ROWS = int(os.environ.get('CLIF_QC_PREVIEW_ROWS', 100_000))
+# Rows read from the sampled blocks per sampled row, so that each stratum
+# has rows to draw from within them
+BLOCK_OVERSAMPLE = 4
+# Rows sampled from each stratum (category) at least, when it has them
+MIN_STRATUM_ROWS = 200
+# Normal quantile of the 95% confidence intervals
+Z_95 = 1.96
+PREVIEW_SEED = 0
+# Label of the category presence check, as in the full QC
+CATEGORY_LABELS = {'Labs': 'lab', 'Vitals': 'vital'}
+
+
+def _systematic_sample(population, size, rng):
+    """
+    Positions 0..population-1 spaced evenly from a random start.
+    """
+    if size >= population:
+        return np.arange(population)
+    step = population / size
+    return np.floor(rng.uniform(0, step) + step * np.arange(size)).astype('int64')
+
+def allocate_sample(stratum_sizes, sample_rows=PREVIEW_ROWS, min_rows=MIN_STRATUM_ROWS):
+    """
+    Rows to sample from each stratum: proportional to its size, at least
+    min_rows, and at most the whole stratum.
+    """
+    stratum_sizes = np.asarray(stratum_sizes)
+    proportional = np.rint(sample_rows * stratum_sizes / max(stratum_sizes.sum(), 1)).astype('int64')
+    return np.minimum(stratum_sizes, np.maximum(proportional, min_rows))
+
+def choose_blocks(block_sizes, target, rng):
+    """
+    Choose a random subset of blocks.
+
+    Parameters:
+        block_sizes (array): Size of each block.
+        target (int): Total size of the blocks to choose, at least.
+        rng (Generator): Random generator.
+
+    Returns:
+        array: Sorted indices of the chosen blocks.
+    """
+    order = rng.permutation(len(block_sizes))
+    count = int(np.searchsorted(np.cumsum(np.asarray(block_sizes)[order]), target)) + 1
+    return np.sort(order[:count])
+
+def sample_positions(strata, stratum_sizes, sample_rows=PREVIEW_ROWS, seed=PREVIEW_SEED):
+    """
+    Draw a stratified systematic sample of the rows read from the blocks.
+
+    Parameters:
+        strata (array): Stratum code (0..H-1) of every row read.
+        stratum_sizes (array): Number of rows in each stratum of the whole
+            table, which the sample is allocated by.
+        sample_rows (int): Target sample size.
+        seed (int): Seed of the random starts.
+
+    Returns:
+        array: Sorted positions of the sampled rows among the rows read.
+        array: Stratum code of each sampled row.
+    """
+    rng = np.random.default_rng(seed)
+    available = np.bincount(strata, minlength=len(stratum_sizes))
+    allocation = np.minimum(allocate_sample(stratum_sizes, sample_rows), available)
+    # Rows of each stratum in file order, one stratum after the other
+    by_stratum = np.argsort(strata, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(available)[:-1]))
+    positions = np.concatenate([by_stratum[start + _systematic_sample(size, n, rng)]
+                                for start, size, n in zip(starts, available, allocation)])
+    positions.sort()
+    return positions, strata[positions]
+
+def _stratum_codes(categories):
+    """
+    Stratum code of each row by its category; rows without a category form
+    a stratum of their own.
+    """
+    codes, _ = pd.factorize(categories, sort=True)
+    return np.where(codes < 0, codes.max() + 1, codes)
+
+
+# Estimators
+def _wilson_interval(proportion, sample_size):
+    """
+    95% Wilson score interval, which stays inside [0, 1] and is not empty
+    when no (or every) sampled row has the property.
+    """
+    z2 = Z_95 ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        center = (proportion + z2 / (2 * sample_size)) / (1 + z2 / sample_size)
+        half = Z_95 * np.sqrt(proportion * (1 - proportion) / sample_size + z2 / (4 * sample_size ** 2)) / (1 + z2 / sample_size)
+    return np.clip(center - half, 0, 1), np.clip(center + half, 0, 1)
+
+def stratified_mean(values, sample_strata, stratum_sizes):
+    """
+    Estimate the table-wide mean of each column from a stratified sample.
+
+    Parameters:
+        values (DataFrame): Numeric values of the sampled rows.
+        sample_strata (array): Stratum code of each sampled row.
+        stratum_sizes (array): Number of rows in each stratum.
+
+    Returns:
+        DataFrame: 'Estimate' and its 'Variance' for each column.
+    """
+    groups = values.groupby(np.asarray(sample_strata))
+    sizes = pd.Series(np.asarray(stratum_sizes, dtype='float64')).loc[groups.size().index]
+    counts = groups.size().astype('float64')
+    weights = sizes / sizes.sum()
+    # Finite population correction: fully sampled strata add no variance
+    variance_factor = weights ** 2 * (1 - counts / sizes) / counts
+    return pd.DataFrame({
+        'Estimate': groups.mean().mul(weights, axis=0).sum(),
+        'Variance': groups.var(ddof=1).fillna(0).mul(variance_factor, axis=0).sum()
+    })
+
+def estimate_proportions(flags, sample_strata, stratum_sizes):
+    """
+    Estimate the share of rows with each flag set, with 95% intervals.
+
+    Returns:
+        DataFrame: 'Estimate', 'Lower' and 'Upper' proportions for each column.
+    """
+    estimates = stratified_mean(flags.astype('float64'), sample_strata, stratum_sizes)
+    p = estimates['Estimate'].clip(0, 1)
+    # Effective sample size of the stratified design (Kish); the sample size
+    # when the sample shows no variation
+    with np.errstate(invalid='ignore', divide='ignore'):
+        effective = np.where(estimates['Variance'] > 0, p * (1 - p) / estimates['Variance'], len(flags))
+    lower, upper = _wilson_interval(p.to_numpy(), np.maximum(effective, 1))
+    if len(flags) >= np.sum(stratum_sizes):
+        # Every row was sampled, so the estimates are exact
+        lower, upper = p.to_numpy(), p.to_numpy()
+    return pd.DataFrame({'Estimate': p, 'Lower': lower, 'Upper': upper}, index=flags.columns)
+
+def _format_interval(lower, upper, scale=1, fmt='{:,.2f}'):
+    return f"{fmt.format(lower * scale)} – {fmt.format(upper * scale)}"
+
+
+# Checks on the sample
+def estimate_missingness(sample, sample_strata, stratum_sizes, artifacts):
+    """
+    Record estimated missing counts and percentages for each column.
+    """
+    estimates = estimate_proportions(sample.isnull(), sample_strata, stratum_sizes)
+    total_rows = artifacts['total_counts']
+    missing_info = pd.DataFrame({
+        'Missing Count (est.)': (estimates['Estimate'] * total_rows).round().astype('int64'),
+        'Missing (%) (est.)': (estimates['Estimate'] * 100).map('{:.2f}%'.format),
+        '95% CI (%)': [_format_interval(lower, upper, 100) for lower, upper in zip(estimates['Lower'], estimates['Upper'])]
+    })
+    missing_columns = estimates.index[estimates['Estimate'] > 0].tolist()
+    artifacts['missing_info'] = missing_info.sort_values(by='Missing Count (est.)', ascending=False)
+    if missing_columns:
+        artifacts['qc_summary'].append("Missing values estimated in columns - " + ', '.join(missing_columns))
+
+def estimate_summary_stats(sample, sample_strata, stratum_sizes, category_column, value_column, artifacts):
+    """
+    Summary statistics per category from the sample. Each category is a
+    stratum, so counts are scaled by the category's size and the mean's
+    interval comes from the category's own sample. Min, max and quartiles
+    are those of the sample.
+    """
+    summary_stats = generate_summary_stats(sample, category_column, value_column)
+    categories = sample[category_column].astype(object).to_numpy()
+    values = pd.to_numeric(sample[value_column], errors='coerce')
+    by_category = pd.DataFrame({'stratum': sample_strata, 'missing': values.isna().to_numpy()}).groupby(categories)
+    strata = by_category['stratum'].first().loc[summary_stats['Category']].to_numpy()
+    sizes = np.asarray(stratum_sizes)[strata]
+    sampled = np.bincount(sample_strata, minlength=len(stratum_sizes))[strata]
+    missing = by_category['missing'].sum().loc[summary_stats['Category']].to_numpy()
+    std = values.groupby(categories).std(ddof=1).reindex(summary_stats['Category']).to_numpy()
+
+    n = summary_stats['N'].to_numpy()
+    mean = summary_stats['Mean'].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        half = Z_95 * np.nan_to_num(std) * np.sqrt((1 - sampled / sizes).clip(0) / n)
+    artifacts['summary_stats'] = pd.DataFrame({
+        'Category': summary_stats['Category'],
+        'N (est.)': np.rint(sizes * n / sampled).astype('int64'),
+        'Missing (%) (est.)': sizes * missing / sampled / artifacts['total_counts'] * 100,
+        'Min': summary_stats['Min'],
+        'Mean': mean,
+        'Mean 95% CI': [_format_interval(m - h, m + h) if count > 0 else '' for m, h, count in zip(mean, half, n)],
+        'Q1': summary_stats['Q1'],
+        'Median': summary_stats['Median'],
+        'Q3': summary_stats['Q3'],
+        'Max': summary_stats['Max'],
+        'Sample N': n
+    })
+
+def estimate_outliers(sample, sample_strata, stratum_sizes, artifacts):
+    """
+    Estimate how many values lie outside the outlier thresholds, and the
+    outlier rate of each category (long tables) or column (wide tables).
+    """
+    table_name = artifacts['table']
+    thresholds = _outlier_thresholds(table_name)
+    if table_name in CATEGORY_VALUE_COLUMNS:
+        category_column, value_column = CATEGORY_VALUE_COLUMNS[table_name]
+        replaced, _, _, _ = replace_outliers_with_na_long(sample.copy(), thresholds, category_column, value_column)
+        value_columns = [value_column]
+    else:
+        category_column = None
+        thresholds = thresholds[thresholds['variable_name'].isin(sample.columns)]
+        replaced, _, _, _ = replace_outliers_with_na_wide(sample.copy(), thresholds)
+        value_columns = thresholds['variable_name'].tolist()
+    flags = pd.DataFrame({col: sample[col].notna().to_numpy() & replaced[col].isna().to_numpy() for col in value_columns})
+
+    # Outlier values per row, so the total counts values as the full QC does
+    outliers = flags.sum(axis=1).to_frame('outliers')
+    per_row = stratified_mean(outliers, sample_strata, stratum_sizes)
+    total_rows = artifacts['total_counts']
+    estimate = per_row['Estimate'].iloc[0] * total_rows
+    if per_row['Variance'].iloc[0] > 0 or len(sample) >= total_rows:
+        half = Z_95 * np.sqrt(per_row['Variance'].iloc[0]) * total_rows
+        lower, upper = max(estimate - half, 0), estimate + half
+    else:
+        # E.g. no outliers sampled: bound the count by the share of rows with any
+        share = estimate_proportions(outliers > 0, sample_strata, stratum_sizes)
+        lower, upper = share['Lower'].iloc[0] * total_rows, max(share['Upper'].iloc[0] * total_rows, estimate)
+    artifacts['replaced_count'] = int(round(estimate))
+    artifacts['replaced_count_ci'] = (int(np.floor(lower)), int(np.ceil(upper)))
+
+    if category_column is not None:
+        groups = flags[value_columns[0]].groupby(sample[category_column].astype(object).to_numpy())
+        rates = pd.DataFrame({'Sample N': groups.size(), 'Outliers in sample': groups.sum()})
+    else:
+        rates = pd.DataFrame({'Sample N': sample[value_columns].notna().sum(), 'Outliers in sample': flags.sum()})
+    sampled = rates['Sample N'].clip(lower=1)
+    lower_rate, upper_rate = _wilson_interval(rates['Outliers in sample'] / sampled, sampled)
+    rates['Outlier rate (%) (est.)'] = (rates['Outliers in sample'] / sampled * 100).map('{:.2f}%'.format)
+    rates['95% CI (%)'] = [_format_interval(low, high, 100) for low, high in zip(lower_rate, upper_rate)]
+    artifacts['outlier_rates'] = rates.rename_axis(category_column or 'Column').reset_index()
+
+    if estimate > 0:
+        artifacts['qc_summary'].append(f"Outliers found in the sample: an estimated {artifacts['replaced_count']:,} values "
+                                       f"(95% CI {lower:,.0f} – {upper:,.0f}).")
+        artifacts['qc_recommendations'].append("Outliers found. Please replace values with NA.")
+
+
+def _numeric_lab_values(sample):
+    """
+    lab_value_numeric as the full QC derives it when the column is absent.
+    """
+    return parse_lab_values(sample['lab_value'])['lab_value_numeric']
+
+def _read_csv_sample(table_name, filepath, target_rows, rng):
+    """
+    Read random byte ranges of a CSV table until they hold target_rows rows.
+
+    Returns:
+        DataFrame: The rows read, in file order.
+        int: Estimated number of rows in the table, exact when every range
+            was read.
+        bool: Whether every range was read.
+    """
+    blocks, block_bytes = table_blocks(filepath, 'csv')
+    if not blocks:
+        rows = read_data(filepath, 'csv', columns=_table_columns(table_name), dtypes=expected_data_types[table_name],
+                         categorical=table_categorical_columns(table_name))
+        return rows, len(rows), True
+    frames, bytes_read = {}, 0
+    for block in rng.permutation(len(blocks)):
+        frames[block] = read_blocks(filepath, 'csv', [blocks[block]], _table_columns(table_name),
+                                    expected_data_types[table_name], table_categorical_columns(table_name))
+        bytes_read += block_bytes[block]
+        if sum(len(frame) for frame in frames.values()) >= target_rows:
+            break
+    frames = [frames[block] for block in sorted(frames)]
+    rows = _concat_csv_frames(frames, expected_data_types[table_name], table_categorical_columns(table_name))
+    complete = len(frames) == len(blocks)
+    total_rows = len(rows) if complete else int(round(len(rows) * block_bytes.sum() / max(bytes_read, 1)))
+    return rows, total_rows, complete
+
+def read_sample(table_name, filepath, filetype, sample_rows=PREVIEW_ROWS, seed=PREVIEW_SEED):
+    """
+    Read a stratified random sample of a table's QC columns from a random
+    subset of its blocks. Nothing outside the sampled blocks is read: the
+    strata and their sizes come from the rows of those blocks, scaled to the
+    table's row count.
+
+    Returns:
+        DataFrame: The sampled rows, in file order.
+        array: Stratum code of each sampled row.
+        array: Estimated number of rows in each stratum.
+        int: Number of rows in the table.
+        bool: Whether the row count is exact rather than estimated.
+        bool: Whether every block was read, so that the strata are exact.
+    """
+    rng = np.random.default_rng(seed)
+    category_column = CATEGORY_VALUE_COLUMNS.get(table_name, (None,))[0]
+    target_rows = sample_rows * BLOCK_OVERSAMPLE
+    if filetype == 'csv':
+        rows, total_rows, complete = _read_csv_sample(table_name, filepath, target_rows, rng)
+        rows_exact = complete
+    else:
+        blocks, block_rows = table_blocks(filepath, filetype)
+        chosen = choose_blocks(block_rows, target_rows, rng)
+        rows = read_blocks(filepath, filetype, [blocks[block] for block in chosen], _table_columns(table_name),
+                           expected_data_types[table_name], table_categorical_columns(table_name))
+        # Row counts are in the file metadata
+        total_rows = int(block_rows.sum())
+        rows_exact = True
+        complete = len(chosen) == len(blocks)
+    if category_column in rows.columns:
+        strata = _stratum_codes(rows[category_column])
+    else:
+        strata = np.zeros(len(rows), dtype='int64')
+    stratum_sizes = np.rint(np.bincount(strata, minlength=1) * total_rows / max(len(rows), 1)).astype('int64')
+    positions, sample_strata = sample_positions(strata, stratum_sizes, sample_rows, seed)
+    return rows.iloc[positions].reset_index(drop=True), sample_strata, stratum_sizes, total_rows, rows_exact, complete
+
+def run_preview_qc(table_name, root_location, filetype, progress=None, sample_rows=None):
+    """
+    Run an approximate QC for a table on a stratified random sample.
+
+    Parameters:
+        table_name (str): Name of the table, e.g. 'Vitals'.
+        root_location (str): Directory containing the CLIF tables.
+        filetype (str): Type of the files ('csv', 'parquet' or 'fst').
+        progress (callable, optional): Called with (percent, text) as checks run.
+        sample_rows (int, optional): Target sample size. Defaults to PREVIEW_ROWS.
+
+    Returns:
+        dict: QC artifacts with estimates, in 'preview' mode.
+    """
+    sample_rows = sample_rows or PREVIEW_ROWS
+    artifacts = _new_artifacts(table_name)
+    artifacts['mode'] = 'preview'
+    _report_progress(progress, 15, 'Sampling data...')
+    filepath = table_filepath(root_location, table_name, filetype)
+    sample, sample_strata, stratum_sizes, total_rows, rows_exact, complete = read_sample(table_name, filepath, filetype,
+                                                                                        sample_rows)
+    artifacts['total_counts'] = total_rows
+    artifacts['counts_estimated'] = not rows_exact
+    artifacts['categories_sampled'] = not complete
+    artifacts['sample_rows'] = len(sample)
+    artifacts['strata_count'] = len(stratum_sizes)
+    artifacts['head'] = sample.head()
+    logger.info(f"{table_name}: sampled {len(sample):,} of {artifacts['total_counts']:,} rows "
+                f"from {len(stratum_sizes)} strata.")
+
+    _report_progress(progress, 30, 'Validating data types...')
+    sample = check_data_types(table_name, sample, artifacts)
+    _report_progress(progress, 40, 'Estimating missing values...')
+    estimate_missingness(sample, sample_strata, stratum_sizes, artifacts)
+    _report_progress(progress, 50, 'Checking for required columns...')
+    check_required_columns(table_name, sample, artifacts)
+
+    if table_name == 'Labs' and 'lab_value' in sample.columns and 'lab_value_numeric' not in sample.columns:
+        sample['lab_value_numeric'] = _numeric_lab_values(sample)
+    if table_name in CATEGORY_VALUE_COLUMNS:
+        category_column, value_column = CATEGORY_VALUE_COLUMNS[table_name]
+        if category_column in sample.columns and value_column in sample.columns:
+            if table_name in OUTLIER_THRESHOLDS:
+                # Categories found in the sampled blocks
+                _report_progress(progress, 60, 'Checking for presence of all categories...')
+                check_category_presence(sample, _outlier_thresholds(table_name), category_column,
+                                        CATEGORY_LABELS[table_name], artifacts)
+            _report_progress(progress, 70, 'Estimating summary statistics...')
+            estimate_summary_stats(sample, sample_strata, stratum_sizes, category_column, value_column, artifacts)
+    if table_name in OUTLIER_THRESHOLDS:
+        _report_progress(progress, 80, 'Estimating outlier rates...')
+        estimate_outliers(sample, sample_strata, stratum_sizes, artifacts)
+    return artifacts
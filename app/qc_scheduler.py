@@ -0,0 +1,113 @@
+import logging
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from common_qc import set_read_threads
+from qc_cache import cached_table_qc, load_artifacts, table_cache_key, table_qc_mode
+from qc_checks import QC_RUNNERS, table_filepath
+from qc_streaming import MEMORY_BUDGET_MB
+
+logger = logging.getLogger(__name__)
+
+# Runs the QC of several tables concurrently in a process pool. The tables are
+# independent files, so a full-site run takes roughly as long as the slowest
+# table instead of the sum of all of them. Progress and results are yielded as
+# events so the caller (the QC page or the headless runner) can update its
+# display from its own thread as each table finishes. The CPUs and the memory
+# budget are shared by the workers: each reads with its share of the threads
+# and checks its table within its share of the budget.
+
+MAX_WORKERS = int(os.environ.get('CLIF_QC_MAX_WORKERS', os.cpu_count() or 1))
+# Seconds between checks for finished tables while draining progress messages
+POLL_INTERVAL = 0.2
+
+
+def _run_table_qc(table_name, root_location, filetype, refresh, memory_budget_mb, engine, preview, progress_queue):
+    """
+    Worker: run the (cached) QC for one table, reporting progress on the queue.
+    """
+    progress = lambda percent, text: progress_queue.put((table_name, percent, text))
+    return cached_table_qc(table_name, root_location, filetype, progress=progress, refresh=refresh,
+                           memory_budget_mb=memory_budget_mb, engine=engine, preview=preview)
+
+def _drain(progress_queue):
+    events = []
+    while True:
+        try:
+            table_name, percent, text = progress_queue.get_nowait()
+        except queue.Empty:
+            return events
+        events.append(('progress', table_name, (percent, text)))
+
+def run_tables_parallel(root_location, filetype, tables=None, max_workers=None, refresh=False, memory_budget_mb=None, engine=None,
+                        preview=False):
+    """
+    Run the QC for several tables concurrently.
+
+    Tables whose files are missing are skipped, and tables with cached results
+    are served from the cache without starting a worker.
+
+    Parameters:
+        root_location (str): Directory containing the CLIF tables.
+        filetype (str): Type of the files ('csv', 'parquet' or 'fst').
+        tables (list, optional): Tables to check. Defaults to all tables.
+        max_workers (int, optional): Number of worker processes. Defaults to
+            MAX_WORKERS (the number of CPUs, or CLIF_QC_MAX_WORKERS).
+        refresh (bool): Recompute and overwrite any cached results.
+        memory_budget_mb (int, optional): Memory budget of the run in MB,
+            split evenly between the tables checked at the same time;
+            tables larger than their share are checked in streaming mode.
+        engine (str, optional): QC engine, 'pandas' or 'duckdb'.
+        preview (bool): Estimate the results from a sample of each table.
+
+    Yields:
+        tuple: (event, table_name, payload) where event is 'progress' with a
+               (percent, text) payload, 'done' with the QC artifacts, or
+               'error' with the exception raised by the QC.
+    """
+    tables = [table_name for table_name in tables or QC_RUNNERS
+              if os.path.exists(table_filepath(root_location, table_name, filetype))]
+    # The budget is shared by as many tables as may run at once, whichever
+    # are cached, so that each table's mode (and cache key) stays the same
+    max_workers = min(max_workers or MAX_WORKERS, max(len(tables), 1))
+    memory_budget_mb = MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+    if memory_budget_mb:
+        memory_budget_mb = max(memory_budget_mb // max_workers, 1)
+    pending = []
+    for table_name in tables:
+        if refresh:
+            artifacts = None
+        else:
+            mode = table_qc_mode(table_name, root_location, filetype, memory_budget_mb, engine, preview)
+            artifacts = load_artifacts(table_cache_key(table_name, root_location, filetype, mode))
+        if artifacts is not None:
+            logger.info(f"Loaded cached QC results for {table_name}.")
+            yield ('done', table_name, artifacts)
+        else:
+            pending.append(table_name)
+    if not pending:
+        return
+
+    max_workers = min(max_workers, len(pending))
+    threads = max((os.cpu_count() or 1) // max_workers, 1)
+    logger.info(f"Running QC for {len(pending)} table(s) with {max_workers} worker(s), "
+                f"{threads} read thread(s) and {memory_budget_mb or 'no'} MB memory budget each.")
+    # Spawn rather than fork: the Streamlit server process runs several threads
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager, ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                                           initializer=set_read_threads, initargs=(threads,)) as executor:
+        progress_queue = manager.Queue()
+        futures = {executor.submit(_run_table_qc, table_name, root_location, filetype, refresh, memory_budget_mb, engine,
+                                   preview, progress_queue): table_name
+                   for table_name in pending}
+        while futures:
+            done, _ = wait(futures, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            yield from _drain(progress_queue)
+            for future in done:
+                table_name = futures.pop(future)
+                try:
+                    yield ('done', table_name, future.result())
+                except Exception as e:
+                    logger.error(f"QC for {table_name} failed: {e}")
+                    yield ('error', table_name, e)
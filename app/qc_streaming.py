@@ -0,0 +1,732 @@
+import pandas as pd
+import numpy as np
+import logging
+import os
+from functools import lru_cache
+from common_qc import _dataset, read_data, read_data_batches, hash_rows, replace_outliers_with_na_long, replace_outliers_with_na_wide
+from common_qc import category_histograms, merge_histograms, plot_histograms, threshold_ranges
+from common_qc import device_mode_histograms, merge_device_mode_histograms, RESP_HISTOGRAM_VARIABLES
+from common_qc import device_mode_name_counts, device_mode_mappings, first_modes, initial_mode_counts, DEVICE_MODE_COLUMNS
+from qc_checks import (OUTLIER_THRESHOLDS, REQUIRED_LOCATION_CATEGORIES, table_filepath, table_categorical_columns, _new_artifacts, _report_progress,
+                       figure_to_png,
+                       check_data_types, check_required_columns, check_category_presence, check_key_duplicates, check_lab_value_status,
+                       check_overlaps, DUPLICATE_KEYS)
+from reqd_vars_dtypes import required_variables, expected_data_types
+from lab_values import parse_lab_values, save_parse_table
+
+logger = logging.getLogger(__name__)
+
+# Streaming QC for tables larger than memory. The table is read in batches
+# sized to a memory budget and each batch is reduced to a partial result
+# (row and null counts, per-category min/max/sum/count, quantile sketches and
+# histogram bin counts, name to category frequencies, and distinct samples of
+# the hashes of IDs, rows and record keys, and for respiratory support the
+# same per device and mode category, with the first mode of each encounter).
+# Partials are mergeable, so batches and separately checked files (the
+# partitions of an incrementally checked table) can be combined in any order,
+# and only the partial is kept between batches.
+
+# Memory budget per table in MB; 0 disables streaming
+MEMORY_BUDGET_MB = int(os.environ.get('CLIF_QC_MEMORY_BUDGET_MB', 0))
+# A batch is copied a few times while it is converted and checked, so only
+# part of the budget goes to the batch itself
+BATCH_MEMORY_FRACTION = 0.25
+SAMPLE_ROWS = 10_000
+# Hashes kept by each distinct sample; distinct and duplicate counts are
+# exact up to this many distinct values and estimated beyond it
+HASH_SAMPLE_SIZE = int(os.environ.get('CLIF_QC_HASH_SAMPLE_SIZE', 1 << 20))
+# Bytes per sampled hash (the hash and its row count), and the largest part of
+# the memory budget the distinct samples of a table may take
+HASH_SAMPLE_ENTRY_BYTES = 16
+HASH_MEMORY_FRACTION = 0.25
+# Centroids kept per category by the quantile sketches; categories with at
+# most this many values have exact quartiles
+SKETCH_SIZE = 2048
+
+# (category column, value column) summarized per category, as in the full QC
+CATEGORY_VALUE_COLUMNS = {
+    'Labs': ('lab_category', 'lab_value_numeric'),
+    'Medication_admin_continuous': ('med_category', 'med_dose'),
+    'Vitals': ('vital_category', 'vital_value')
+}
+ID_COLUMNS = {
+    'Hospitalization': ('patient_id', 'hospitalization_id'),
+    'Patient': ('patient_id',)
+}
+EMPTY_HASHES = np.array([], dtype='uint64')
+EMPTY_COUNTS = np.array([], dtype='int64')
+
+
+@lru_cache(maxsize=None)
+def _outlier_thresholds(table_name):
+    return read_data(OUTLIER_THRESHOLDS[table_name], 'csv')
+
+@lru_cache(maxsize=None)
+def _histogram_ranges(table_name):
+    # Long tables have thresholds per category, wide ones per variable
+    column = CATEGORY_VALUE_COLUMNS[table_name][0] if table_name in CATEGORY_VALUE_COLUMNS else 'variable_name'
+    return threshold_ranges(_outlier_thresholds(table_name), column)
+
+def _table_columns(table_name):
+    columns = list(required_variables[table_name])
+    if table_name == 'Labs':
+        columns.append('lab_value_numeric')
+    return columns
+
+def estimate_table_bytes(table_name, filepath, filetype):
+    """
+    Estimate the in-memory size of the table's QC columns from a sample.
+    The estimate is kept for each version of the file (see use_streaming).
+
+    Returns:
+        int: Estimated bytes for the whole table.
+        float: Estimated bytes per row.
+    """
+    sample = next(read_data_batches(filepath, filetype, columns=_table_columns(table_name),
+                                    dtypes=expected_data_types[table_name],
+                                    categorical=table_categorical_columns(table_name), batch_rows=SAMPLE_ROWS), None)
+    if sample is None or sample.empty:
+        return 0, 0.0
+    row_bytes = sample.memory_usage(deep=True).sum() / len(sample)
+    if filetype in ('parquet', 'fst'):
+        rows = _dataset(filepath, filetype).count_rows()
+    elif len(sample) < SAMPLE_ROWS:
+        rows = len(sample)
+    else:
+        # Extrapolate the row count of a text file from the size of its first lines
+        with open(filepath, 'rb') as f:
+            head_bytes = sum(len(f.readline()) for _ in range(SAMPLE_ROWS + 1))
+        rows = int(os.path.getsize(filepath) / head_bytes * SAMPLE_ROWS)
+    return int(rows * row_bytes), row_bytes
+
+def use_streaming(table_name, root_location, filetype, memory_budget_mb=None):
+    """
+    Whether the table's QC should stream: a memory budget is set and the
+    table's QC columns are estimated not to fit in it.
+    """
+    memory_budget_mb = MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+    if not memory_budget_mb:
+        return False
+    filepath = table_filepath(root_location, table_name, filetype)
+    stat = os.stat(filepath)
+    table_bytes, _ = _file_table_bytes(table_name, filepath, filetype, stat.st_size, stat.st_mtime_ns)
+    return table_bytes > memory_budget_mb * 1024 * 1024
+
+@lru_cache(maxsize=256)
+def _file_table_bytes(table_name, filepath, filetype, size, mtime_ns):
+    # Keyed by the file's size and modification time, so each Streamlit rerun
+    # and cache lookup reads the sample only once per version of the file
+    return estimate_table_bytes(table_name, filepath, filetype)
+
+def _hash_sample_kinds(table_name):
+    return 2 + len(ID_COLUMNS.get(table_name, ('hospitalization_id',)))
+
+def hash_sample_size(table_name, memory_budget_mb=None):
+    """
+    Capacity of the table's distinct samples: HASH_SAMPLE_SIZE, less when
+    the samples (rows, record keys and IDs) would take more than
+    HASH_MEMORY_FRACTION of the memory budget.
+    """
+    memory_budget_mb = MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+    if not memory_budget_mb:
+        return HASH_SAMPLE_SIZE
+    budget_entries = memory_budget_mb * 1024 * 1024 * HASH_MEMORY_FRACTION / (HASH_SAMPLE_ENTRY_BYTES * _hash_sample_kinds(table_name))
+    return int(max(min(HASH_SAMPLE_SIZE, budget_entries), 1024))
+
+
+# Distinct samples: the sorted distinct 64-bit hashes of a column's values
+# (or of whole rows), with the number of rows of each, keeping only hashes
+# below 2**(64 - level). While the level is 0 every hash is kept and the
+# distinct and duplicate counts are exact. Once a sample holds more than its
+# capacity the level is raised, halving the range of hashes kept, and the
+# counts of the sampled range are scaled up by 2**level. A value is either
+# sampled with all its rows or not at all, so a table without duplicates
+# reports none at any size. Samples merge by adding the counts of their
+# common range, and stay within their capacity, so streaming keeps the
+# memory and per-batch cost bounded however large the table.
+def _sample_bound(level):
+    return np.uint64(1) << np.uint64(64 - level)
+
+def _sample_range(hashes, counts, level):
+    if level == 0:
+        return hashes, counts
+    end = np.searchsorted(hashes, _sample_bound(level))
+    return hashes[:end], counts[:end]
+
+def _fit_sample(hashes, counts, level, capacity):
+    while len(hashes) > capacity:
+        level += 1
+        hashes, counts = _sample_range(hashes, counts, level)
+    return {'hashes': hashes, 'counts': counts, 'level': level, 'capacity': capacity}
+
+def new_distinct_sample(capacity=HASH_SAMPLE_SIZE):
+    return {'hashes': EMPTY_HASHES, 'counts': EMPTY_COUNTS, 'level': 0, 'capacity': capacity}
+
+def distinct_sample(values, level=0, capacity=HASH_SAMPLE_SIZE):
+    """
+    Distinct sample of a Series or DataFrame's rows at the given level or
+    above.
+    """
+    if isinstance(values, pd.Series):
+        values = values.to_frame()
+    hashes = hash_rows(values)
+    if level:
+        hashes = hashes[hashes < _sample_bound(level)]
+    hashes, counts = np.unique(hashes, return_counts=True)
+    return _fit_sample(hashes, counts.astype('int64'), level, capacity)
+
+def merge_distinct_samples(left, right):
+    """
+    Merge two distinct samples, at the higher of their levels and within the
+    smaller of their capacities.
+    """
+    level = max(left['level'], right['level'])
+    hashes, counts = zip(*(_sample_range(sample['hashes'], sample['counts'], level) for sample in (left, right)))
+    hashes, counts = np.concatenate(hashes), np.concatenate(counts)
+    # Both inputs are sorted, so the stable sort is a linear merge
+    order = np.argsort(hashes, kind='stable')
+    hashes, counts = hashes[order], counts[order]
+    if len(hashes):
+        starts = np.flatnonzero(np.concatenate(([True], hashes[1:] != hashes[:-1])))
+        hashes, counts = hashes[starts], np.add.reduceat(counts, starts)
+    return _fit_sample(hashes, counts, level, min(left['capacity'], right['capacity']))
+
+def sample_distinct_count(sample):
+    """
+    Number of distinct values, exact while the sample is at level 0.
+    """
+    return len(sample['hashes']) << sample['level']
+
+def sample_duplicate_count(sample):
+    """
+    Number of rows repeating an earlier row's value, exact while the sample
+    is at level 0.
+    """
+    return int(sample['counts'].sum() - len(sample['hashes'])) << sample['level']
+
+
+# Mergeable partial results
+
+def _merge_dtype(left, right):
+    if left is None or left == right:
+        return right
+    if pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(left)) and \
+            pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(right)):
+        return 'float64'
+    return 'object'
+
+def new_partial(table_name, hash_capacity=HASH_SAMPLE_SIZE):
+    """
+    Empty partial QC result for a table, with distinct samples of the given
+    capacity.
+    """
+    return {
+        'table': table_name,
+        'rows': 0,
+        'head': None,
+        'physical_dtypes': {},
+        'columns': [],
+        'null_counts': pd.Series(dtype='int64'),
+        'row_hashes': new_distinct_sample(hash_capacity),
+        'key_hashes': new_distinct_sample(hash_capacity),
+        'id_hashes': {column: new_distinct_sample(hash_capacity) for column in ID_COLUMNS.get(table_name, ('hospitalization_id',))},
+        'numeric_stats': pd.DataFrame(columns=['count', 'sum', 'min', 'max'], dtype='float64'),
+        'category_values': {},
+        'category_stats': pd.DataFrame(columns=['size', 'count', 'sum', 'min', 'max'], dtype='float64'),
+        'category_sketches': {},
+        'category_histograms': {},
+        'device_histograms': {},
+        'device_names': None,
+        'device_stats': {},
+        'first_modes': None,
+        'imv_encounters': set(),
+        'mappings': {},
+        'replaced_count': 0,
+        'lab_value_non_numeric': False,
+        'lab_value_censored': 0
+    }
+
+def _numeric_stats(batch):
+    numeric = batch.select_dtypes(include='number')
+    return pd.DataFrame({'count': numeric.count(), 'sum': numeric.sum(), 'min': numeric.min(), 'max': numeric.max()})
+
+def _plain_index(result):
+    """
+    Replace categorical group keys by their values, so that the results of
+    batches with different dictionaries align and sort by value.
+    """
+    index = result.index
+    if isinstance(index, pd.MultiIndex):
+        result.index = pd.MultiIndex.from_arrays([index.get_level_values(level).astype(object)
+                                                  for level in range(index.nlevels)], names=index.names)
+    else:
+        result.index = index.astype(object)
+    return result
+
+def _category_stats(batch, category_column, value_column):
+    values = pd.to_numeric(batch[value_column], errors='coerce')
+    grouped = values.groupby(batch[category_column], observed=True)
+    return _plain_index(pd.DataFrame({'size': grouped.size(), 'count': grouped.count(), 'sum': grouped.sum(),
+                                      'min': grouped.min(), 'max': grouped.max()}))
+
+# Quantile sketches: sorted centroid values with their weights (number of
+# values each stands for). A sketch is compressed to SKETCH_SIZE centroids of
+# about equal weight, so quantiles are within ~1/SKETCH_SIZE in rank.
+def _compress_sketch(values, weights):
+    if len(values) <= SKETCH_SIZE:
+        return values, weights
+    cumulative = np.cumsum(weights)
+    buckets = np.minimum(((cumulative - weights / 2) / cumulative[-1] * SKETCH_SIZE).astype('int64'), SKETCH_SIZE - 1)
+    bucket_weights = np.bincount(buckets, weights=weights, minlength=SKETCH_SIZE)
+    bucket_sums = np.bincount(buckets, weights=values * weights, minlength=SKETCH_SIZE)
+    keep = bucket_weights > 0
+    return bucket_sums[keep] / bucket_weights[keep], bucket_weights[keep]
+
+def _merge_sketch(left, right):
+    values = np.concatenate([left[0], right[0]])
+    weights = np.concatenate([left[1], right[1]])
+    order = np.argsort(values, kind='stable')
+    return _compress_sketch(values[order], weights[order])
+
+def _merge_sketches(left, right):
+    merged = dict(left)
+    for category, sketch in right.items():
+        merged[category] = sketch if category not in merged else _merge_sketch(merged[category], sketch)
+    return merged
+
+def _sketch_quantile(sketch, q):
+    """
+    Quantile of the values summarized by a sketch, with the same linear
+    interpolation as pandas while the sketch still holds every value.
+    """
+    values, weights = sketch
+    if len(values) == 0:
+        return np.nan
+    if (weights == 1).all():
+        position = (len(values) - 1) * q
+        lower, upper = int(np.floor(position)), int(np.ceil(position))
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+    # Interpolate between centroids placed at the middle of their weight
+    return np.interp(q * weights.sum(), np.cumsum(weights) - weights / 2, values)
+
+def _category_sketches(batch, category_column, value_column):
+    values = pd.to_numeric(batch[value_column], errors='coerce').astype('float64')
+    has_value = values.notna()
+    sketches = {}
+    for category, group in values[has_value].groupby(batch.loc[has_value, category_column], observed=True):
+        group_values = np.sort(group.to_numpy())
+        sketches[category] = _compress_sketch(group_values, np.ones(len(group_values)))
+    return sketches
+
+def _batch_histograms(table_name, batch, category_column, value_column):
+    """
+    Bin counts of the categories with outlier thresholds, binned over the
+    thresholds so that batches add up. Other categories are binned from
+    their sketches once their range is known (see _partial_histograms).
+    """
+    ranges = _histogram_ranges(table_name)
+    histograms = category_histograms(batch[category_column], batch[value_column], ranges)
+    return {category: histogram for category, histogram in histograms.items() if category in ranges}
+
+def _combine_stats(left, right):
+    if left.empty:
+        return right
+    if right.empty:
+        return left
+    combined = pd.concat([left, right])
+    aggregations = {column: ('min' if column == 'min' else 'max' if column == 'max' else 'sum')
+                    for column in combined.columns}
+    return combined.groupby(level=0).agg(aggregations)
+
+def _device_mode_stats(batch):
+    """
+    count, sum, min and max of the numeric columns of every device category
+    and every (device category, mode category) pair of a batch.
+    """
+    numeric = batch.select_dtypes(include='number')
+    stats = {}
+    for keys in (['device_category'], ['device_category', 'mode_category']):
+        grouped = numeric.groupby([batch[key] for key in keys], observed=True).agg(['count', 'sum', 'min', 'max'])
+        for key, row in grouped.iterrows():
+            selection = key if len(keys) == 2 else (key, None)
+            stats[selection] = row.unstack()[['count', 'sum', 'min', 'max']]
+    return stats
+
+def _merge_device_stats(left, right):
+    merged = dict(left)
+    for selection, stats in right.items():
+        merged[selection] = stats if selection not in merged else _combine_stats(merged[selection], stats)
+    return merged
+
+def _add_counts(left, right):
+    if left is None or right is None:
+        return right if left is None else left
+    return left.add(right, fill_value=0).astype('int64')
+
+def _merge_first_modes(left, right):
+    if left is None or right is None:
+        return right if left is None else left
+    # left holds the earlier rows, so it wins ties
+    return first_modes(pd.concat([left, right], ignore_index=True))
+
+def _selection_summary(stats):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = stats['sum'] / stats['count']
+    return pd.DataFrame({'count': stats['count'], 'mean': mean, 'min': stats['min'], 'max': stats['max']}).T
+
+def _batch_mappings(batch):
+    mappings = {}
+    for var in [col for col in batch.columns if col.endswith('_name')]:
+        var_category = var.replace('_name', '_category')
+        if var_category in batch.columns:
+            mappings[var] = _plain_index(batch.groupby([var, var_category], observed=True).size()).sort_index()
+    return mappings
+
+def update_partial(partial, batch):
+    """
+    Reduce a batch of rows into the partial QC result.
+
+    Parameters:
+        partial (dict): Partial result from new_partial or a previous update.
+        batch (DataFrame): Batch read by read_data_batches with dtypes.
+
+    Returns:
+        dict: The updated partial.
+    """
+    table_name = partial['table']
+    if partial['head'] is None:
+        partial['head'] = batch.head()
+        partial['columns'] = list(batch.columns)
+    for column, dtype in batch.attrs.get('physical_dtypes', {}).items():
+        partial['physical_dtypes'][column] = _merge_dtype(partial['physical_dtypes'].get(column), dtype)
+
+    partial['rows'] += len(batch)
+    partial['null_counts'] = partial['null_counts'].add(batch.isnull().sum(), fill_value=0).astype('int64')
+    def add_sample(sample, values):
+        # Hashes outside the sample's range are dropped before they are sorted
+        return merge_distinct_samples(sample, distinct_sample(values, sample['level'], sample['capacity']))
+    partial['row_hashes'] = add_sample(partial['row_hashes'], batch)
+    keys = [key for key in DUPLICATE_KEYS.get(table_name, []) if key in batch.columns]
+    if keys:
+        partial['key_hashes'] = add_sample(partial['key_hashes'], batch[keys])
+    for column in partial['id_hashes']:
+        if column in batch.columns:
+            partial['id_hashes'][column] = add_sample(partial['id_hashes'][column], batch[column])
+
+    if table_name == 'Labs' and 'lab_value_numeric' not in batch.columns:
+        # The parse table is written once the whole table is read
+        parsed = parse_lab_values(batch['lab_value'], persist=False)
+        partial['lab_value_non_numeric'] = partial['lab_value_non_numeric'] or parsed.attrs['non_numeric']
+        partial['lab_value_censored'] += int(parsed['lab_value_operator'].notna().sum())
+        batch = batch.assign(lab_value_numeric=parsed['lab_value_numeric'])
+
+    partial['numeric_stats'] = _combine_stats(partial['numeric_stats'], _numeric_stats(batch))
+    for column in [col for col in batch.columns if col.endswith('_category')]:
+        values = set(batch[column].dropna().unique())
+        partial['category_values'][column] = partial['category_values'].get(column, set()) | values
+
+    if table_name in CATEGORY_VALUE_COLUMNS:
+        category_column, value_column = CATEGORY_VALUE_COLUMNS[table_name]
+        if category_column in batch.columns and value_column in batch.columns:
+            partial['category_stats'] = _combine_stats(partial['category_stats'],
+                                                       _category_stats(batch, category_column, value_column))
+            partial['category_sketches'] = _merge_sketches(partial['category_sketches'],
+                                                           _category_sketches(batch, category_column, value_column))
+            if table_name in OUTLIER_THRESHOLDS:
+                thresholds = _outlier_thresholds(table_name)
+                replaced, replaced_count, _, _ = replace_outliers_with_na_long(batch.copy(), thresholds, category_column, value_column)
+                partial['replaced_count'] += replaced_count
+                # Vitals are plotted with their outliers and labs without, as in the full QC
+                plotted = batch if table_name == 'Vitals' else replaced
+                partial['category_histograms'] = merge_histograms(partial['category_histograms'],
+                                                                  _batch_histograms(table_name, plotted, category_column, value_column))
+    elif table_name in OUTLIER_THRESHOLDS:
+        thresholds = _outlier_thresholds(table_name)
+        _, replaced_count, _, _ = replace_outliers_with_na_wide(batch.copy(), thresholds)
+        partial['replaced_count'] += int(replaced_count)
+        if 'device_category' in batch.columns and 'mode_category' in batch.columns:
+            # Variables are binned over their thresholds, so batches add up
+            ranges = _histogram_ranges(table_name)
+            variables = [variable for variable in RESP_HISTOGRAM_VARIABLES if variable in ranges]
+            batch_histograms = device_mode_histograms(batch, variables, bin_ranges=ranges)
+            partial['device_histograms'] = merge_device_mode_histograms(partial['device_histograms'], batch_histograms)
+            partial['device_stats'] = _merge_device_stats(partial['device_stats'], _device_mode_stats(batch))
+        if all(column in batch.columns for column in DEVICE_MODE_COLUMNS):
+            partial['device_names'] = _add_counts(partial['device_names'], device_mode_name_counts(batch))
+        if all(column in batch.columns for column in ('hospitalization_id', 'recorded_dttm', 'device_category', 'mode_category')):
+            partial['first_modes'] = _merge_first_modes(partial['first_modes'], first_modes(batch))
+            partial['imv_encounters'] |= set(batch.loc[batch['device_category'] == 'IMV', 'hospitalization_id'])
+
+    for var, frequency in _batch_mappings(batch).items():
+        previous = partial['mappings'].get(var)
+        partial['mappings'][var] = frequency if previous is None else previous.add(frequency, fill_value=0)
+    return partial
+
+def merge_partials(left, right):
+    """
+    Merge two partial QC results of the same table, e.g. of two batches or
+    two files. left comes first for the data preview.
+
+    Returns:
+        dict: The merged partial.
+    """
+    merged = new_partial(left['table'], min(left['row_hashes']['capacity'], right['row_hashes']['capacity']))
+    merged['rows'] = left['rows'] + right['rows']
+    merged['head'] = left['head'] if left['head'] is not None else right['head']
+    merged['columns'] = left['columns'] or right['columns']
+    for column in set(left['physical_dtypes']) | set(right['physical_dtypes']):
+        merged['physical_dtypes'][column] = _merge_dtype(left['physical_dtypes'].get(column),
+                                                         right['physical_dtypes'].get(column))
+    merged['null_counts'] = left['null_counts'].add(right['null_counts'], fill_value=0).astype('int64')
+    merged['row_hashes'] = merge_distinct_samples(left['row_hashes'], right['row_hashes'])
+    merged['key_hashes'] = merge_distinct_samples(left['key_hashes'], right['key_hashes'])
+    merged['id_hashes'] = {column: merge_distinct_samples(left['id_hashes'][column], right['id_hashes'][column])
+                           for column in left['id_hashes']}
+    merged['numeric_stats'] = _combine_stats(left['numeric_stats'], right['numeric_stats'])
+    for column in set(left['category_values']) | set(right['category_values']):
+        merged['category_values'][column] = left['category_values'].get(column, set()) | right['category_values'].get(column, set())
+    merged['category_stats'] = _combine_stats(left['category_stats'], right['category_stats'])
+    merged['category_sketches'] = _merge_sketches(left['category_sketches'], right['category_sketches'])
+    merged['category_histograms'] = merge_histograms(left['category_histograms'], right['category_histograms'])
+    merged['device_histograms'] = merge_device_mode_histograms(left['device_histograms'], right['device_histograms'])
+    merged['device_names'] = _add_counts(left['device_names'], right['device_names'])
+    merged['device_stats'] = _merge_device_stats(left['device_stats'], right['device_stats'])
+    merged['first_modes'] = _merge_first_modes(left['first_modes'], right['first_modes'])
+    merged['imv_encounters'] = left['imv_encounters'] | right['imv_encounters']
+    # In order of first appearance, which is the order the mappings are shown in
+    for var in dict.fromkeys([*left['mappings'], *right['mappings']]):
+        frequencies = [partial['mappings'][var] for partial in (left, right) if var in partial['mappings']]
+        merged['mappings'][var] = frequencies[0] if len(frequencies) == 1 else frequencies[0].add(frequencies[1], fill_value=0)
+    merged['replaced_count'] = left['replaced_count'] + right['replaced_count']
+    merged['lab_value_non_numeric'] = left['lab_value_non_numeric'] or right['lab_value_non_numeric']
+    merged['lab_value_censored'] = left['lab_value_censored'] + right['lab_value_censored']
+    return merged
+
+
+# Artifacts from a partial, in the same form as the full QC runners
+def _category_summary_stats(partial):
+    stats = partial['category_stats'].sort_index()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (stats['sum'] / stats['count']).where(stats['count'] > 0)
+    empty = (np.array([]), np.array([]))
+    sketches = [partial['category_sketches'].get(category, empty) for category in stats.index]
+    return pd.DataFrame({
+        'Category': stats.index,
+        'N': stats['count'].astype('int64').to_numpy(),
+        'Missing (%)': ((stats['size'] - stats['count']) / partial['rows'] * 100).to_numpy(),
+        'Min': stats['min'].to_numpy(),
+        'Mean': mean.to_numpy(),
+        'Q1': [_sketch_quantile(sketch, 0.25) for sketch in sketches],
+        'Median': [_sketch_quantile(sketch, 0.5) for sketch in sketches],
+        'Q3': [_sketch_quantile(sketch, 0.75) for sketch in sketches],
+        'Max': stats['max'].to_numpy()
+    })
+
+def _partial_histograms(partial):
+    """
+    Histograms of the category values: the counts kept over the thresholds
+    of thresholded categories, and for the others bins over their range
+    filled from the quantile sketch (exact for categories with up to
+    SKETCH_SIZE values, otherwise each centroid's weight falls in its bin).
+    """
+    histograms = dict(partial['category_histograms'])
+    stats = partial['category_stats'].sort_index()
+    for category, (values, weights) in partial['category_sketches'].items():
+        if category in histograms or category not in stats.index:
+            continue
+        ranges = {category: (stats.loc[category, 'min'], stats.loc[category, 'max'])}
+        histograms.update(category_histograms(np.full(len(values), category, dtype=object), values, ranges, weights=weights))
+    return histograms
+
+def _numeric_summary(partial, include_all=False):
+    """
+    Summary statistics with the columns of the full QC's describe() (the
+    numeric columns), or describe(include='all') with include_all. Only the
+    statistics that merge across batches are filled in: count, and mean, min
+    and max of numeric columns.
+    """
+    stats = partial['numeric_stats']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = stats['sum'] / stats['count']
+    columns = partial['columns'] if include_all else [column for column in partial['columns'] if column in stats.index]
+    counts = partial['rows'] - partial['null_counts'].reindex(columns, fill_value=0)
+    summary = pd.DataFrame({'count': counts, 'mean': mean, 'min': stats['min'], 'max': stats['max']})
+    return summary.reindex(columns).T
+
+def finalize_partial(partial):
+    """
+    Turn a partial QC result into QC artifacts.
+
+    The artifacts have the same keys as those of the full QC runners, except
+    that category quartiles are estimated from the quantile sketches (exact
+    for categories with up to SKETCH_SIZE values) and so are the histograms
+    of categories without outlier thresholds.
+
+    Returns:
+        dict: QC artifacts for the table.
+    """
+    table_name = partial['table']
+    artifacts = _new_artifacts(table_name)
+    artifacts['mode'] = 'streaming'
+
+    # Data preview
+    artifacts['total_counts'] = partial['rows']
+    if 'patient_id' in partial['id_hashes']:
+        artifacts['ttl_unique_patients'] = sample_distinct_count(partial['id_hashes']['patient_id'])
+    if 'hospitalization_id' in partial['id_hashes']:
+        artifacts['ttl_unique_encounters'] = sample_distinct_count(partial['id_hashes']['hospitalization_id'])
+    samples = [partial['row_hashes'], partial['key_hashes'], *partial['id_hashes'].values()]
+    level = max(sample['level'] for sample in samples)
+    if level:
+        artifacts['qc_summary'].append(f"Unique and duplicate counts are estimated from a 1 in {2 ** level:,} sample of distinct values.")
+    duplicate_count = sample_duplicate_count(partial['row_hashes'])
+    artifacts['duplicate_count'] = duplicate_count
+    if duplicate_count > 0:
+        artifacts['qc_summary'].append(f"{duplicate_count} duplicate(s) found in the data.")
+        artifacts['qc_recommendations'].append("Duplicate records found. Please review and remove duplicates.")
+    # Duplicate samples need the rows themselves, which are not kept
+    artifacts['duplicate_sample'] = None
+    keys = [key for key in DUPLICATE_KEYS.get(table_name, []) if key in partial['columns']]
+    artifacts['duplicate_keys'] = keys
+    artifacts['key_duplicate_count'] = sample_duplicate_count(partial['key_hashes']) if keys else 0
+    artifacts['key_duplicate_sample'] = None
+    check_key_duplicates(artifacts)
+    artifacts['head'] = partial['head']
+
+    # Data types and required columns are checked on the preview rows, with
+    # the physical dtypes seen in all batches
+    head = partial['head'].copy() if partial['head'] is not None else pd.DataFrame(columns=partial['columns'])
+    head.attrs['physical_dtypes'] = partial['physical_dtypes']
+    check_data_types(table_name, head, artifacts)
+
+    # Missingness
+    missing_counts = partial['null_counts'].reindex(partial['columns'], fill_value=0)
+    artifacts['missing_info'] = None
+    if missing_counts.any():
+        missing_info = pd.DataFrame({
+            'Missing Count': missing_counts,
+            'Missing (%)': (missing_counts / partial['rows'] * 100).map('{:.2f}%'.format)
+        })
+        artifacts['missing_info'] = missing_info.sort_values(by='Missing Count', ascending=False)
+        artifacts['qc_summary'].append("Missing values found in columns - " + ', '.join(missing_info[missing_info['Missing Count'] > 0].index.tolist()))
+
+    if table_name in ('Labs', 'Respiratory_Support'):
+        artifacts['summary'] = _numeric_summary(partial, include_all=table_name == 'Labs')
+
+    check_required_columns(table_name, head, artifacts)
+
+    category_values = {column: sorted(values) for column, values in partial['category_values'].items()}
+    if table_name == 'ADT':
+        categories = category_values.get('location_category', [])
+        missing_cats = [cat for cat in REQUIRED_LOCATION_CATEGORIES if cat not in categories]
+        artifacts['missing_location_categories'] = missing_cats
+        if missing_cats:
+            artifacts['qc_summary'].append("Some location categories are missing.")
+            artifacts['qc_recommendations'].append("Some location categories are missing. Please ensure all location categories are present.")
+        else:
+            artifacts['qc_summary'].append("All location categories are present.")
+
+    if table_name == 'Labs':
+        check_lab_value_status(artifacts, 'lab_value_numeric' in partial['columns'],
+                               partial['lab_value_non_numeric'], partial['lab_value_censored'])
+
+    if table_name in CATEGORY_VALUE_COLUMNS:
+        category_column, _ = CATEGORY_VALUE_COLUMNS[table_name]
+        if table_name in OUTLIER_THRESHOLDS:
+            # The distinct categories stand in for the data in the presence check
+            present = pd.DataFrame({category_column: category_values.get(category_column, [])})
+            label = 'lab' if table_name == 'Labs' else 'vital'
+            check_category_presence(present, _outlier_thresholds(table_name), category_column, label, artifacts)
+        artifacts['summary_stats'] = _category_summary_stats(partial)
+
+    if table_name in OUTLIER_THRESHOLDS:
+        artifacts['replaced_count'] = partial['replaced_count']
+        if partial['replaced_count'] > 0:
+            artifacts['qc_summary'].append("Outliers found in the data." if table_name == 'Respiratory_Support' else "Outliers found in data.")
+            artifacts['qc_recommendations'].append("Outliers found. Please replace values with NA.")
+    if table_name in ('Labs', 'Vitals'):
+        histograms = _partial_histograms(partial)
+        artifacts['histogram'] = figure_to_png(plot_histograms(histograms, CATEGORY_VALUE_COLUMNS[table_name][1]))
+    if table_name == 'Respiratory_Support':
+        artifacts['device_categories'] = category_values.get('device_category', [])
+        artifacts['mode_categories'] = category_values.get('mode_category', [])
+        artifacts['device_histograms'] = partial['device_histograms']
+        # Summaries per device and mode category hold the statistics that merge, as the table summary does
+        summaries = device_mode_mappings(partial['device_names']) if partial['device_names'] is not None else {}
+        for selection, summary in summaries.items():
+            stats = partial['device_stats'].get(selection, partial['numeric_stats'].iloc[:0])
+            summary['summary'] = _selection_summary(stats.reindex([column for column in partial['columns'] if column in stats.index]))
+        artifacts['device_summaries'] = summaries
+        modes = partial['first_modes'] if partial['first_modes'] is not None else pd.DataFrame(columns=['hospitalization_id', 'mode_category'])
+        artifacts['initial_mode_choice'] = initial_mode_counts(modes, partial['imv_encounters'])
+
+    mappings = []
+    for var, frequency in partial['mappings'].items():
+        frequency = frequency.astype('int64').reset_index(name='counts')
+        mappings.append(frequency.sort_values(by='counts', ascending=False).reset_index(drop=True))
+    artifacts['mappings'] = mappings
+    return artifacts
+
+def stream_partial(table_name, filepath, filetype, memory_budget_mb=None, progress=None):
+    """
+    Read a table file batch by batch within the memory budget and reduce it
+    to a partial QC result.
+    """
+    memory_budget_mb = MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+    table_bytes, row_bytes = estimate_table_bytes(table_name, filepath, filetype)
+    hash_capacity = hash_sample_size(table_name, memory_budget_mb)
+    if memory_budget_mb and row_bytes:
+        # The distinct samples are held throughout, so batches get the rest of the budget
+        hash_bytes = hash_capacity * HASH_SAMPLE_ENTRY_BYTES * _hash_sample_kinds(table_name)
+        batch_bytes = max(memory_budget_mb * 1024 * 1024 - hash_bytes, 0) * BATCH_MEMORY_FRACTION
+        batch_rows = max(int(batch_bytes / row_bytes), 1_000)
+    else:
+        batch_rows = 1_000_000
+    logger.info(f"Streaming {filepath} in batches of {batch_rows} rows (~{table_bytes / 2**20:.0f} MB in memory).")
+    partial = new_partial(table_name, hash_capacity)
+    rows_read = 0
+    expected_rows = max(table_bytes / row_bytes, 1) if row_bytes else 1
+    for batch in read_data_batches(filepath, filetype, columns=_table_columns(table_name),
+                                   dtypes=expected_data_types[table_name],
+                                   categorical=table_categorical_columns(table_name), batch_rows=batch_rows):
+        partial = update_partial(partial, batch)
+        rows_read += len(batch)
+        _report_progress(progress, 15 + int(70 * min(rows_read / expected_rows, 1)), f'Checked {rows_read:,} rows...')
+    if table_name == 'Labs':
+        save_parse_table()
+    return partial
+
+def run_streaming_qc(table_name, root_location, filetype, progress=None, memory_budget_mb=None):
+    """
+    Run the QC for a table in streaming mode.
+
+    Parameters:
+        table_name (str): Name of the table, e.g. 'Vitals'.
+        root_location (str): Directory containing the CLIF tables.
+        filetype (str): Type of the files ('csv', 'parquet' or 'fst').
+        progress (callable, optional): Called with (percent, text) as batches are checked.
+        memory_budget_mb (int, optional): Memory budget in MB. Defaults to MEMORY_BUDGET_MB.
+
+    Returns:
+        dict: QC artifacts for the table.
+    """
+    _report_progress(progress, 10, 'Reading data in batches...')
+    partial = stream_partial(table_name, table_filepath(root_location, table_name, filetype), filetype,
+                             memory_budget_mb, progress)
+    _report_progress(progress, 90, 'Summarizing batches...')
+    artifacts = finalize_partial(partial)
+    if table_name == 'ADT':
+        check_adt_overlaps(artifacts, root_location, filetype)
+    return artifacts
+
+def check_adt_overlaps(artifacts, root_location, filetype):
+    """
+    Overlap check of ADT artifacts built from partials. The overlap sweep
+    needs each patient's stays together, so the few ADT columns it uses are
+    loaded.
+    """
+    table_name = 'ADT'
+    data = read_data(table_filepath(root_location, table_name, filetype), filetype,
+                     columns=required_variables[table_name], dtypes=expected_data_types[table_name],
+                     categorical=table_categorical_columns(table_name))
+    check_overlaps(data, root_location, filetype, artifacts)
@@ -200,3 +200,13 @@ required_variables = {
         'patient_id', 'hospitalization_id', 'recorded_dttm', 'position_name', 'position_category'
     ]
 }
+
+
+# Text columns with few distinct values (names, categories and groups),
+# loaded as categoricals to save memory. lab_value is one too, so the lab
+# value parser works on its categories rather than on every row.
+categorical_variables = {
+    table: [col for col, dtype in dtypes.items()
+            if dtype == 'object' and (col.endswith(('_name', '_category', '_group')) or col == 'lab_value')]
+    for table, dtypes in expected_data_types.items()
+}
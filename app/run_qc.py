@@ -0,0 +1,198 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import numpy as np
+import pandas as pd
+from qc_cache import QC_ENGINES
+from qc_checks import QC_RUNNERS, table_filepath
+from qc_scheduler import run_tables_parallel
+
+logger = logging.getLogger(__name__)
+
+# Headless QC runner. Runs the same checks as the Quality Control pages for
+# every CLIF table found under a root location and writes a report directory:
+# report.json with the summary, recommendations and counts of each table,
+# parquet files for the tabular results and PNG files for the figures.
+#
+#   python run_qc.py --root-location /path/to/clif --filetype parquet --output qc_report
+
+
+def _json_default(value):
+    """
+    Convert numpy and pandas scalars for json.dump.
+    """
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return str(value)
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return None
+    return str(value)
+
+def _write_frame(df, path):
+    """
+    Write a DataFrame to parquet, falling back to strings for object columns
+    arrow cannot convert (e.g. mixed types).
+    """
+    df = df.reset_index() if not isinstance(df.index, pd.RangeIndex) else df
+    df.columns = [str(column) for column in df.columns]
+    try:
+        df.to_parquet(path, index=False)
+    except Exception:
+        object_columns = df.select_dtypes(include='object').columns
+        df = df.astype({column: str for column in object_columns})
+        df.to_parquet(path, index=False)
+
+def _device_histogram_frame(histograms):
+    """
+    Long form of device_mode_histograms: one row per device category, mode
+    category (missing for all modes of the device), variable and bin, with
+    the bin edges (infinite for the out-of-range bins).
+    """
+    frames = []
+    for (device, mode), variables in histograms.items():
+        for variable, (edges, counts) in variables.items():
+            frames.append(pd.DataFrame({'device_category': device, 'mode_category': mode, 'variable': variable,
+                                        'bin': np.arange(len(counts)),
+                                        'bin_lower': np.concatenate([[-np.inf], edges]),
+                                        'bin_upper': np.concatenate([edges, [np.inf]]),
+                                        'count': counts}))
+    columns = ['device_category', 'mode_category', 'variable', 'bin', 'bin_lower', 'bin_upper', 'count']
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+def _device_summary_frame(summaries):
+    """
+    Long form of the device_mode_summaries statistics: one row per device
+    category, mode category (missing for all modes of the device) and
+    variable, with the rows of the selection. The name to category mappings
+    of a selection are part of the table's mappings, written separately.
+    """
+    frames = []
+    for (device, mode), summary in summaries.items():
+        frame = summary['summary'].T.rename_axis('variable').reset_index()
+        frame.insert(0, 'rows', summary['count'])
+        frame.insert(0, 'mode_category', mode)
+        frame.insert(0, 'device_category', device)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['device_category', 'mode_category', 'rows', 'variable'])
+
+def write_table_report(artifacts, output_dir):
+    """
+    Write the QC artifacts of one table to the output directory.
+
+    Parameters:
+        artifacts (dict): QC artifacts returned by a run_*_qc function.
+        output_dir (str): Directory for the parquet and PNG files.
+
+    Returns:
+        dict: JSON-serializable entry for the table in report.json, with
+              DataFrames and figures replaced by their file names.
+    """
+    table = artifacts['table'].lower()
+    entry = {'status': 'ok', 'tables': {}, 'figures': {}}
+    for key, value in artifacts.items():
+        # Keyed by (device category, mode category), which JSON cannot hold
+        if key == 'device_histograms':
+            value = _device_histogram_frame(value)
+        elif key == 'device_summaries':
+            value = _device_summary_frame(value)
+        if isinstance(value, pd.DataFrame):
+            filename = f'{table}_{key}.parquet'
+            _write_frame(value, os.path.join(output_dir, filename))
+            entry['tables'][key] = filename
+        elif isinstance(value, list) and value and all(isinstance(item, pd.DataFrame) for item in value):
+            filenames = []
+            for i, df in enumerate(value):
+                filename = f'{table}_{key}_{i}.parquet'
+                _write_frame(df, os.path.join(output_dir, filename))
+                filenames.append(filename)
+            entry['tables'][key] = filenames
+        elif isinstance(value, bytes):
+            filename = f'{table}_{key}.png'
+            with open(os.path.join(output_dir, filename), 'wb') as f:
+                f.write(value)
+            entry['figures'][key] = filename
+        else:
+            entry[key] = value
+    return entry
+
+def run_batch_qc(root_location, filetype, output_dir, tables=None, max_workers=None, refresh=False, memory_budget_mb=None, engine=None,
+                 preview=False):
+    """
+    Run the QC for each table present under the root location and write the
+    report to the output directory.
+
+    Parameters:
+        root_location (str): Directory containing the CLIF tables.
+        filetype (str): Type of the files ('csv', 'parquet' or 'fst').
+        output_dir (str): Directory for report.json and the result files.
+        tables (list, optional): Tables to check. Defaults to all tables.
+        max_workers (int, optional): Number of tables checked in parallel.
+        refresh (bool): Recompute instead of using cached results.
+        memory_budget_mb (int, optional): Memory budget in MB, shared by the
+            tables checked in parallel; tables larger than their share are
+            checked in streaming mode.
+        engine (str, optional): QC engine, 'pandas' or 'duckdb'.
+        preview (bool): Estimate the results from a sample of each table.
+
+    Returns:
+        dict: The report written to report.json.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tables = tables or list(QC_RUNNERS)
+    report = {'root_location': os.path.abspath(root_location), 'filetype': filetype, 'tables': {}}
+    for table_name in tables:
+        filepath = table_filepath(root_location, table_name, filetype)
+        if not os.path.exists(filepath):
+            logger.info(f"{table_name}: {filepath} not found, skipping.")
+            report['tables'][table_name] = {'status': 'missing', 'filepath': filepath}
+    for event, table_name, payload in run_tables_parallel(root_location, filetype, tables, max_workers, refresh,
+                                                           memory_budget_mb, engine, preview):
+        filepath = table_filepath(root_location, table_name, filetype)
+        if event == 'progress':
+            percent, text = payload
+            logger.info(f"{table_name}: {percent}% {text}")
+        elif event == 'error':
+            logger.error(f"{table_name}: quality checks failed: {payload}")
+            report['tables'][table_name] = {'status': 'error', 'filepath': filepath, 'error': str(payload)}
+        else:
+            report['tables'][table_name] = write_table_report(payload, output_dir)
+            report['tables'][table_name]['filepath'] = filepath
+    # Keep the report in table order regardless of completion order
+    report['tables'] = {table_name: report['tables'][table_name] for table_name in tables}
+    with open(os.path.join(output_dir, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2, default=_json_default)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run CLIF quality checks without the Streamlit app.')
+    parser.add_argument('--root-location', required=True, help='Directory containing the CLIF tables.')
+    parser.add_argument('--filetype', required=True, choices=['csv', 'parquet', 'fst'], help='Type of the CLIF table files.')
+    parser.add_argument('--output', default='qc_report', help='Directory for the QC report (default: qc_report).')
+    parser.add_argument('--tables', nargs='+', choices=list(QC_RUNNERS), help='Tables to check (default: all).')
+    parser.add_argument('--workers', type=int, help='Number of tables checked in parallel (default: number of CPUs).')
+    parser.add_argument('--memory-budget-mb', type=int, help='Memory budget in MB, shared by the tables checked in parallel; tables larger than their share are checked in streaming mode.')
+    parser.add_argument('--engine', choices=QC_ENGINES, help='QC engine: pandas, or duckdb to run the checks as SQL over the files.')
+    parser.add_argument('--preview', action='store_true', help='Estimate the results from a sample of each table (quick, approximate).')
+    parser.add_argument('--no-cache', action='store_true', help='Recompute results instead of using the QC cache.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = run_batch_qc(args.root_location, args.filetype, args.output, args.tables, args.workers, refresh=args.no_cache,
+                          memory_budget_mb=args.memory_budget_mb, engine=args.engine, preview=args.preview)
+
+    for table_name, entry in report['tables'].items():
+        print(f"{table_name}: {entry['status']}")
+    print(f"Report written to {os.path.join(args.output, 'report.json')}")
+    failed = [table_name for table_name, entry in report['tables'].items() if entry['status'] == 'error']
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,331 @@
+import logging
+import os
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from common_qc import _dataset, _expected_arrow_type, read_data, read_data_batches
+from qc_checks import OUTLIER_THRESHOLDS, REQUIRED_LOCATION_CATEGORIES, table_filepath
+from reqd_vars_dtypes import required_variables, expected_data_types
+
+logger = logging.getLogger(__name__)
+
+# Vocabulary mapping of site *_name values to CLIF *_category values.
+#
+# Candidate categories are ranked for every distinct name at once. Each
+# category is described by its own label and by the names already mapped to
+# it in the site's data, weighted by how many rows use them, as a vector of
+# word and character trigram features with inverse document frequency
+# weights. Names are scored against all categories through an inverted index
+# of the features, by cosine similarity.
+#
+# Accepted mappings are kept as one CSV file per name column and applied to
+# a table batch by batch: the name column is loaded as a categorical, so the
+# mapping is looked up once per distinct name and the rows only take the
+# result by their codes.
+
+VOCAB_MAPPING_DIR = os.environ.get('CLIF_VOCAB_MAPPING_DIR', os.path.join(os.path.expanduser('~'), '.clif_lighthouse', 'vocabulary_mappings'))
+# Rows written per batch when a mapping is applied to a table
+APPLY_BATCH_ROWS = 5_000_000
+# Weight of a category's own label relative to one name mapped to it
+CATEGORY_LABEL_WEIGHT = 2.0
+SUGGESTIONS = 3
+
+
+def _threshold_categories(table_name, category_column):
+    return pd.read_csv(OUTLIER_THRESHOLDS[table_name])[category_column].dropna().astype(str).tolist()
+
+# CLIF categories known to the app, beyond those found in the data
+CLIF_CATEGORIES = {
+    'lab_category': _threshold_categories('Labs', 'lab_category'),
+    'vital_category': _threshold_categories('Vitals', 'vital_category'),
+    'location_category': REQUIRED_LOCATION_CATEGORIES,
+}
+
+
+def name_columns(table_name):
+    """
+    (name column, category column) pairs of a table, e.g. ('lab_name', 'lab_category').
+    """
+    columns = required_variables[table_name]
+    return [(column, column.replace('_name', '_category')) for column in columns
+            if column.endswith('_name') and column.replace('_name', '_category') in columns]
+
+def discover_names(table_name, root_location, filetype):
+    """
+    Distinct names of each name column of a table with their categories and
+    row counts, as in name_category_mapping, but keeping names without a
+    category. Only the name and category columns are read, as categoricals.
+
+    Returns:
+        dict: Name column to a DataFrame of (name, category, counts).
+    """
+    pairs = name_columns(table_name)
+    columns = [column for pair in pairs for column in pair]
+    if not columns:
+        return {}
+    data = read_data(table_filepath(root_location, table_name, filetype), filetype, columns=columns,
+                     dtypes={column: expected_data_types[table_name][column] for column in columns}, categorical=columns)
+    mappings = {}
+    for name, category in pairs:
+        frequency = data.groupby([name, category], observed=True, dropna=False).size().reset_index(name='counts')
+        frequency = frequency.astype({name: object, category: object}).dropna(subset=[name])
+        mappings[name] = frequency.sort_values(by='counts', ascending=False).reset_index(drop=True)
+    return mappings
+
+
+def _features(label):
+    # Words and character trigrams of the normalized label
+    words = re.findall(r'[a-z0-9]+', str(label).lower())
+    text = f" {' '.join(words)} "
+    return {f"w:{word}" for word in words} | {f"g:{text[i:i + 3]}" for i in range(len(text) - 2)}
+
+def _feature_matrix(labels, vocabulary=None):
+    """
+    Feature incidence of labels as (label positions, feature positions).
+    Without a vocabulary, one is built from the labels' features; with one,
+    features not in it get position -1.
+    """
+    grow = vocabulary is None
+    vocabulary = {} if grow else vocabulary
+    rows, cols = [], []
+    for position, label in enumerate(labels):
+        for feature in _features(label):
+            index = vocabulary.get(feature, -1)
+            if index < 0 and grow:
+                index = vocabulary[feature] = len(vocabulary)
+            rows.append(position)
+            cols.append(index)
+    return np.asarray(rows, dtype='int64'), np.asarray(cols, dtype='int64'), vocabulary
+
+def build_category_index(frequency, categories=()):
+    """
+    Feature index of the candidate categories of a name column.
+
+    Parameters:
+        frequency (DataFrame): (name, category, counts) from discover_names.
+        categories (list): Further candidate categories, e.g. CLIF_CATEGORIES.
+
+    Returns:
+        dict: 'categories' (array of candidates), 'vocabulary' (feature to
+              position), 'weights' (features x categories, unit-norm columns)
+              and 'idf' (inverse document frequency of each feature).
+    """
+    name, category = frequency.columns[:2]
+    mapped = frequency.dropna(subset=[category])
+    candidates = pd.Index(pd.unique(np.concatenate([np.asarray(categories, dtype='object'),
+                                                    mapped[category].astype(str).to_numpy()])))
+    # Documents: each category's label, then every name mapped to it weighted by its row count
+    labels = list(candidates) + mapped[name].astype(str).tolist()
+    document = np.concatenate([np.arange(len(candidates)), candidates.get_indexer(mapped[category].astype(str))])
+    weight = np.concatenate([np.full(len(candidates), CATEGORY_LABEL_WEIGHT), np.log1p(mapped['counts'].to_numpy(dtype='float64'))])
+    rows, cols, vocabulary = _feature_matrix(labels)
+    counts = np.zeros((len(vocabulary), len(candidates)), dtype='float32')
+    np.add.at(counts, (cols, document[rows]), weight[rows])
+    # Features found in fewer categories tell them apart better
+    idf = np.log1p(len(candidates) / np.maximum((counts > 0).sum(axis=1), 1))
+    weights = counts * idf[:, None]
+    weights /= np.maximum(np.linalg.norm(weights, axis=0), 1e-12)
+    return {'categories': candidates.to_numpy(), 'vocabulary': vocabulary, 'weights': weights, 'idf': idf}
+
+def rank_categories(names, index, top_k=SUGGESTIONS):
+    """
+    Rank the candidate categories of an index for each name.
+
+    Parameters:
+        names (list): Names to map.
+        index (dict): Index from build_category_index.
+        top_k (int): Categories returned per name.
+
+    Returns:
+        DataFrame: 'name', 'rank' (from 1), 'category' and 'score' (cosine
+                   similarity in [0, 1]), best first.
+    """
+    names = list(names)
+    categories = index['categories']
+    top_k = min(top_k, len(categories))
+    if not names or not top_k:
+        return pd.DataFrame(columns=['name', 'rank', 'category', 'score'])
+    rows, cols, _ = _feature_matrix(names, index['vocabulary'])
+    # Features of no category count towards the norm of the names with the highest weight
+    known = cols >= 0
+    feature_weights = np.where(known, index['idf'][np.where(known, cols, 0)], np.log1p(len(categories)))
+    norms = np.sqrt(np.bincount(rows, weights=feature_weights ** 2, minlength=len(names)))
+    rows, cols, feature_weights = rows[known], cols[known], feature_weights[known]
+    # One pass over the name features per category
+    scores = np.column_stack([np.bincount(rows, weights=feature_weights * index['weights'][cols, c], minlength=len(names))
+                              for c in range(len(categories))])
+    scores /= np.maximum(norms, 1e-12)[:, None]
+    best = np.argsort(-scores, axis=1, kind='stable')[:, :top_k]
+    return pd.DataFrame({
+        'name': np.repeat(np.asarray(names, dtype='object'), top_k),
+        'rank': np.tile(np.arange(1, top_k + 1), len(names)),
+        'category': categories[best].ravel(),
+        'score': np.take_along_axis(scores, best, axis=1).ravel().round(3),
+    })
+
+def suggest_mapping(frequency, top_k=SUGGESTIONS):
+    """
+    Suggested category of every distinct name of a name column.
+
+    Parameters:
+        frequency (DataFrame): (name, category, counts) from discover_names.
+        top_k (int): Alternatives listed per name.
+
+    Returns:
+        DataFrame: One row per name with its row count, current (most
+                   frequent) category, the suggested category and its score
+                   (missing when no category is similar at all), and the
+                   top_k candidates. attrs['categories'] lists all candidate
+                   categories.
+    """
+    name, category = frequency.columns[:2]
+    index = build_category_index(frequency, CLIF_CATEGORIES.get(category, ()))
+    counts = frequency.groupby(name, sort=False)['counts'].sum()
+    current = frequency.dropna(subset=[category]).sort_values('counts', ascending=False).drop_duplicates(name).set_index(name)[category]
+    ranked = rank_categories(counts.index, index, top_k)
+    best = ranked[ranked['rank'] == 1].set_index('name')
+    # Names sharing no feature with any category get no suggestion
+    best = best[best['score'] > 0]
+    candidates = ranked.groupby('name', sort=False)['category'].agg(', '.join)
+    suggestions = pd.DataFrame({
+        name: counts.index,
+        'counts': counts.to_numpy(),
+        'current_category': current.reindex(counts.index).to_numpy(),
+        'suggested_category': best['category'].reindex(counts.index).to_numpy(),
+        'score': best['score'].reindex(counts.index).to_numpy(),
+        'candidates': candidates.reindex(counts.index).to_numpy(),
+    })
+    suggestions.attrs['categories'] = list(index['categories'])
+    return suggestions
+
+
+def mapping_path(table_name, name_column):
+    return os.path.join(VOCAB_MAPPING_DIR, f"{table_name}-{name_column}.csv")
+
+def load_mapping(table_name, name_column):
+    """
+    Accepted mapping of a name column, or None if none was saved.
+
+    Returns:
+        DataFrame: (name column, category column) pairs.
+    """
+    path = mapping_path(table_name, name_column)
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+def save_mapping(table_name, name_column, mapping):
+    """
+    Save the accepted mapping of a name column, one row per name.
+    """
+    os.makedirs(VOCAB_MAPPING_DIR, exist_ok=True)
+    mapping = mapping.dropna().drop_duplicates(subset=mapping.columns[0], keep='last')
+    # Write to a temporary file first so readers never see a partial mapping
+    path = mapping_path(table_name, name_column)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    mapping.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved {len(mapping)} mappings of {table_name}.{name_column} to {path}.")
+
+def remap_categories(names, categories, mapping):
+    """
+    Categories of a batch after applying a mapping: names in the mapping
+    take its category, the others keep their category. The mapping is
+    looked up once per distinct name.
+
+    Parameters:
+        names (Series): Name column.
+        categories (Series): Category column.
+        mapping (DataFrame): (name, category) pairs.
+
+    Returns:
+        Series: The new category column, as a categorical.
+    """
+    mapping = mapping.set_index(mapping.columns[0])[mapping.columns[1]]
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        codes, uniques = names.cat.codes.to_numpy(), names.cat.categories
+    else:
+        codes, uniques = pd.factorize(names)
+    targets = pd.Index(mapping.unique())
+    lookup = targets.get_indexer(mapping.reindex(pd.Index(uniques, dtype='object').astype(str)))
+    mapped = np.append(lookup, -1)[codes]
+    # Unmapped rows keep their category
+    existing = pd.Categorical(categories)
+    all_categories = targets.append(pd.Index(existing.categories).difference(targets))
+    existing_codes = all_categories.get_indexer(existing.categories)
+    kept = np.where(existing.codes < 0, -1, existing_codes[existing.codes])
+    return pd.Series(pd.Categorical.from_codes(np.where(mapped >= 0, mapped, kept), categories=all_categories),
+                     index=names.index)
+
+def _output_schema(table, dtypes, source_schema=None):
+    """
+    Schema of the mapped table: the expected type of each CLIF column (text
+    for object columns), the source file's type of other columns (text for a
+    CSV file, which has no schema), and dictionary-encoded text for the
+    categorical columns. A batch's own types are not used, as a column that
+    is empty in one batch has no type there.
+    """
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            # The same index type in every batch
+            column_type = pa.dictionary(pa.int32(), pa.string())
+        elif field.name in dtypes:
+            column_type = _expected_arrow_type(dtypes[field.name]) or pa.string()
+        elif source_schema is not None and field.name in source_schema.names:
+            column_type = source_schema.field(field.name).type
+        else:
+            column_type = pa.string()
+        fields.append(pa.field(field.name, pa.string() if pa.types.is_null(column_type) else column_type))
+    return pa.schema(fields)
+
+def apply_mappings(table_name, root_location, filetype, mappings, output_path, progress=None):
+    """
+    Write a copy of a table with the accepted mappings applied to its
+    category columns, as a parquet file.
+
+    Parameters:
+        table_name (str): CLIF table.
+        root_location (str): Directory of the CLIF tables.
+        filetype (str): Type of the table files.
+        mappings (dict): Name column to its (name, category) mapping.
+        output_path (str): Parquet file to write.
+        progress (callable, optional): Called with the number of rows written.
+
+    Returns:
+        int: Rows written.
+    """
+    pairs = [(name, category) for name, category in name_columns(table_name) if name in mappings]
+    filepath = table_filepath(root_location, table_name, filetype)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    source_schema = _dataset(filepath, filetype).schema if filetype in ('parquet', 'fst') else None
+    writer = None
+    rows = 0
+    try:
+        for batch in read_data_batches(filepath, filetype, dtypes=expected_data_types[table_name],
+                                       categorical=[column for pair in pairs for column in pair], batch_rows=APPLY_BATCH_ROWS):
+            for name, category in pairs:
+                batch[category] = remap_categories(batch[name], batch[category], mappings[name])
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            if writer is None:
+                schema = _output_schema(table, expected_data_types[table_name], source_schema)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            writer.write_table(table.cast(schema))
+            rows += len(batch)
+            if progress:
+                progress(rows)
+        if writer is None:
+            raise ValueError(f"{filepath} has no rows.")
+        writer.close()
+        writer = None
+        os.replace(tmp_path, output_path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"Wrote {rows:,} rows of {table_name} with mapped categories to {output_path}.")
+    return rows
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The app modules import each other by bare name, as Streamlit runs them from app/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+import lab_values
+import qc_cache
+from qc_checks import TABLE_FILES
+from reqd_vars_dtypes import required_variables, expected_data_types
+
+SAMPLE_ROWS = 5000
+SAMPLE_HOSPITALIZATIONS = 100
+# Values of the category columns the checks select on
+SAMPLE_CATEGORIES = {
+    'device_category': ['IMV', 'NIPPV', 'Nasal Cannula', 'Room Air', None],
+    'mode_category': ['Assist Control-Volume Control', 'Pressure Support/CPAP', None],
+    'location_category': ['ICU', 'Ward', 'ER'],
+    'lab_category': ['lactate', 'sodium', 'creatinine'],
+    'vital_category': ['heart_rate', 'sbp', 'temp_c'],
+    'lab_value': ['1.2', '4.5', '<0.5', '>1000', 'neg', None],
+}
+
+
+def _sample_column(rng, table_name, column, n):
+    dtype = expected_data_types.get(table_name, {}).get(column, 'object')
+    if column == 'hospitalization_id':
+        return rng.choice([f'H{i}' for i in range(SAMPLE_HOSPITALIZATIONS)], n)
+    if column == 'patient_id':
+        return rng.choice([f'P{i}' for i in range(SAMPLE_HOSPITALIZATIONS)], n)
+    if column in SAMPLE_CATEGORIES:
+        return rng.choice(np.asarray(SAMPLE_CATEGORIES[column], dtype='object'), n)
+    if dtype == 'datetime64':
+        return (pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 60 * 24 * 30, n), unit='m')).astype(str)
+    if dtype == 'float64':
+        return np.where(rng.random(n) < 0.1, np.nan, rng.normal(50, 30, n))
+    if dtype == 'int64':
+        return rng.integers(18, 90, n)
+    if dtype == 'bool':
+        return rng.random(n) < 0.1
+    return rng.choice([f'{column}_{i}' for i in range(10)], n)
+
+def write_sample_tables(root_location, rows=SAMPLE_ROWS, seed=0):
+    """
+    Write synthetic CLIF tables with the required columns to the root
+    location, in csv and parquet.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(root_location, exist_ok=True)
+    for table_name, filename in TABLE_FILES.items():
+        n = SAMPLE_HOSPITALIZATIONS if table_name in ('Hospitalization', 'Patient') else rows
+        df = pd.DataFrame({column: _sample_column(rng, table_name, column, n) for column in required_variables[table_name]})
+        if table_name == 'Hospitalization':
+            df['hospitalization_id'] = [f'H{i}' for i in range(n)]
+        if table_name == 'Patient':
+            df['patient_id'] = [f'P{i}' for i in range(n)]
+        df.to_parquet(os.path.join(root_location, f'{filename}.parquet'), index=False)
+        df.to_csv(os.path.join(root_location, f'{filename}.csv'), index=False)
+
+
+@pytest.fixture(scope='session')
+def clif_root(tmp_path_factory):
+    """
+    Directory of synthetic CLIF tables, in csv and parquet.
+    """
+    root = tmp_path_factory.mktemp('clif')
+    write_sample_tables(str(root))
+    return str(root)
+
+
+@pytest.fixture(autouse=True)
+def qc_cache_dir(tmp_path, monkeypatch):
+    """
+    Keep each test's QC cache and lab value parse table out of the user's
+    cache directory.
+    """
+    monkeypatch.setattr(qc_cache, 'CACHE_DIR', str(tmp_path / 'qc_cache'))
+    monkeypatch.setattr(lab_values, 'LAB_VALUE_CACHE_DIR', str(tmp_path / 'lab_value_cache'))
+    monkeypatch.setattr(lab_values, '_parse_table', None)
+    return qc_cache.CACHE_DIR
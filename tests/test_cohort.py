@@ -0,0 +1,63 @@
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+import cohort
+from cohort import cohort_view_sql, run_cohort_query, criterion_ids
+from lab_values import parse_lab_values
+from qc_checks import table_filepath
+
+IMV = {'table': 'Respiratory_Support', 'filters': [('device_category', '==', 'IMV')]}
+HIGH_LACTATE = {'table': 'Labs', 'filters': [('lab_category', '==', 'lactate'), ('lab_value_numeric', '>', 4)], 'within_hours': 24}
+
+
+def _table(clif_root, table_name):
+    return pd.read_parquet(table_filepath(clif_root, table_name, 'parquet'))
+
+def _expected_cohort(clif_root):
+    resp = _table(clif_root, 'Respiratory_Support')
+    labs = _table(clif_root, 'Labs')
+    hosp = _table(clif_root, 'Hospitalization')
+    labs = labs.merge(hosp[['hospitalization_id', 'admission_dttm']], on='hospitalization_id')
+    hours = (pd.to_datetime(labs['lab_result_dttm']) - pd.to_datetime(labs['admission_dttm'])) / pd.Timedelta(hours=1)
+    high = (labs['lab_category'] == 'lactate') & (parse_lab_values(labs['lab_value'])['lab_value_numeric'] > 4) & hours.between(0, 24)
+    ids = set(hosp['hospitalization_id']) & set(resp.loc[resp['device_category'] == 'IMV', 'hospitalization_id'])
+    return ids & set(labs.loc[high, 'hospitalization_id']), ids - set(labs.loc[high, 'hospitalization_id'])
+
+
+@pytest.mark.parametrize('filetype', ['csv', 'parquet'])
+def test_cohort_matches_pandas(clif_root, filetype):
+    included, excluded = _expected_cohort(clif_root)
+    result = run_cohort_query([IMV, HIGH_LACTATE], clif_root, filetype)
+    assert set(result['hospitalization_ids']) == included
+    assert list(result['counts']['remaining'])[-1] == len(included)
+    result = run_cohort_query([IMV, dict(HIGH_LACTATE, exclude=True)], clif_root, filetype)
+    assert set(result['hospitalization_ids']) == excluded
+
+
+def test_criteria_are_cached(clif_root, monkeypatch):
+    run_cohort_query([IMV], clif_root, 'parquet')
+    def evaluate(*args, **kwargs):
+        raise AssertionError("criterion evaluated again")
+    monkeypatch.setattr(cohort, 'criterion_ids', evaluate)
+    run_cohort_query([IMV], clif_root, 'parquet')
+
+
+def test_filter_values_follow_the_column_type(clif_root):
+    # Text columns compare as text, so a number-like value keeps its leading zeros
+    assert len(criterion_ids({'table': 'Hospitalization', 'filters': [('hospitalization_id', '==', '00123')]}, clif_root, 'parquet')) == 0
+    ids = criterion_ids({'table': 'Hospitalization', 'filters': [('age_at_admission', '>=', '18')]}, clif_root, 'parquet')
+    assert len(ids) == len(_table(clif_root, 'Hospitalization'))
+    assert np.all(ids[:-1] < ids[1:])
+    with pytest.raises(ValueError, match='not a number'):
+        criterion_ids({'table': 'Hospitalization', 'filters': [('age_at_admission', '>', 'old')]}, clif_root, 'parquet')
+
+
+@pytest.mark.parametrize('filetype', ['csv', 'parquet'])
+def test_explorer_view_reads_the_file_in_place(clif_root, filetype):
+    view = duckdb.sql(cohort_view_sql(table_filepath(clif_root, 'Vitals', filetype))).df()
+    vitals = _table(clif_root, 'Vitals')
+    assert list(view.columns) == list(vitals.columns)
+    assert len(view) == len(vitals)
+    assert view['vital_value'].dtype == 'float64'
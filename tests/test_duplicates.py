@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from common_qc import find_duplicates, hash_rows
+
+
+def test_find_duplicates_matches_duplicated():
+    data = pd.DataFrame({
+        'hospitalization_id': ['1', '1', '2', '2', '3'],
+        'lab_value_numeric': [1.5, 1.5, np.nan, np.nan, 2.0],
+    })
+    count, sample = find_duplicates(data)
+    assert count == data.duplicated().sum() == 2
+    assert len(sample) == 4
+
+
+def test_find_duplicates_treats_negative_zero_as_zero():
+    data = pd.DataFrame({
+        'hospitalization_id': ['1', '1'],
+        'lab_value_numeric': [0.0, -0.0],
+    })
+    assert hash_rows(data)[0] == hash_rows(data)[1]
+    count, _ = find_duplicates(data)
+    assert count == data.duplicated().sum() == 1
+
+
+def test_find_duplicates_by_key_columns():
+    data = pd.DataFrame({
+        'hospitalization_id': ['1', '1', '2'],
+        'vital_category': ['heart_rate', 'heart_rate', 'heart_rate'],
+        'vital_value': [80.0, 81.0, 80.0],
+    })
+    count, sample = find_duplicates(data, ['hospitalization_id', 'vital_category'])
+    assert count == 1
+    assert list(sample['vital_value']) == [80.0, 81.0]
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import qc_cache
+from qc_checks import run_vitals_qc
+
+
+def _vitals(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'hospitalization_id': rng.choice([f'H{i}' for i in range(20)], n),
+        'recorded_dttm': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 60 * 24 * 30, n), unit='m'),
+        'vital_name': rng.choice(['HR', 'SBP'], n),
+        'vital_category': rng.choice(['heart_rate', 'sbp'], n),
+        'vital_value': rng.normal(80, 20, n),
+        'meas_site_name': rng.choice(['arm', 'leg'], n),
+    })
+
+
+@pytest.fixture
+def vitals_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(qc_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    root = tmp_path / 'clif'
+    for month in range(1, 4):
+        partition = root / 'clif_vitals' / f'month={month:02d}'
+        partition.mkdir(parents=True)
+        _vitals(500, month).to_parquet(partition / 'part-0.parquet', index=False)
+    return root
+
+
+def _partition_entries(root):
+    prefix = qc_cache._partition_prefix(str(root / 'clif_vitals'), 'Vitals')
+    return [entry for entry in os.listdir(qc_cache.CACHE_DIR) if entry.startswith(prefix)]
+
+
+def test_incremental_matches_full(vitals_directory, tmp_path):
+    artifacts = qc_cache.cached_table_qc('Vitals', str(vitals_directory), 'parquet', engine='pandas')
+    assert artifacts['mode'] == 'incremental'
+    assert artifacts['partitions_read'] == 3
+
+    single = tmp_path / 'single'
+    single.mkdir()
+    pd.read_parquet(vitals_directory / 'clif_vitals').drop(columns='month').to_parquet(
+        single / 'clif_vitals.parquet', index=False)
+    full = run_vitals_qc(str(single), 'parquet')
+    for key in ['total_counts', 'ttl_unique_encounters', 'duplicate_count', 'key_duplicate_count']:
+        assert artifacts[key] == full[key]
+
+
+def test_appended_partition_is_read_alone(vitals_directory):
+    qc_cache.cached_table_qc('Vitals', str(vitals_directory), 'parquet', engine='pandas')
+    partition = vitals_directory / 'clif_vitals' / 'month=04'
+    partition.mkdir()
+    _vitals(500, 4).to_parquet(partition / 'part-0.parquet', index=False)
+    artifacts = qc_cache.cached_table_qc('Vitals', str(vitals_directory), 'parquet', engine='pandas')
+    assert artifacts['partition_count'] == 4
+    assert artifacts['partitions_read'] == 1
+    assert artifacts['total_counts'] == 2000
+
+
+def test_removed_partition_partials_are_pruned(vitals_directory):
+    qc_cache.cached_table_qc('Vitals', str(vitals_directory), 'parquet', engine='pandas')
+    assert len(_partition_entries(vitals_directory)) == 3
+    os.remove(vitals_directory / 'clif_vitals' / 'month=01' / 'part-0.parquet')
+    artifacts = qc_cache.cached_table_qc('Vitals', str(vitals_directory), 'parquet', engine='pandas')
+    assert artifacts['partitions_read'] == 0
+    assert len(_partition_entries(vitals_directory)) == 2
+
+
+def test_clearing_the_cache_removes_partition_partials(vitals_directory):
+    qc_cache.cached_table_qc('Vitals', str(vitals_directory), 'parquet', engine='pandas')
+    qc_cache.invalidate_cache(str(vitals_directory / 'clif_vitals'), 'Vitals')
+    assert _partition_entries(vitals_directory) == []
+
+
+def test_duckdb_scans_the_directory(vitals_directory):
+    artifacts = qc_cache.cached_table_qc('Vitals', str(vitals_directory), 'parquet', engine='duckdb')
+    assert artifacts['total_counts'] == 1500
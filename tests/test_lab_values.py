@@ -0,0 +1,33 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import lab_values
+from lab_values import parse_lab_values
+
+
+def test_parses_numbers_signs_and_censored_values():
+    values = pd.Series(['1.2', '-3', '<0.5', '>= 1000', '≤2', 'pos 7.5', 'neg', None, '1.2'])
+    parsed = parse_lab_values(values)
+    np.testing.assert_array_equal(parsed['lab_value_numeric'], [1.2, -3, 0.5, 1000, 2, 7.5, np.nan, np.nan, 1.2])
+    assert list(parsed['lab_value_operator'].astype(object).fillna('')) == ['', '', '<', '>=', '<=', '', '', '', '']
+    assert parsed.attrs['non_numeric']
+
+
+def test_plain_numbers_are_numeric():
+    parsed = parse_lab_values(pd.Series(['1', '2.5', '-0.1'], dtype='category'))
+    assert not parsed.attrs['non_numeric']
+    assert parsed['lab_value_operator'].isna().all()
+
+
+def test_parse_table_is_reused_across_runs(monkeypatch):
+    parse_lab_values(pd.Series(['<0.5', '12 mg']))
+    assert os.path.exists(lab_values._cache_path())
+    # A new process starts from the table on disk and parses nothing again
+    def parse_strings(strings):
+        raise AssertionError(f"parsed again: {list(strings)}")
+    monkeypatch.setattr(lab_values, '_parse_table', None)
+    monkeypatch.setattr(lab_values, '_parse_strings', parse_strings)
+    parsed = parse_lab_values(pd.Series(['12 mg', '<0.5']))
+    np.testing.assert_array_equal(parsed['lab_value_numeric'], [12, 0.5])
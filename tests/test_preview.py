@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import qc_preview
+from qc_preview import read_sample, run_preview_qc
+
+
+@pytest.fixture
+def vitals_root(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 40_000
+    vitals = pd.DataFrame({
+        'hospitalization_id': rng.choice([f'H{i}' for i in range(100)], n),
+        'recorded_dttm': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 60 * 24 * 30, n), unit='m'),
+        'vital_name': rng.choice(['HR', 'SBP', 'Temp'], n),
+        'vital_category': rng.choice(['heart_rate', 'sbp', 'temp_c'], n, p=[0.5, 0.3, 0.2]),
+        'vital_value': np.where(rng.random(n) < 0.1, np.nan, rng.normal(80, 20, n)),
+        'meas_site_name': rng.choice(['arm', 'leg'], n),
+    })
+    pq.write_table(pa.Table.from_pandas(vitals, preserve_index=False), tmp_path / 'clif_vitals.parquet',
+                   row_group_size=1_000)
+    vitals.to_csv(tmp_path / 'clif_vitals.csv', index=False)
+    return tmp_path
+
+
+def test_parquet_sample_reads_only_sampled_row_groups(vitals_root, monkeypatch):
+    read_groups = []
+    read_blocks = qc_preview.read_blocks
+    monkeypatch.setattr(qc_preview, 'read_data', lambda *args, **kwargs: pytest.fail('read the whole table'))
+    monkeypatch.setattr(qc_preview, 'read_blocks', lambda filepath, filetype, blocks, *args:
+                        read_groups.extend(blocks) or read_blocks(filepath, filetype, blocks, *args))
+    sample, strata, stratum_sizes, total_rows, rows_exact, complete = read_sample(
+        'Vitals', str(vitals_root / 'clif_vitals.parquet'), 'parquet', sample_rows=2_000)
+    assert total_rows == 40_000 and rows_exact and not complete
+    assert len(read_groups) == 8
+    assert len(sample) == pytest.approx(2_000, rel=0.05)
+    assert stratum_sizes.sum() == pytest.approx(40_000, rel=0.01)
+    assert np.sort(stratum_sizes / stratum_sizes.sum()) == pytest.approx([0.2, 0.3, 0.5], abs=0.03)
+
+
+@pytest.mark.parametrize('filetype', ['parquet', 'csv'])
+def test_preview_samples_each_filetype(vitals_root, filetype):
+    artifacts = run_preview_qc('Vitals', str(vitals_root), filetype, sample_rows=2_000)
+    assert artifacts['mode'] == 'preview'
+    assert artifacts['total_counts'] == pytest.approx(40_000, rel=0.05)
+    assert artifacts['sample_rows'] == pytest.approx(2_000, rel=0.05)
+    assert artifacts['missing_categories']
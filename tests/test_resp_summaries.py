@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from common_qc import read_data, device_mode_summaries, initial_mode_choice
+from qc_cache import cached_table_qc
+from qc_checks import table_filepath, table_categorical_columns
+from qc_streaming import new_partial, update_partial, finalize_partial
+from reqd_vars_dtypes import required_variables, expected_data_types
+
+TABLE = 'Respiratory_Support'
+
+
+def _resp_data(clif_root, filetype='parquet'):
+    return read_data(table_filepath(clif_root, TABLE, filetype), filetype, columns=required_variables[TABLE],
+                     dtypes=expected_data_types[TABLE], categorical=table_categorical_columns(TABLE))
+
+def _selections(data):
+    for device in data['device_category'].dropna().unique():
+        yield (device, None), data['device_category'] == device
+        for mode in data['mode_category'].dropna().unique():
+            yield (device, mode), (data['device_category'] == device) & (data['mode_category'] == mode)
+
+def _assert_mappings_equal(actual, expected):
+    for key in ('device_mapping', 'mode_mapping'):
+        pd.testing.assert_frame_equal(actual[key].astype({column: object for column in actual[key].columns[:2]}),
+                                      expected[key].astype({column: object for column in expected[key].columns[:2]}))
+
+def _assert_describe_equal(actual, expected):
+    # Means are summed in a different order, so they agree to rounding
+    actual = actual.loc[expected.index, expected.columns]
+    for column in expected.columns:
+        if isinstance(expected.loc['min', column], pd.Timestamp):
+            stats = expected[column].dropna().index
+            difference = (pd.to_datetime(actual.loc[stats, column]) - pd.to_datetime(expected.loc[stats, column])).abs()
+            assert (difference < pd.Timedelta('1ms')).all(), column
+        else:
+            np.testing.assert_allclose(actual[column].astype('float64'), expected[column].astype('float64'), rtol=1e-9, err_msg=column)
+
+
+def test_summaries_match_the_masked_selections(clif_root):
+    data = _resp_data(clif_root)
+    summaries = device_mode_summaries(data)
+    for selection, mask in _selections(data):
+        cat_data = data[mask]
+        if cat_data.empty:
+            assert selection not in summaries
+            continue
+        summary = summaries[selection]
+        assert summary['count'] == len(cat_data)
+        _assert_describe_equal(summary['summary'], cat_data.describe())
+        expected = (cat_data.astype({'device_category': object, 'device_name': object})
+                    .groupby(['device_category', 'device_name']).size().reset_index(name='count'))
+        pd.testing.assert_frame_equal(summary['device_mapping'], expected)
+
+
+def test_initial_mode_is_the_first_by_recorded_dttm():
+    data = pd.DataFrame({
+        'hospitalization_id': ['H1', 'H1', 'H2', 'H2', 'H3'],
+        'recorded_dttm': pd.to_datetime(['2024-01-02', '2024-01-01', '2024-01-01', '2024-01-01', '2024-01-01']),
+        'device_category': ['IMV', 'IMV', 'IMV', 'IMV', 'NIPPV'],
+        'mode_category': ['SIMV', 'Assist Control', 'Pressure Support', 'SIMV', 'SIMV'],
+    })
+    counts = initial_mode_choice(data)
+    # H1 starts on its earlier row, H2 on its first row at a tied time, H3 is not ventilated
+    assert counts.to_dict('list') == {'mode_category': ['Assist Control', 'Pressure Support'], 'count': [1, 1]}
+
+
+@pytest.mark.parametrize('batches', [1, 7])
+def test_streamed_summaries_match_the_full_check(clif_root, batches):
+    data = _resp_data(clif_root)
+    summaries = device_mode_summaries(data)
+    partial = new_partial(TABLE)
+    for batch in np.array_split(np.arange(len(data)), batches):
+        partial = update_partial(partial, data.iloc[batch].reset_index(drop=True))
+    artifacts = finalize_partial(partial)
+    assert artifacts['device_summaries'].keys() == summaries.keys()
+    for selection, summary in summaries.items():
+        streamed = artifacts['device_summaries'][selection]
+        assert streamed['count'] == summary['count']
+        _assert_mappings_equal(streamed, summary)
+        numeric = summary['summary'].loc[['count', 'mean', 'min', 'max'], streamed['summary'].columns]
+        pd.testing.assert_frame_equal(streamed['summary'].astype('float64'), numeric.astype('float64'))
+    pd.testing.assert_frame_equal(artifacts['initial_mode_choice'], initial_mode_choice(data))
+
+
+@pytest.mark.parametrize('filetype', ['csv', 'parquet'])
+def test_duckdb_summaries_match_the_pandas_engine(clif_root, filetype):
+    full = cached_table_qc(TABLE, clif_root, filetype, engine='pandas')
+    duckdb = cached_table_qc(TABLE, clif_root, filetype, engine='duckdb')
+    assert duckdb['device_summaries'].keys() == full['device_summaries'].keys()
+    for selection, summary in full['device_summaries'].items():
+        sql = duckdb['device_summaries'][selection]
+        assert sql['count'] == summary['count']
+        _assert_mappings_equal(sql, summary)
+        _assert_describe_equal(sql['summary'], summary['summary'])
+    pd.testing.assert_frame_equal(duckdb['initial_mode_choice'], full['initial_mode_choice'], check_dtype=False)
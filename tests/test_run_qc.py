@@ -0,0 +1,71 @@
+import json
+
+import pandas as pd
+import pytest
+
+from qc_cache import cached_table_qc
+from qc_checks import QC_RUNNERS
+from run_qc import main
+
+# Run modes, as extra run_qc.py arguments. The 1 MB budget makes the pandas
+# engine stream the larger sample tables; the DuckDB engine takes the budget
+# as its memory limit, so it only runs in full and preview mode.
+RUN_MODES = {
+    'full': [],
+    'streaming': ['--memory-budget-mb', '1'],
+    'preview': ['--preview'],
+}
+# Artifacts every engine and mode computes exactly on the sample tables
+EXACT_ARTIFACTS = ['total_counts', 'ttl_unique_encounters', 'duplicate_count', 'key_duplicate_count']
+
+
+def _report_files(entry):
+    for filenames in entry['tables'].values():
+        yield from filenames if isinstance(filenames, list) else [filenames]
+
+
+@pytest.mark.parametrize('filetype', ['csv', 'parquet'])
+@pytest.mark.parametrize('engine', ['pandas', 'duckdb'])
+@pytest.mark.parametrize('mode', list(RUN_MODES))
+def test_run_qc_writes_a_readable_report(clif_root, tmp_path, filetype, engine, mode):
+    if engine == 'duckdb' and mode == 'streaming':
+        pytest.skip("the DuckDB engine does not stream")
+    output = tmp_path / 'report'
+    status = main(['--root-location', clif_root, '--filetype', filetype, '--engine', engine,
+                   '--output', str(output), '--no-cache', *RUN_MODES[mode]])
+    assert status == 0
+    with open(output / 'report.json') as f:
+        report = json.load(f)
+    assert list(report['tables']) == list(QC_RUNNERS)
+    for table_name, entry in report['tables'].items():
+        assert entry['status'] == 'ok', table_name
+        for filename in _report_files(entry):
+            pd.read_parquet(output / filename)
+    resp_files = report['tables']['Respiratory_Support']['tables']
+    if 'device_histograms' in resp_files:
+        histograms = pd.read_parquet(output / resp_files['device_histograms'])
+        assert histograms['count'].sum() > 0
+
+
+@pytest.mark.parametrize('filetype', ['csv', 'parquet'])
+@pytest.mark.parametrize('table_name', list(QC_RUNNERS))
+def test_engines_and_modes_agree(clif_root, filetype, table_name):
+    full = cached_table_qc(table_name, clif_root, filetype, engine='pandas')
+    streaming = cached_table_qc(table_name, clif_root, filetype, memory_budget_mb=1, engine='pandas')
+    duckdb = cached_table_qc(table_name, clif_root, filetype, engine='duckdb')
+    assert 'mode' not in full and duckdb['mode'] == 'duckdb'
+    for artifacts in (streaming, duckdb):
+        for key in EXACT_ARTIFACTS:
+            assert artifacts.get(key) == full.get(key), (artifacts['mode'], key)
+        if full['missing_info'] is None:
+            assert artifacts['missing_info'] is None
+        else:
+            pd.testing.assert_frame_equal(artifacts['missing_info'], full['missing_info'], check_dtype=False)
+        pd.testing.assert_frame_equal(artifacts['validation_df'].reset_index(drop=True),
+                                      full['validation_df'].reset_index(drop=True))
+        assert sorted(artifacts['qc_summary']) == sorted(full['qc_summary'])
+
+
+def test_large_tables_stream_within_the_budget(clif_root):
+    artifacts = cached_table_qc('Labs', clif_root, 'parquet', memory_budget_mb=1, engine='pandas')
+    assert artifacts['mode'] == 'streaming'
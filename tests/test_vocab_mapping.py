@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import vocab_mapping
+from vocab_mapping import (discover_names, suggest_mapping, load_mapping, save_mapping,
+                           remap_categories, apply_mappings)
+from qc_checks import table_filepath
+
+
+@pytest.fixture(autouse=True)
+def mapping_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(vocab_mapping, 'VOCAB_MAPPING_DIR', str(tmp_path / 'vocabulary_mappings'))
+
+
+def test_suggestions_rank_similar_categories_first():
+    frequency = pd.DataFrame({
+        'lab_name': ['Lactic acid, whole blood', 'Sodium, serum', 'LACTIC ACID', 'Serum sodium level'],
+        'lab_category': ['lactate', 'sodium', None, None],
+        'counts': [100, 80, 5, 3],
+    })
+    suggestions = suggest_mapping(frequency).set_index('lab_name')
+    assert suggestions.loc['LACTIC ACID', 'suggested_category'] == 'lactate'
+    assert suggestions.loc['Serum sodium level', 'suggested_category'] == 'sodium'
+    assert pd.isna(suggestions.loc['LACTIC ACID', 'current_category'])
+    assert suggestions['score'].between(0, 1).all()
+
+
+def test_saved_mapping_round_trips():
+    assert load_mapping('Labs', 'lab_name') is None
+    mapping = pd.DataFrame({'lab_name': ['Na', 'Na', 'LACTIC ACID'], 'lab_category': ['chloride', 'sodium', 'lactate']})
+    save_mapping('Labs', 'lab_name', mapping)
+    # The last mapping of a name wins
+    assert load_mapping('Labs', 'lab_name').to_dict('list') == {'lab_name': ['Na', 'LACTIC ACID'], 'lab_category': ['sodium', 'lactate']}
+
+
+def test_remap_keeps_unmapped_categories():
+    names = pd.Series(['a', 'b', 'c', None], dtype='category')
+    categories = pd.Series(['x', 'y', None, 'z'])
+    remapped = remap_categories(names, categories, pd.DataFrame({'name': ['a', 'c'], 'category': ['y', 'w']}))
+    assert remapped.astype(object).tolist() == ['y', 'y', 'w', 'z']
+
+
+@pytest.mark.parametrize('filetype', ['csv', 'parquet'])
+def test_apply_mappings_writes_the_mapped_table(clif_root, filetype, tmp_path):
+    names = discover_names('Labs', clif_root, filetype)['lab_name']
+    mapped_name = names['lab_name'].iloc[0]
+    mapping = pd.DataFrame({'lab_name': [mapped_name], 'lab_category': ['glucose']})
+    output_path = str(tmp_path / 'clif_labs.parquet')
+    rows = apply_mappings('Labs', clif_root, filetype, {'lab_name': mapping}, output_path)
+    source = pd.read_parquet(table_filepath(clif_root, 'Labs', 'parquet'))
+    result = pd.read_parquet(output_path)
+    assert rows == len(source) == len(result)
+    expected = source['lab_category'].where(source['lab_name'] != mapped_name, 'glucose')
+    assert np.array_equal(result['lab_category'].astype(object).fillna('').to_numpy(), expected.fillna('').to_numpy())